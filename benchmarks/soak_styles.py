@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+'''
+Soak benchmark for repeated calls to plot_phylo.
+
+Plots many small random trees, each with new tip labels, on a single
+reused figure and reports the memory allocated by Python after every
+block of calls. Style lookups should not keep any state between calls,
+so once matplotlib's own caches are full (it keeps the size of the last
+4096 distinct strings drawn) the memory in use should stay flat.
+
+    python benchmarks/soak_styles.py --calls 2000 --block 200
+
+The style layer on its own is much faster than drawing, so
+--lookups_only resolves the styles of every tip without drawing, which
+makes it practical to check millions of calls:
+
+    python benchmarks/soak_styles.py --lookups_only --calls 1000000 \
+        --block 100000
+'''
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+import plot_phylo  # noqa: E402
+
+
+def random_tree(rng, n_tips, call):
+    '''
+    Builds a random CompactTree with tip labels unique to this call.
+    '''
+    # Join random pairs of nodes until one remains, then number the
+    # nodes in preorder
+    nodes = [("t%i_%i" % (call, i), []) for i in range(n_tips)]
+    while len(nodes) > 1:
+        i, j = sorted(rng.choice(len(nodes), 2, replace=False))
+        b = nodes.pop(j)
+        a = nodes.pop(i)
+        nodes.append(("", [a, b]))
+    parent, names = [], []
+    stack = [(nodes[0], -1)]
+    while stack:
+        (nam, kids), par = stack.pop()
+        parent.append(par)
+        names.append(nam)
+        idx = len(parent) - 1
+        stack.extend((kid, idx) for kid in reversed(kids))
+    dist = rng.random(len(parent))
+    return plot_phylo.CompactTree(parent, dist, np.ones(len(parent)), names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--block", type=int, default=200)
+    parser.add_argument("--tips", type=int, default=20)
+    parser.add_argument("--lookups_only", action='store_true')
+    parser.add_argument("--warmup", type=int, default=300,
+                        help="Calls before the baseline memory is measured")
+    parser.add_argument("--max_growth_kb", type=float, default=512,
+                        help="Fail if memory grows more than this after "
+                        "the warmup")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Shared style dictionaries, as a long running worker would have
+    col_dict = {'t0_0': 'red'}
+    label_dict = {'t0_0': 'first'}
+    bold = ['t0_0']
+    f = plt.figure()
+    a = f.add_subplot(111)
+
+    tracemalloc.start()
+    baseline = None
+    start = time.perf_counter()
+    for call in range(args.calls):
+        if args.lookups_only:
+            # Only the tip labels matter here, so skip building a tree
+            cols = plot_phylo.StyleLookup(col_dict, 'black')
+            labels = plot_phylo.StyleLookup(label_dict)
+            bolds = frozenset(bold)
+            for i in range(args.tips):
+                nam = "t%i_%i" % (call, i)
+                cols[nam], labels[nam], nam in bolds
+        else:
+            ct = random_tree(rng, args.tips, call)
+            a.cla()
+            plot_phylo.plot_phylo(ct, a, col_dict=col_dict,
+                                  label_dict=label_dict, bold=bold)
+            plot_phylo.plot_phylo(ct, a)
+        if (call + 1) % args.block == 0:
+            current = tracemalloc.get_traced_memory()[0] / 1024
+            if baseline is None and call + 1 >= args.warmup:
+                baseline = current
+            elapsed = time.perf_counter() - start
+            print("%i calls  %.1f calls/s  %.0f KB  growth %.0f KB" % (
+                call + 1, (call + 1) / elapsed, current,
+                current - (baseline or current)), flush=True)
+    tracemalloc.stop()
+    plt.close(f)
+
+    assert len(col_dict) == 1 and len(label_dict) == 1 and len(bold) == 1
+    assert not any(isinstance(d, (dict, list)) and d
+                   for d in plot_phylo.plot_phylo.__defaults__)
+    if baseline is not None and current - baseline > args.max_growth_kb:
+        raise SystemExit("Memory grew by %.0f KB" % (current - baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,17 @@
 from plot_phylo.plot_phylo import *
+from plot_phylo.compact import *
+from plot_phylo.newick import *
+from plot_phylo.layout import *
+from plot_phylo.tanglegram import *
+from plot_phylo.panels import *
+from plot_phylo.annotate import *
+from plot_phylo.treefile import *
+from plot_phylo.densitree import *
+from plot_phylo.animate import *
+from plot_phylo.render import *
+from plot_phylo.interactive import *
+from plot_phylo.export import *
+from plot_phylo.compare import *
+from plot_phylo.progressive import *
 
 __author__ = 'Katy Brown, Duncan Cross'
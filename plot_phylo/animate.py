@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+import itertools
+import numpy as np
+from matplotlib.animation import FuncAnimation
+from matplotlib.collections import LineCollection
+from plot_phylo.compact import order_tree, tree_depth
+from plot_phylo.layout import layout_tree, branch_segments
+from plot_phylo.treefile import iter_trees
+
+
+class TreeAnimation(object):
+    '''
+    Draws a sequence of trees on the same axis, one at a time, for use
+    as the frames of an animation.
+
+    The artists are created once and every frame only updates them in
+    place: the branches are a single LineCollection updated with
+    set_segments, the tip markers a single scatter updated with
+    set_offsets and each tip label is only moved if its position has
+    changed. Each tree is sorted to follow tip_order as closely as its
+    topology allows, so labels move as little as possible.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    tip_order : list
+        Names of all of the tips which can appear in the trees, from the
+        top of the plot to the bottom.
+    xpos : float
+        Position of the root node on the x axis, in axis units.
+    ypos : float
+        Position of the bottom of the trees on the y axis, in axis units.
+    width : float
+        Width of the trees in axis units.
+    height : float
+        Height of the trees in axis units.
+    branch_lengths : bool
+        If True, use the branch lengths provided in the trees, otherwise
+        fix all branches to the same length. Default True.
+    max_depth : float
+        Total branch length shown across the full width, so all of the
+        frames share a scale. If None, each tree is scaled to fill the
+        width. Default None.
+    reverse : bool
+        If True, reverse the trees on the y-axis, showing the root on
+        the right hand side. Default False.
+    font_size : int
+        Font size for the tip labels. Default 10.
+    line_col : str or tuple
+        Colour of the branches. Default black.
+    line_width : float
+        Width of the branches. Default 1.
+    marker_size : float
+        Size of a marker drawn at each tip, in points squared. If None,
+        no markers are drawn. Default None.
+
+    Attributes
+    ----------
+    branches : matplotlib.collections.LineCollection
+        The branches of the current tree.
+    markers : matplotlib.collections.PathCollection or None
+        The tip markers, in the same order as tip_order.
+    texts : list
+        Tip label text objects, in the same order as tip_order.
+    layout : TreeLayout or None
+        Positions of the nodes of the current tree.
+    '''
+    def __init__(self, ax, tip_order,
+                 xpos=0,
+                 ypos=0,
+                 width=10,
+                 height=10,
+                 branch_lengths=True,
+                 max_depth=None,
+                 reverse=False,
+                 font_size=10,
+                 line_col='black',
+                 line_width=1,
+                 marker_size=None):
+        self.ax = ax
+        self.tip_order = list(tip_order)
+        self.rank = {nam: i for i, nam in enumerate(self.tip_order)}
+        if len(self.rank) != len(self.tip_order):
+            raise RuntimeError("tip_order contains duplicate names")
+        self.xpos = xpos
+        self.ypos = ypos
+        self.width = width
+        self.height = height
+        self.branch_lengths = branch_lengths
+        self.max_depth = max_depth
+        self.reverse = reverse
+        self.layout = None
+
+        n = len(self.tip_order)
+        # Positions of the labels as last drawn, NaN if hidden
+        self.positions = np.full((n, 2), np.nan)
+        self.branches = LineCollection([], colors=line_col,
+                                       linewidths=line_width,
+                                       capstyle='projecting', zorder=2)
+        ax.add_collection(self.branches)
+        if marker_size is not None:
+            self.markers = ax.scatter(np.zeros(n), np.zeros(n),
+                                      s=marker_size, c=line_col, zorder=3)
+        else:
+            self.markers = None
+        ha = 'right' if reverse else 'left'
+        self.texts = [ax.text(0, 0, "  %s  " % nam, fontsize=font_size,
+                              va='center', ha=ha, visible=False)
+                      for nam in self.tip_order]
+
+        # The limits must stay fixed for blitting, so cover the full
+        # area the trees can take up
+        ax.update_datalim([(xpos, ypos), (xpos + width, ypos + height)])
+        ax.autoscale_view()
+
+    @property
+    def artists(self):
+        '''
+        All of the artists which change between frames.
+        '''
+        artists = [self.branches]
+        if self.markers is not None:
+            artists.append(self.markers)
+        return artists + self.texts
+
+    def init(self):
+        '''
+        Clears the plot, for use as the init_func of FuncAnimation.
+
+        Returns
+        -------
+        artists : list
+            All of the artists which change between frames.
+        '''
+        self.branches.set_segments([])
+        for text in self.texts:
+            text.set_visible(False)
+        self.positions[:] = np.nan
+        self.layout = None
+        return self.artists
+
+    def update(self, tree):
+        '''
+        Draws the next tree, for use as the func of FuncAnimation.
+
+        Parameters
+        ----------
+        tree : str or CompactTree
+            Either the path to a newick formatted tree, a string
+            containing a newick formatted tree or a CompactTree.
+
+        Returns
+        -------
+        artists : list
+            All of the artists which change between frames.
+        '''
+        ct = next(iter_trees([tree]))
+        names = [ct.names[tip] for tip in ct.leaves]
+        missing = [nam for nam in names if nam not in self.rank]
+        if missing:
+            raise RuntimeError("Tips not found in tip_order: %s" %
+                               ", ".join(missing))
+        ct = order_tree(ct, self.rank)
+        depth = tree_depth(ct)
+        if self.max_depth is not None:
+            depth = (depth[0], self.max_depth, depth[2])
+        layout = layout_tree(ct, self.xpos, self.ypos, self.height,
+                             self.width, depth,
+                             branch_lengths=self.branch_lengths,
+                             reverse=self.reverse)
+        self.layout = layout
+        self.branches.set_segments(branch_segments(layout))
+
+        ranks = np.array([self.rank[ct.names[tip]] for tip in layout.tips],
+                         dtype=np.int64)
+        positions = np.full((len(self.tip_order), 2), np.nan)
+        positions[ranks, 0] = layout.text_x
+        positions[ranks, 1] = layout.y[layout.tips]
+        # Setting text properties is slow, so only touch labels which
+        # have moved, appeared or disappeared
+        shown = ~np.isnan(positions[:, 0])
+        was_shown = ~np.isnan(self.positions[:, 0])
+        moved = shown & (~was_shown | np.any(positions != self.positions,
+                                             axis=1))
+        for i in np.flatnonzero(moved):
+            self.texts[i].set_position(positions[i])
+        for i in np.flatnonzero(shown != was_shown):
+            self.texts[i].set_visible(bool(shown[i]))
+        self.positions = positions
+        if self.markers is not None:
+            self.markers.set_offsets(np.ma.masked_invalid(positions))
+        return self.artists
+
+
+def animate_trees(fig, ax, trees,
+                  tip_order=None,
+                  interval=200,
+                  blit=True,
+                  **kwargs):
+    '''
+    Animates a sequence of trees with matplotlib's FuncAnimation. The
+    trees are read one at a time as the frames are drawn, so long
+    sequences do not need to fit in memory.
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+        Figure containing ax.
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    trees : str or iterable
+        Either the path to a file containing one or more Newick trees,
+        or an iterable of Newick strings, paths or CompactTrees.
+    tip_order : list
+        Names of all of the tips which can appear in the trees, from the
+        top of the plot to the bottom. If None, the order of the tips in
+        the first tree is used and later trees can only contain these
+        tips.
+    interval : int
+        Delay between frames in milliseconds. Default 200.
+    blit : bool
+        If True, only redraw the tree on each frame. Default True.
+    **kwargs
+        Further arguments to TreeAnimation.
+
+    Returns
+    -------
+    anim : matplotlib.animation.FuncAnimation
+        The animation, which must be kept referenced until it has
+        finished. Its tree_animation attribute is the TreeAnimation
+        drawing the frames.
+    '''
+    frames = iter_trees(trees)
+    first = next(frames, None)
+    if first is None:
+        raise RuntimeError("No trees found")
+    if tip_order is None:
+        tip_order = [first.names[tip] for tip in first.leaves]
+    tree_anim = TreeAnimation(ax, tip_order, **kwargs)
+    anim = FuncAnimation(fig, tree_anim.update,
+                         frames=itertools.chain([first], frames),
+                         init_func=tree_anim.init, interval=interval,
+                         blit=blit, repeat=False, cache_frame_data=False)
+    anim.tree_animation = tree_anim
+    return anim
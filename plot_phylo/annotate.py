@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+import matplotlib
+import numpy as np
+from collections.abc import Mapping
+from matplotlib.collections import (LineCollection, PatchCollection,
+                                    PolyCollection)
+from matplotlib.colors import to_rgba_array
+from matplotlib.patches import Rectangle
+from matplotlib.transforms import IdentityTransform
+from plot_phylo.compact import find_nodes, lca_index, subtree_end
+from plot_phylo.panels import tip_label_edge, _rescale
+
+
+def clade_nodes(ct, clades):
+    '''
+    Finds the node at the base of each clade.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to search.
+    clades : list
+        Each clade is either the name of a node or a list of leaf names,
+        in which case their most recent common ancestor is used.
+
+    Returns
+    -------
+    nodes : numpy.ndarray
+        Index of the node at the base of each clade.
+    '''
+    nodes = np.zeros(len(clades), dtype=np.int64)
+    for i, clade in enumerate(clades):
+        if isinstance(clade, str):
+            nodes[i] = find_nodes(ct, clade, leaves_only=False)[0]
+        else:
+            nodes[i] = lca_index(ct).mrca(find_nodes(ct, clade))
+    return nodes
+
+
+def clade_extents(layout, nodes):
+    '''
+    Finds the area of the plot covered by each clade, from the middle
+    of the branch leading to the clade to the end of its tips, and
+    halfway to the neighbouring tips above and below.
+
+    Parameters
+    ----------
+    layout : TreeLayout
+        Positions of the nodes of the tree.
+    nodes : numpy.ndarray
+        Index of the node at the base of each clade.
+
+    Returns
+    -------
+    left : numpy.ndarray
+        Position of the start of each clade on the x axis.
+    right : numpy.ndarray
+        Position of the end of each clade on the x axis.
+    bottom : numpy.ndarray
+        Position of the bottom of each clade on the y axis.
+    top : numpy.ndarray
+        Position of the top of each clade on the y axis.
+    first : numpy.ndarray
+        Position in layout.tips of the first tip of each clade.
+    last : numpy.ndarray
+        Position in layout.tips of the last tip of each clade, plus one.
+    '''
+    ct = layout.tree
+    # The tips of each clade are a contiguous run of layout.tips
+    ends = np.array([subtree_end(ct, n) for n in nodes], dtype=np.int64)
+    first = np.searchsorted(layout.tips, nodes)
+    last = np.searchsorted(layout.tips, ends)
+    y = layout.y[layout.tips]
+    if len(y) > 1:
+        half = (y[0] - y[-1]) / (len(y) - 1) / 2
+    else:
+        half = 0.5
+    top = y[first] + half
+    bottom = y[last - 1] - half
+    left = (layout.x[nodes] + layout.xstart[nodes]) / 2
+    # Interleave the starts and ends of the runs of tips, reduceat
+    # then gives the extreme of each run at the even positions
+    bounds = np.ravel([first, last], order='F')
+    text_x = np.append(layout.text_x, 0)
+    if layout.reverse:
+        right = np.minimum.reduceat(text_x, bounds)[::2]
+    else:
+        right = np.maximum.reduceat(text_x, bounds)[::2]
+    return left, right, bottom, top, first, last
+
+
+def draw_highlights(ax, layout, clades,
+                    cols='lightgrey',
+                    alpha=0.5,
+                    texts=None,
+                    font_size=10,
+                    line_col='black',
+                    line_width=1):
+    '''
+    Highlights clades with a rectangle behind each clade. If the clades
+    are named, a bracket and the name of each clade are drawn beyond its
+    tip labels.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    layout : TreeLayout
+        Positions of the nodes of the tree.
+    clades : list or dict
+        Clades to highlight, either a list of clades or a dictionary with
+        clade names as keys and clades as values. Each clade is either
+        the name of a node or a list of leaf names, in which case the
+        clade below their most recent common ancestor is highlighted.
+    cols : str or dict
+        Colour of the rectangles, either a single colour or a dictionary
+        with clade names as keys and colours as values. Default
+        lightgrey.
+    alpha : float
+        Transparency of the rectangles. Default 0.5.
+    texts : list
+        Tip label text objects, in the same order as layout.tips. Needed
+        to place the clade names.
+    font_size : int
+        Font size for the clade names. Default 10.
+    line_col : str or tuple
+        Colour of the brackets. Default black.
+    line_width : float
+        Width of the brackets. Default 1.
+
+    Returns
+    -------
+    patches : matplotlib.collections.PatchCollection
+        The rectangles, in the same order as the clades.
+    brackets : matplotlib.collections.LineCollection or None
+        The brackets, None if the clades are not named.
+    labels : list
+        Text objects of the clade names, empty if the clades are not
+        named.
+    '''
+    if isinstance(clades, dict):
+        names = list(clades.keys())
+        clades = list(clades.values())
+    else:
+        names = None
+    nodes = clade_nodes(layout.tree, clades)
+    left, right, bottom, top, first, last = clade_extents(layout, nodes)
+    if isinstance(cols, dict):
+        colours = [cols.get(nam, 'lightgrey') for nam in names]
+    else:
+        colours = cols
+
+    autoscale = (ax.get_autoscalex_on(), ax.get_autoscaley_on())
+    rects = [Rectangle((x0, y0), x1 - x0, y1 - y0)
+             for x0, x1, y0, y1 in zip(left, right, bottom, top)]
+    patches = PatchCollection(rects, facecolors=colours, edgecolors='none',
+                              alpha=alpha, zorder=0)
+    ax.add_collection(patches)
+
+    brackets = None
+    labels = []
+    if names is not None and texts is not None:
+        # Leave a gap between the brackets of neighbouring clades
+        gap = (top - bottom) / (last - first) / 10
+        if layout.reverse:
+            template = "%s  "
+        else:
+            template = "  %s"
+        segments = []
+        for i, nam in enumerate(names):
+            edge = tip_label_edge(ax, texts[first[i]:last[i]],
+                                  layout.reverse)
+            segments.append([(edge, bottom[i] + gap[i]),
+                             (edge, top[i] - gap[i])])
+            labels.append(ax.text(edge, (bottom[i] + top[i]) / 2,
+                                  template % nam, ha=layout.ha,
+                                  va='center', fontsize=font_size))
+        brackets = LineCollection(segments, colors=line_col,
+                                  linewidths=line_width)
+        ax.add_collection(brackets)
+    _rescale(ax, autoscale)
+    return (patches, brackets, labels)
+
+
+def node_values(ct, values, missing=np.nan):
+    '''
+    Gives one value to each node of a tree.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        The tree.
+    values : str, dict or array
+        Either the name of a node attribute, a key of the attrs of the
+        tree, a dictionary with node names as keys, or one value per
+        node in the order of the nodes of the tree. Each value may itself
+        be a row of values.
+    missing : object
+        Value for the nodes which are not in the dictionary.
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Array with the value of each node as its first axis.
+    '''
+    if isinstance(values, str):
+        try:
+            return ct.attrs[values]
+        except KeyError:
+            raise RuntimeError("Attribute %s not found in the tree" % values)
+    if isinstance(values, Mapping):
+        return np.array([values.get(nam, missing) for nam in ct.names])
+    values = np.asarray(values)
+    if len(values) != ct.n_nodes:
+        raise RuntimeError("%i node values given for a tree with %i nodes"
+                           % (len(values), ct.n_nodes))
+    return values
+
+
+def _node_mask(ct, nodes):
+    # Nodes to annotate as a boolean mask, internal nodes by default
+    if nodes is None:
+        return ~ct.is_leaf
+    mask = np.zeros(ct.n_nodes, dtype=bool)
+    mask[nodes] = True
+    return mask
+
+
+def draw_node_markers(ax, layout,
+                      sizes=30,
+                      cols='black',
+                      nodes=None,
+                      marker='o',
+                      alpha=None,
+                      zorder=3):
+    '''
+    Draws a marker on nodes of a tree, with the size and colour of each
+    marker taken from per-node arrays. All of the markers are drawn by a
+    single scatter call, so they form one collection.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    layout : TreeLayout or UnrootedLayout
+        Positions of the nodes of the tree.
+    sizes : float, str, dict or array
+        Area of the markers in points squared, either one size for every
+        marker or one per node, as accepted by node_values. Nodes with a
+        size of zero or NaN are skipped. Default 30.
+    cols : str, tuple, dict or array
+        Colour of the markers, either one colour or one per node, as a
+        dictionary with node names as keys or an array in the order of
+        the nodes. Nodes missing from the dictionary are not shown.
+        Default black.
+    nodes : array
+        Indices or boolean mask of the nodes to annotate. By default the
+        internal nodes.
+    marker : str
+        Shape of the markers. Default o.
+    alpha : float
+        Transparency of the markers, by default that of the colours.
+    zorder : float
+        Layer of the markers, by default above the branches.
+
+    Returns
+    -------
+    markers : matplotlib.collections.PathCollection
+        The markers.
+    '''
+    ct = layout.tree
+    mask = _node_mask(ct, nodes)
+    if np.ndim(sizes) == 0 and not isinstance(sizes, str):
+        sizes = np.full(ct.n_nodes, sizes, dtype=float)
+    else:
+        sizes = node_values(ct, sizes).astype(float)
+    mask &= np.nan_to_num(sizes) > 0
+    if isinstance(cols, (str, tuple)):
+        colours = to_rgba_array(cols)
+    else:
+        colours = to_rgba_array(node_values(ct, cols, 'none'))[mask]
+    return ax.scatter(layout.x[mask], layout.y[mask], s=sizes[mask],
+                      c=colours, marker=marker, alpha=alpha,
+                      linewidths=0, zorder=zorder)
+
+
+def pie_vertices(fractions, resolution=36, start=90):
+    '''
+    Outlines the wedges of many pie charts at once, as polygons of
+    radius 0.5 centred on the origin. Each wedge has a point on its arc
+    for every 1 / resolution of a circle it covers.
+
+    Parameters
+    ----------
+    fractions : numpy.ndarray
+        Array of shape (n, k) with the fraction of each of k categories in
+        each of n pies. Each row is scaled to add up to one.
+    resolution : int
+        Number of points on the outline of a whole circle. Default 36.
+    start : float
+        Angle at which the first wedge starts, in degrees
+        anticlockwise from the right. Default 90, the top.
+
+    Returns
+    -------
+    vertices : list
+        Array of points of each wedge with a fraction above zero, pie by
+        pie and in order of category within each pie.
+    pies : numpy.ndarray
+        Row of fractions of each wedge.
+    categories : numpy.ndarray
+        Column of fractions of each wedge.
+    '''
+    fractions = np.asarray(fractions, dtype=float)
+    fractions = fractions / fractions.sum(axis=1, keepdims=True)
+    ends = np.cumsum(fractions, axis=1)
+    pies, categories = np.nonzero(fractions > 0)
+    theta1 = ends[pies, categories] - fractions[pies, categories]
+    span = fractions[pies, categories]
+    # Points on the arc of each wedge, plus the centre of the pie
+    n_arc = np.ceil(span * resolution).astype(np.int64) + 1
+    n_points = n_arc + 1
+    starts = np.cumsum(n_points) - n_points
+    wedge = np.repeat(np.arange(len(pies)), n_points)
+    step = np.arange(n_points.sum()) - starts[wedge] - 1
+    angle = np.radians(start) + 2 * np.pi * (
+        theta1[wedge] + span[wedge] * step / (n_arc[wedge] - 1))
+    radius = np.where(step < 0, 0.0, 0.5)
+    points = np.column_stack([radius * np.cos(angle),
+                              radius * np.sin(angle)])
+    return np.split(points, starts[1:]), pies, categories
+
+
+def draw_node_pies(ax, layout, fractions,
+                   cols=None,
+                   sizes=100,
+                   nodes=None,
+                   edge_col='white',
+                   edge_width=0.5,
+                   alpha=None,
+                   resolution=36,
+                   zorder=3):
+    '''
+    Draws a pie chart on nodes of a tree, such as the probability of
+    each ancestral state. Every wedge of every pie is drawn in a single
+    collection, positioned on the nodes from the layout. The pies are
+    sized in points like scatter markers, so they stay round whatever
+    the scale of the axes.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    layout : TreeLayout or UnrootedLayout
+        Positions of the nodes of the tree.
+    fractions : str, dict or array
+        Fraction of each category at each node, either a dictionary with
+        node names as keys and rows of fractions as values or an array of
+        shape (n_nodes, k), as accepted by node_values. Rows are scaled
+        to add up to one, nodes whose row is missing or adds up to zero
+        are skipped.
+    cols : list
+        Colour of each category. By default the colours of the tab10 or
+        tab20 colour map.
+    sizes : float, str, dict or array
+        Area of the pies in points squared, either one size for every
+        pie or one per node, as accepted by node_values. Default 100.
+    nodes : array
+        Indices or boolean mask of the nodes to annotate. By default
+        every node with fractions.
+    edge_col : str or tuple
+        Colour of the outline of the wedges. Default white.
+    edge_width : float
+        Width of the outline of the wedges. Default 0.5.
+    alpha : float
+        Transparency of the wedges, by default that of the colours.
+    resolution : int
+        Number of points on the outline of a whole pie. Default 36.
+    zorder : float
+        Layer of the pies, by default above the branches.
+
+    Returns
+    -------
+    pies : matplotlib.collections.PolyCollection
+        The wedges, pie by pie in order of node.
+    '''
+    ct = layout.tree
+    if isinstance(fractions, Mapping):
+        k = len(next(iter(fractions.values()), ()))
+        fractions = node_values(ct, fractions, [np.nan] * k)
+    else:
+        fractions = node_values(ct, fractions)
+    fractions = np.asarray(fractions, dtype=float).reshape(ct.n_nodes, -1)
+    if np.ndim(sizes) == 0 and not isinstance(sizes, str):
+        sizes = np.full(ct.n_nodes, sizes, dtype=float)
+    else:
+        sizes = node_values(ct, sizes).astype(float)
+    total = fractions.sum(axis=1)
+    mask = np.ones(ct.n_nodes, dtype=bool) if nodes is None else \
+        _node_mask(ct, nodes)
+    mask &= np.isfinite(total) & (total > 0) & (np.nan_to_num(sizes) > 0)
+    drawn = np.flatnonzero(mask)
+    k = fractions.shape[1]
+    if cols is None:
+        cmap = matplotlib.colormaps['tab10' if k <= 10 else 'tab20']
+        cols = cmap(np.arange(k) % cmap.N)
+    cols = to_rgba_array(cols)
+
+    vertices, pies, categories = pie_vertices(fractions[drawn], resolution)
+    wedge_nodes = drawn[pies]
+    # The outlines are in points, scaled by the size of each pie and
+    # placed on their node in axis units, as scatter does
+    collection = PolyCollection(
+        vertices, sizes=sizes[wedge_nodes],
+        offsets=np.column_stack([layout.x[wedge_nodes],
+                                 layout.y[wedge_nodes]]),
+        offset_transform=ax.transData, facecolors=cols[categories],
+        edgecolors=edge_col, linewidths=edge_width, alpha=alpha,
+        zorder=zorder)
+    collection.set_transform(IdentityTransform())
+    ax.add_collection(collection, autolim=False)
+    return collection
@@ -0,0 +1,941 @@
+#!/usr/bin/env python3
+import numpy as np
+
+
+class CompactTree(object):
+    '''
+    Array based representation of a rooted phylogenetic tree.
+
+    Nodes are stored in preorder, so the root is always node 0 and every
+    node has a higher index than its parent. Iterating over the indices
+    in reverse therefore visits the nodes in postorder. The children of
+    each node are stored in compressed sparse row format, in the order
+    they are drawn.
+
+    Derived arrays are cached on the tree the first time they are
+    needed. They only depend on the tree, which is never modified, so a
+    tree can be shared between threads: at worst two threads calculate
+    the same value.
+
+    Parameters
+    ----------
+    parent : numpy.ndarray
+        Index of the parent of each node, -1 for the root.
+    dist : numpy.ndarray
+        Length of the branch leading to each node.
+    support : numpy.ndarray
+        Support value of each node.
+    names : numpy.ndarray
+        Name of each node, an empty string if the node is unnamed.
+    attrs : dict
+        Further attributes of the nodes, such as those in NHX
+        annotations, with attribute names as keys and arrays with a
+        value for each node as values. Numeric attributes are float
+        arrays with NaN for missing values, others are object arrays
+        with None for missing values.
+    '''
+    __slots__ = ('parent', 'dist', 'support', 'names', 'attrs',
+                 'child_ptr', 'child_idx', '_cache')
+
+    def __init__(self, parent, dist, support, names, attrs=None):
+        self.parent = np.asarray(parent, dtype=np.int64)
+        self.dist = np.asarray(dist, dtype=float)
+        self.support = np.asarray(support, dtype=float)
+        self.names = np.asarray(names, dtype=object)
+        self.attrs = dict(attrs or {})
+        # In preorder the children of each node already appear in
+        # drawing order, so a stable sort on the parent index gives CSR
+        self.child_idx = np.argsort(self.parent[1:], kind='stable') + 1
+        counts = np.bincount(self.parent[1:], minlength=len(self.parent))
+        self.child_ptr = np.zeros(len(self.parent) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.child_ptr[1:])
+        self._cache = dict()
+
+    def __len__(self):
+        return self.n_leaves
+
+    @property
+    def n_nodes(self):
+        return len(self.parent)
+
+    @property
+    def n_children(self):
+        return np.diff(self.child_ptr)
+
+    @property
+    def is_leaf(self):
+        return self.n_children == 0
+
+    @property
+    def leaves(self):
+        '''
+        Indices of the leaves, in the order they are drawn from the top
+        of the tree.
+        '''
+        if 'leaves' not in self._cache:
+            self._cache['leaves'] = np.flatnonzero(self.is_leaf)
+        return self._cache['leaves']
+
+    @property
+    def n_leaves(self):
+        return len(self.leaves)
+
+    @property
+    def level(self):
+        '''
+        Number of branches between each node and the root.
+        '''
+        if 'level' not in self._cache:
+            self._cache['level'] = _root_distances(
+                self.parent, np.ones(self.n_nodes)).astype(np.int64)
+        return self._cache['level']
+
+    def children(self, i):
+        return self.child_idx[self.child_ptr[i]:self.child_ptr[i+1]]
+
+    def get_leaf_names(self):
+        return list(self.names[self.leaves])
+
+    @classmethod
+    def from_ete3(cls, tree):
+        '''
+        Converts an ete3 tree into a CompactTree in a single preorder
+        traversal.
+
+        Parameters
+        ----------
+        tree : ete3.Tree
+            ete3 Tree object
+
+        Returns
+        -------
+        ct : CompactTree
+            Array representation of the same tree.
+        '''
+        index = dict()
+        parent = []
+        dist = []
+        support = []
+        names = []
+        # Any other features, such as NHX annotations, are collected in
+        # the same traversal
+        basic = {'name', 'dist', 'support'}
+        columns = dict()
+        for i, node in enumerate(tree.traverse("preorder")):
+            index[id(node)] = i
+            if node is tree:
+                parent.append(-1)
+            else:
+                parent.append(index[id(node.up)])
+            dist.append(node.dist)
+            support.append(node.support)
+            names.append(node.name)
+            for key in node.features - basic:
+                columns.setdefault(key, dict())[i] = getattr(node, key)
+        return cls(parent, dist, support, names,
+                   attr_columns(columns, len(parent)))
+
+    @classmethod
+    def from_linkage(cls, linkage, names=None):
+        '''
+        Converts a linkage matrix, as returned by
+        scipy.cluster.hierarchy.linkage, into a CompactTree without
+        creating a Newick string, in O(n).
+
+        Each row joins two clusters, with the leaves numbered 0 to n - 1
+        and the cluster made by row i numbered n + i, so the rows are
+        already ordered from the leaves to the root. The preorder
+        position of each node is found from the sizes of the clusters.
+        The first cluster of each row is drawn above the second and each
+        branch length is the difference in height between a cluster and
+        the cluster it joins, as in the Newick tree of the dendrogram.
+
+        Parameters
+        ----------
+        linkage : numpy.ndarray
+            Linkage matrix of shape (n - 1, 4), or (n - 1, 3) without the
+            number of leaves in each cluster.
+        names : list
+            Name of each leaf, in the order of the observations which
+            were clustered. By default the leaves are named by their
+            number.
+
+        Returns
+        -------
+        ct : CompactTree
+            Array representation of the dendrogram.
+        '''
+        Z = np.asarray(linkage, dtype=float)
+        if Z.ndim != 2 or Z.shape[1] < 3:
+            raise RuntimeError("The linkage matrix must have one row for "
+                               "each cluster and at least three columns")
+        m = len(Z)
+        n = m + 1
+        total = n + m
+        left = Z[:, 0].astype(np.int64)
+        right = Z[:, 1].astype(np.int64)
+        clusters = np.arange(n, total)
+        used = np.bincount(np.concatenate([left, right]), minlength=total)
+        if (np.any(left != Z[:, 0]) or np.any(right != Z[:, 1]) or
+                np.any(np.minimum(left, right) < 0) or
+                np.any(np.maximum(left, right) >= clusters) or
+                np.any(used[:-1] != 1)):
+            raise RuntimeError("Invalid linkage matrix, every cluster must "
+                               "join two earlier clusters exactly once")
+        if names is None:
+            names = [str(i) for i in range(n)]
+        elif len(names) != n:
+            raise RuntimeError("%i names given for a linkage matrix with %i "
+                               "leaves" % (len(names), n))
+
+        # Number of nodes in each cluster, from the leaves up
+        la = left.tolist()
+        ra = right.tolist()
+        size = [1] * total
+        for i in range(m):
+            size[n + i] = 1 + size[la[i]] + size[ra[i]]
+        # Preorder position of each cluster, from the root down
+        pos = [0] * total
+        for i in range(m - 1, -1, -1):
+            start = pos[n + i] + 1
+            pos[la[i]] = start
+            pos[ra[i]] = start + size[la[i]]
+        pos = np.array(pos, dtype=np.int64)
+
+        up = np.empty(total, dtype=np.int64)
+        up[left] = clusters
+        up[right] = clusters
+        height = np.concatenate([np.zeros(n), Z[:, 2]])
+        # The root is the last cluster and stays at position 0
+        parent = np.full(total, -1, dtype=np.int64)
+        parent[pos[:-1]] = pos[up[:-1]]
+        dist = np.zeros(total)
+        dist[pos[:-1]] = height[up[:-1]] - height[:-1]
+        node_names = np.full(total, '', dtype=object)
+        node_names[pos[:n]] = list(names)
+        return cls(parent, dist, np.ones(total), node_names)
+
+
+def attr_columns(columns, n):
+    '''
+    Converts node attributes to one array per attribute.
+
+    Parameters
+    ----------
+    columns : dict
+        Attribute names as keys and dictionaries of node indices and
+        values as values.
+    n : int
+        Number of nodes.
+
+    Returns
+    -------
+    attrs : dict
+        Attribute names as keys and arrays with a value for each node as
+        values, float arrays if every value is a number.
+    '''
+    attrs = dict()
+    for key, values in columns.items():
+        idx = np.fromiter(values.keys(), dtype=np.int64, count=len(values))
+        vals = list(values.values())
+        try:
+            col = np.full(n, np.nan)
+            col[idx] = np.array(vals, dtype=float)
+        except (ValueError, TypeError):
+            col = np.full(n, None, dtype=object)
+            col[idx] = vals
+        attrs[key] = col
+    return attrs
+
+
+def _missing(col, n):
+    '''
+    Array of n missing values of the same type as an attribute.
+    '''
+    if col.dtype == object:
+        return np.full(n, None, dtype=object)
+    return np.full(n, np.nan)
+
+
+def _root_distances(parent, weights):
+    '''
+    Sums weights along the path from every node to the root using pointer
+    jumping, so the number of vectorised steps is logarithmic in the
+    depth of the tree. The weight of the root itself is ignored.
+
+    Parameters
+    ----------
+    parent : numpy.ndarray
+        Index of the parent of each node, -1 for the root. The nodes do
+        not need to be in any particular order.
+    weights : numpy.ndarray
+        Weight of the branch leading to each node.
+
+    Returns
+    -------
+    dist : numpy.ndarray
+        Sum of the weights between each node and the root.
+    '''
+    dist = np.array(weights, dtype=float)
+    jump = np.array(parent, dtype=np.int64)
+    dist[jump < 0] = 0
+    idx = np.flatnonzero(jump >= 0)
+    while len(idx) != 0:
+        up = jump[idx]
+        dist[idx] = dist[idx] + dist[up]
+        jump[idx] = jump[up]
+        idx = idx[jump[idx] >= 0]
+    return dist
+
+
+def _level_groups(level):
+    '''
+    Groups node indices by level, deepest level first, so that each
+    group can be processed with a single vectorised postorder step.
+    '''
+    order = np.argsort(level, kind='stable')
+    bounds = np.cumsum(np.bincount(level))[:-1]
+    return np.split(order, bounds)[::-1]
+
+
+def subtree_sizes(ct, weights=None):
+    '''
+    Sums a per node quantity over every subtree, in one postorder pass.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to summarise.
+    weights : numpy.ndarray
+        Value for each node, by default 1 for each leaf so the result
+        is the number of leaves below each node.
+
+    Returns
+    -------
+    size : numpy.ndarray
+        Sum of weights over the subtree rooted at each node.
+    '''
+    if weights is None:
+        size = ct.is_leaf.astype(np.int64)
+    else:
+        size = np.array(weights)
+    for nodes in _level_groups(ct.level)[:-1]:
+        np.add.at(size, ct.parent[nodes], size[nodes])
+    return size
+
+
+def node_depths(ct, topology_only=False):
+    '''
+    Distance from the root to every node.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to measure.
+    topology_only : bool
+        If True, count the number of branches rather than summing the
+        branch lengths.
+
+    Returns
+    -------
+    depths : numpy.ndarray
+        Distance from the root to each node.
+    '''
+    if topology_only:
+        return ct.level.astype(float)
+    if 'depths' not in ct._cache:
+        ct._cache['depths'] = _root_distances(ct.parent, ct.dist)
+    return ct._cache['depths']
+
+
+def tree_depth(ct):
+    '''
+    Calculates the total height and width of the tree, as used to scale
+    the layout.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to measure.
+
+    Returns
+    -------
+    depth : tuple(float, float, int)
+        Number of internal nodes between the root and the farthest leaf,
+        total branch length from the root to the farthest leaf and
+        number of tips.
+    '''
+    if ct.n_nodes == 1:
+        return (0.0, 0.0, 1)
+    leaves = ct.leaves
+    return (float(ct.level[leaves].max() - 1),
+            float(node_depths(ct)[leaves].max()),
+            len(leaves))
+
+
+def find_nodes(ct, names, leaves_only=True):
+    '''
+    Converts node names to node indices.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to search.
+    names : str or list
+        Name or list of names to find.
+    leaves_only : bool
+        Only search the leaves of the tree.
+
+    Returns
+    -------
+    idx : numpy.ndarray
+        Index of each node, in the same order as names.
+    '''
+    if isinstance(names, str):
+        names = [names]
+    # The name index is built once per tree and reused
+    key = 'leaf_index' if leaves_only else 'node_index'
+    if key not in ct._cache:
+        if leaves_only:
+            cands = ct.leaves
+        else:
+            cands = np.arange(ct.n_nodes)
+        ct._cache[key] = dict(zip(ct.names[cands], cands))
+    lookup = ct._cache[key]
+    missing = [n for n in names if n not in lookup]
+    if missing:
+        raise RuntimeError(
+            "Nodes not found in tree: %s" % ", ".join(map(str, missing)))
+    return np.array([lookup[n] for n in names], dtype=np.int64)
+
+
+def get_mrca(ct, nodes):
+    '''
+    Finds the most recent common ancestor of a set of nodes.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to search.
+    nodes : numpy.ndarray
+        Indices of the nodes.
+
+    Returns
+    -------
+    mrca : int
+        Index of the deepest node which has all of the nodes as
+        descendants (or is one of them).
+    '''
+    nodes = np.unique(nodes)
+    # Walk from the first node to the root, then climb from each other
+    # node until reaching this path or a node already climbed through,
+    # so only the ancestors of the nodes are visited
+    path = [int(nodes[0])]
+    while ct.parent[path[-1]] != -1:
+        path.append(int(ct.parent[path[-1]]))
+    on_path = dict((node, i) for i, node in enumerate(path))
+    seen = set()
+    top = 0
+    for node in nodes[1:]:
+        node = int(node)
+        while node not in on_path and node not in seen:
+            seen.add(node)
+            node = int(ct.parent[node])
+        if node in on_path:
+            top = max(top, on_path[node])
+    return path[top]
+
+
+def subtree_end(ct, node):
+    '''
+    Finds the end of the subtree below a node. In preorder the
+    descendants of a node immediately follow it, so the subtree is the
+    range of indices from node to the next sibling of the node or of
+    its closest ancestor which has one.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to search.
+    node : int
+        Index of the root of the subtree.
+
+    Returns
+    -------
+    end : int
+        Index one past the last node of the subtree.
+    '''
+    while node != 0:
+        par = ct.parent[node]
+        kids = ct.children(par)
+        i = np.searchsorted(kids, node)
+        if i + 1 < len(kids):
+            return int(kids[i + 1])
+        node = par
+    return ct.n_nodes
+
+
+def extract_clade(ct, clade, context=0):
+    '''
+    Extracts a clade as a new tree without visiting the rest of the
+    tree. Only the ancestors of the named nodes and the nodes of the
+    clade itself are read.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to extract the clade from.
+    clade : str or list
+        Either the name of a node, or a list of leaf names, in which
+        case their most recent common ancestor is used.
+    context : int
+        Number of levels above the clade to include, so that the
+        closest relatives of the clade are also shown. Default 0.
+
+    Returns
+    -------
+    sub : CompactTree
+        The clade, rooted on its common ancestor, with the branch
+        leading to this node removed.
+    '''
+    if isinstance(clade, str):
+        node = int(find_nodes(ct, clade, leaves_only=False)[0])
+    else:
+        node = get_mrca(ct, find_nodes(ct, clade))
+    for i in range(context):
+        if node == 0:
+            break
+        node = int(ct.parent[node])
+    end = subtree_end(ct, node)
+    parent = ct.parent[node:end] - node
+    parent[0] = -1
+    dist = ct.dist[node:end].copy()
+    dist[0] = 0
+    return CompactTree(parent, dist, ct.support[node:end],
+                       ct.names[node:end],
+                       {k: v[node:end] for k, v in ct.attrs.items()})
+
+
+def join_trees(cts):
+    '''
+    Joins several trees into a single tree below a new, unnamed root, so
+    that they can be processed together with vectorised operations. The
+    nodes of each tree are a contiguous block, in the same order as the
+    trees, and the branches leading to their roots are removed.
+
+    Parameters
+    ----------
+    cts : list
+        CompactTrees to join.
+
+    Returns
+    -------
+    forest : CompactTree
+        The joined trees, the root of each is a child of node 0.
+    '''
+    sizes = np.array([ct.n_nodes for ct in cts], dtype=np.int64)
+    roots = np.cumsum(sizes) - sizes + 1
+    offset = np.repeat(roots, sizes)
+    parent = np.concatenate([[-1]] + [ct.parent for ct in cts])
+    parent[1:] += offset
+    parent[roots] = 0
+    dist = np.concatenate([[0]] + [ct.dist for ct in cts])
+    dist[roots] = 0
+    support = np.concatenate([[1]] + [ct.support for ct in cts])
+    names = np.concatenate([np.array([""], dtype=object)] +
+                           [ct.names for ct in cts])
+    # Attributes missing from some of the trees are filled in as missing
+    attrs = dict()
+    for ct in cts:
+        for key, col in ct.attrs.items():
+            attrs.setdefault(key, col)
+    for key, col in attrs.items():
+        attrs[key] = np.concatenate(
+            [_missing(col, 1)] + [ct.attrs[key] if key in ct.attrs
+                                  else _missing(col, ct.n_nodes)
+                                  for ct in cts])
+    return CompactTree(parent, dist, support, names, attrs)
+
+
+class LCAIndex(object):
+    '''
+    Index answering lowest common ancestor queries in constant time.
+
+    This is the Euler tour method, applied to the preorder node indices
+    rather than a full Euler tour. For two nodes u < v, their lowest
+    common ancestor is the parent of the highest node (the one closest
+    to the root) in the range u + 1 to v. The highest node in any range
+    is found with two lookups in a sparse table of range minima, built
+    once per tree in O(n log n).
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to index.
+    '''
+    __slots__ = ('parent', 'level', 'table')
+
+    def __init__(self, ct):
+        self.parent = ct.parent
+        self.level = ct.level
+        # table[j][i] is the highest node in the 2 ** j nodes from i
+        self.table = [np.arange(ct.n_nodes)]
+        span = 1
+        while 2 * span <= ct.n_nodes:
+            prev = self.table[-1]
+            a = prev[:-span]
+            b = prev[span:]
+            self.table.append(np.where(self.level[b] < self.level[a], b, a))
+            span *= 2
+
+    def _highest(self, start, stop):
+        # Highest node in each inclusive range start to stop, the two
+        # overlapping blocks of the largest power of two cover the range
+        j = np.floor(np.log2(stop - start + 1)).astype(np.int64)
+        out = np.empty(len(start), dtype=np.int64)
+        for k in np.unique(j):
+            sel = j == k
+            a = self.table[k][start[sel]]
+            b = self.table[k][stop[sel] - 2 ** k + 1]
+            out[sel] = np.where(self.level[b] < self.level[a], b, a)
+        return out
+
+    def query(self, a, b):
+        '''
+        Finds the lowest common ancestor of each pair of nodes.
+
+        Parameters
+        ----------
+        a : int or numpy.ndarray
+            Indices of the first node of each pair.
+        b : int or numpy.ndarray
+            Indices of the second node of each pair.
+
+        Returns
+        -------
+        lca : numpy.ndarray
+            Index of the lowest common ancestor of each pair.
+        '''
+        a = np.atleast_1d(np.asarray(a, dtype=np.int64))
+        b = np.atleast_1d(np.asarray(b, dtype=np.int64))
+        lo = np.minimum(a, b)
+        hi = np.maximum(a, b)
+        out = lo.copy()
+        diff = lo != hi
+        if diff.any():
+            top = self._highest(lo[diff] + 1, hi[diff])
+            out[diff] = self.parent[top]
+        return out
+
+    def mrca(self, nodes):
+        '''
+        Finds the most recent common ancestor of a set of nodes. This
+        is the lowest common ancestor of the first and last of the nodes
+        in preorder, so only needs one pass over the nodes.
+
+        Parameters
+        ----------
+        nodes : numpy.ndarray
+            Indices of the nodes.
+
+        Returns
+        -------
+        mrca : int
+            Index of the most recent common ancestor.
+        '''
+        nodes = np.asarray(nodes)
+        return int(self.query(nodes.min(), nodes.max())[0])
+
+
+def lca_index(ct):
+    '''
+    Returns the LCAIndex of a tree, building it the first time it is
+    needed.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to index.
+
+    Returns
+    -------
+    index : LCAIndex
+        Lowest common ancestor index of the tree.
+    '''
+    if 'lca' not in ct._cache:
+        ct._cache['lca'] = LCAIndex(ct)
+    return ct._cache['lca']
+
+
+def midpoint_outgroup(ct):
+    '''
+    Finds the branch containing the midpoint of the longest path between
+    two leaves.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to search.
+
+    Returns
+    -------
+    node : int
+        Index of the node below the midpoint.
+    split : float
+        Distance from the midpoint to this node.
+    '''
+    depths = node_depths(ct)
+    leaves = ct.leaves
+    # The farthest leaf from the root is one end of the longest path
+    a = leaves[np.argmax(depths[leaves])]
+
+    # The other end is the farthest leaf hanging off the path from a
+    # to the root
+    path = np.flatnonzero(subtree_sizes(ct, np.eye(1, ct.n_nodes, a,
+                                                   dtype=np.int64)[0]))
+    onpath = np.zeros(ct.n_nodes, dtype=bool)
+    onpath[path] = True
+    maxdown = depths.copy()
+    maxdown[~ct.is_leaf] = -np.inf
+    for nodes in _level_groups(ct.level)[:-1]:
+        np.maximum.at(maxdown, ct.parent[nodes], maxdown[nodes])
+    cands = np.flatnonzero(~onpath)
+    cands = cands[onpath[ct.parent[cands]]]
+    if len(cands) == 0:
+        return int(ct.children(0)[0]), 0.0
+    span = depths[a] + maxdown[cands] - 2 * depths[ct.parent[cands]]
+    half = span.max() / 2
+
+    # The longest path is at least as long on the side of a, so the
+    # midpoint lies between a and the common ancestor
+    path = path[np.argsort(-ct.level[path])]
+    top = depths[a] - depths[ct.parent[path[:-1]]]
+    node = path[:-1][np.argmax(top >= half)]
+    return int(node), float(half - (depths[a] - depths[node]))
+
+
+def reroot(ct, outgroup):
+    '''
+    Roots the tree on a new outgroup. The old root is reused as the new
+    root and the path between the old root and the outgroup is reversed
+    in place, so the result matches ete3's set_outgroup, in O(n).
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to reroot.
+    outgroup : str or list
+        Name of a leaf, list of leaf names, in which case the tree is
+        rooted on their most recent common ancestor, or "midpoint" to
+        root the tree at the midpoint of the longest path between two
+        leaves.
+
+    Returns
+    -------
+    rerooted : CompactTree
+        New tree with the root on the branch leading to the outgroup.
+    '''
+    split = None
+    if isinstance(outgroup, str) and outgroup == 'midpoint' and (
+            'midpoint' not in set(ct.names[ct.leaves])):
+        node, split = midpoint_outgroup(ct)
+    else:
+        nodes = find_nodes(ct, outgroup)
+        node = get_mrca(ct, nodes)
+        if node == 0:
+            # The group spans the root, so root on a leaf outside it
+            # first and look again
+            others = np.setdiff1d(ct.leaves, nodes)
+            if len(others) == 0:
+                raise RuntimeError(
+                    "The outgroup cannot contain every leaf in the tree")
+            ct = _reroot_at(ct, others[0])
+            node = get_mrca(ct, find_nodes(ct, outgroup))
+    return _reroot_at(ct, node, split)
+
+
+def _reroot_at(ct, node, split=None):
+    '''
+    Places the root on the branch above node. By default the branch is
+    split in half, otherwise split is the distance between node and the
+    new root.
+    '''
+    if node == 0:
+        raise RuntimeError("Cannot set the root as the outgroup")
+    n = ct.n_nodes
+    parent = ct.parent.copy()
+    dist = ct.dist.copy()
+    support = ct.support.copy()
+    names = ct.names.copy()
+    attrs = ct.attrs
+    # Siblings are kept in their current order, nodes gaining a new
+    # child receive it last
+    rank = np.arange(n, dtype=np.int64)
+    last = n
+
+    path = [int(node)]
+    while parent[path[-1]] != 0:
+        path.append(int(parent[path[-1]]))
+    top = path[-1]
+    rest = [int(c) for c in ct.children(0) if c != top]
+    if len(rest) == 0 and len(path) == 1:
+        # node is the only child of the root, so nothing is left to
+        # place on the other side of the new root
+        raise RuntimeError(
+            "The outgroup cannot contain every leaf in the tree")
+
+    # Group the remaining children of the root, creating a new node if
+    # there is more than one
+    connector = None
+    if len(rest) == 1:
+        connector = rest[0]
+    elif len(rest) > 1:
+        connector = n
+        parent = np.append(parent, 0)
+        dist = np.append(dist, 0.0)
+        support = np.append(support, ct.support[top])
+        names = np.append(names, np.array([''], dtype=object))
+        attrs = {k: np.append(v, _missing(v, 1)) for k, v in attrs.items()}
+        rank = np.append(rank, n)
+        last += 1
+        parent[rest] = connector
+
+    if len(path) > 1:
+        # Reverse the path between the outgroup and the old root, each
+        # node takes the branch length and support of its old parent
+        for lower, upper in zip(path[1:-1], path[2:]):
+            parent[upper] = lower
+            rank[upper] = last
+            last += 1
+        old_dist = dist[path[1:]].copy()
+        old_support = support[path[1:]].copy()
+        dist[path[2:]] = old_dist[:-1]
+        support[path[2:]] = old_support[:-1]
+        if connector is not None:
+            parent[connector] = top
+            rank[connector] = last
+            last += 1
+            dist[connector] += old_dist[-1]
+        outgroup2 = path[1]
+        dist[outgroup2] = 0
+    else:
+        outgroup2 = connector
+
+    parent[node] = 0
+    parent[outgroup2] = 0
+    rank[node] = -2
+    rank[outgroup2] = -1
+    total = dist[outgroup2] + dist[node]
+    if split is None:
+        split = total / 2
+    dist[node] = split
+    dist[outgroup2] = total - split
+    support[outgroup2] = support[node]
+    return _reorder(parent, rank, dist, support, names, attrs=attrs)
+
+
+def order_tree(ct, order):
+    '''
+    Reorders the children of every node, without changing the topology.
+    The sort keys for all clades are calculated in a single postorder
+    pass and ties keep their original order.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to reorder, this is not modified.
+    order : str or dict
+        "up" to ladderize the tree with the largest clades at the top,
+        "down" for the largest clades at the bottom, or a dictionary with
+        leaf names as keys and sortable values. With a dictionary, each
+        clade is sorted by the smallest value of any of its leaves and
+        leaves without a value are placed last.
+
+    Returns
+    -------
+    ordered : CompactTree
+        Reordered copy of the tree.
+    '''
+    if isinstance(order, str):
+        if order not in ('up', 'down'):
+            raise RuntimeError(
+                "order must be 'up', 'down' or a dictionary, not '%s'" % order)
+        key = subtree_sizes(ct).astype(float)
+        if order == 'up':
+            key = -key
+    else:
+        # Convert the values to ranks so any sortable type can be used
+        leaves = ct.leaves
+        names = ct.names[leaves]
+        has_key = np.array([n in order for n in names], dtype=bool)
+        key = np.full(ct.n_nodes, np.inf)
+        if has_key.any():
+            _, ranks = np.unique(np.array([order[n] for n in names[has_key]]),
+                                 return_inverse=True)
+            key[leaves[has_key]] = ranks
+        for nodes in _level_groups(ct.level)[:-1]:
+            np.minimum.at(key, ct.parent[nodes], key[nodes])
+    return _reorder(ct.parent, key, ct.dist, ct.support, ct.names,
+                    attrs=ct.attrs)
+
+
+def preorder_positions(parent, rank):
+    '''
+    Calculates the preorder position of every node of a tree stored as a
+    parent array in any order. Siblings are ordered by rank and the
+    position of every node is calculated from subtree sizes, one tree
+    level at a time.
+
+    Parameters
+    ----------
+    parent : numpy.ndarray
+        Index of the parent of each node, -1 for the root.
+    rank : numpy.ndarray
+        Sort key of each node among its siblings, ties keep their
+        index order.
+
+    Returns
+    -------
+    pos : numpy.ndarray
+        Preorder position of each node.
+    '''
+    n = len(parent)
+    level = _root_distances(parent, np.ones(n)).astype(np.int64)
+    groups = _level_groups(level)
+
+    size = np.ones(n, dtype=np.int64)
+    for nodes in groups[:-1]:
+        np.add.at(size, parent[nodes], size[nodes])
+
+    # Offset of each node within its parent's block, the sum of the
+    # sizes of its older siblings
+    nonroot = np.flatnonzero(parent >= 0)
+    sib = nonroot[np.lexsort((rank[nonroot], parent[nonroot]))]
+    csum = np.cumsum(size[sib]) - size[sib]
+    first = np.ones(len(sib), dtype=bool)
+    first[1:] = parent[sib][1:] != parent[sib][:-1]
+    starts = np.maximum.accumulate(np.where(first, np.arange(len(sib)), 0))
+    offset = np.zeros(n, dtype=np.int64)
+    offset[sib] = csum - csum[starts]
+
+    pos = np.zeros(n, dtype=np.int64)
+    for nodes in groups[::-1][1:]:
+        pos[nodes] = pos[parent[nodes]] + 1 + offset[nodes]
+    return pos
+
+
+def _reorder(parent, rank, dist, support, names, pos=None, attrs=None):
+    '''
+    Builds a CompactTree from a parent array in any order, with siblings
+    ordered by rank. pos can be passed if the preorder positions are
+    already known. Node attributes in attrs follow their nodes.
+    '''
+    if pos is None:
+        pos = preorder_positions(parent, rank)
+    nonroot = np.flatnonzero(parent >= 0)
+    new_parent = np.full(len(parent), -1, dtype=np.int64)
+    new_parent[pos[nonroot]] = pos[parent[nonroot]]
+    inv = np.empty(len(parent), dtype=np.int64)
+    inv[pos] = np.arange(len(parent))
+    return CompactTree(new_parent, dist[inv], support[inv], names[inv],
+                       {k: v[inv] for k, v in (attrs or {}).items()})
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+import numpy as np
+from matplotlib.colors import to_rgba
+from plot_phylo.compact import subtree_sizes
+from plot_phylo.plot_phylo import read_tree
+
+
+class SplitComparison(object):
+    '''
+    The bipartitions (splits) of two trees and which of them are missing
+    from the other tree, as found by compare_trees.
+
+    Attributes
+    ----------
+    tree1 : CompactTree
+        The first tree.
+    tree2 : CompactTree
+        The second tree.
+    hashes1 : numpy.ndarray
+        Hash of the split made by each node of tree1.
+    hashes2 : numpy.ndarray
+        Hash of the split made by each node of tree2.
+    informative1 : numpy.ndarray
+        True for the nodes of tree1 which split the shared tips into two
+        groups with more than one tip, or for rooted trees a group with
+        more than one tip and fewer than all of the tips.
+    informative2 : numpy.ndarray
+        The same for tree2.
+    missing1 : numpy.ndarray
+        True for the informative nodes of tree1 whose split is not found
+        in tree2.
+    missing2 : numpy.ndarray
+        True for the informative nodes of tree2 whose split is not found
+        in tree1.
+    rf : int
+        Robinson-Foulds distance, the number of distinct splits found in
+        only one of the trees.
+    max_rf : int
+        Number of distinct splits in the two trees, the largest possible
+        distance.
+    '''
+    __slots__ = ('tree1', 'tree2', 'hashes1', 'hashes2', 'informative1',
+                 'informative2', 'missing1', 'missing2', 'rf', 'max_rf')
+
+    def __init__(self, tree1, tree2, hashes1, hashes2, informative1,
+                 informative2):
+        self.tree1 = tree1
+        self.tree2 = tree2
+        self.hashes1 = hashes1
+        self.hashes2 = hashes2
+        self.informative1 = informative1
+        self.informative2 = informative2
+        splits1 = np.unique(hashes1[informative1])
+        splits2 = np.unique(hashes2[informative2])
+        self.missing1 = informative1 & ~np.isin(hashes1, splits2)
+        self.missing2 = informative2 & ~np.isin(hashes2, splits1)
+        shared = len(np.intersect1d(splits1, splits2, assume_unique=True))
+        self.max_rf = len(splits1) + len(splits2)
+        self.rf = self.max_rf - 2 * shared
+
+
+def split_hashes(ct, tip_hash, unrooted=False):
+    '''
+    Hashes the set of tips below every node of a tree, as the
+    exclusive or of a random 64 bit number for each tip.
+
+    In preorder the tips below each node are consecutive, so the hash of
+    every node is the difference of two prefix values of the tip hashes,
+    found for all nodes at once.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        The tree.
+    tip_hash : numpy.ndarray
+        Hash of each tip of the tree, in the order of ct.leaves, 0 for
+        tips which should be ignored.
+    unrooted : bool
+        If True, a split and its complement are given the same hash, by
+        hashing the side which does not contain the first tip with a
+        non-zero hash. Default False.
+
+    Returns
+    -------
+    hashes : numpy.ndarray
+        Hash of the split made by each node.
+    counts : numpy.ndarray
+        Number of tips with a non-zero hash below each node.
+    '''
+    tip_hash = np.asarray(tip_hash, dtype=np.uint64)
+    nodes = subtree_sizes(ct, np.ones(ct.n_nodes, dtype=np.int64))
+    # Number of tips before each node in preorder
+    before = np.zeros(ct.n_nodes + 1, dtype=np.int64)
+    np.cumsum(ct.is_leaf, out=before[1:])
+    start = before[:-1]
+    end = before[np.arange(ct.n_nodes) + nodes]
+    prefix = np.zeros(len(tip_hash) + 1, dtype=np.uint64)
+    np.bitwise_xor.accumulate(tip_hash, out=prefix[1:])
+    hashes = prefix[end] ^ prefix[start]
+    used = np.zeros(len(tip_hash) + 1, dtype=np.int64)
+    np.cumsum(tip_hash != 0, out=used[1:])
+    counts = used[end] - used[start]
+    if unrooted and counts[0] > 0:
+        first = np.argmax(tip_hash != 0)
+        flip = (start <= first) & (end > first)
+        hashes[flip] ^= prefix[-1]
+    return hashes, counts
+
+
+def compare_trees(tree1, tree2, unrooted=False, seed=0):
+    '''
+    Finds the splits of one tree which are not in another, in a time
+    proportional to the number of nodes.
+
+    Each tip found in both trees is given a random 64 bit hash, other
+    tips are ignored, and each split is hashed as described in
+    split_hashes. The splits of the two trees are then matched on their
+    hashes. With 64 bit hashes the chance of two different splits having
+    the same hash is negligible.
+
+    Parameters
+    ----------
+    tree1 : str or CompactTree
+        The first tree, as accepted by read_tree.
+    tree2 : str or CompactTree
+        The second tree.
+    unrooted : bool
+        If True, compare the trees as unrooted, so the position of the
+        root is ignored. Default False.
+    seed : int
+        Seed for the random tip hashes. Default 0.
+
+    Returns
+    -------
+    comparison : SplitComparison
+        The splits of both trees and which of them are missing from the
+        other tree.
+    '''
+    ct1 = read_tree(tree1)
+    ct2 = read_tree(tree2)
+    names1 = ct1.names[ct1.leaves].tolist()
+    names2 = ct2.names[ct2.leaves].tolist()
+    # Shared tip index, position of each tip of tree2 in tree1
+    index = dict(zip(names1, range(len(names1))))
+    if len(index) != len(names1) or len(set(names2)) != len(names2):
+        raise RuntimeError("Trees with duplicated tip names cannot be "
+                           "compared")
+    pos2 = np.fromiter((index.get(nam, -1) for nam in names2),
+                       dtype=np.int64, count=len(names2))
+    shared = pos2 >= 0
+    rng = np.random.default_rng(seed)
+    # Zero is kept for tips which are not in both trees
+    codes = rng.integers(1, np.iinfo(np.uint64).max, size=shared.sum(),
+                         dtype=np.uint64, endpoint=True)
+    hash1 = np.zeros(len(names1), dtype=np.uint64)
+    hash1[pos2[shared]] = codes
+    hash2 = np.zeros(len(names2), dtype=np.uint64)
+    hash2[shared] = codes
+    hashes1, counts1 = split_hashes(ct1, hash1, unrooted)
+    hashes2, counts2 = split_hashes(ct2, hash2, unrooted)
+    largest = len(codes) - 2 if unrooted else len(codes) - 1
+    # Both sides of an informative split have at least two tips when
+    # unrooted, when rooted the group below the node has at least two tips
+    # and is not every tip
+    informative1 = (counts1 >= 2) & (counts1 <= largest)
+    informative2 = (counts2 >= 2) & (counts2 <= largest)
+    return SplitComparison(ct1, ct2, hashes1, hashes2, informative1,
+                           informative2)
+
+
+def branch_styles(ct, highlight, col='black', width=1, highlight_col='red',
+                  highlight_width=2):
+    '''
+    Colours and widths for each line of the branches of a tree in a
+    rectangular layout, in the order of branch_segments, so they can be
+    passed straight to a LineCollection. The line leading to each
+    highlighted node and the line joining its children are highlighted.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        The tree.
+    highlight : numpy.ndarray
+        True for each node to highlight.
+    col : str or tuple
+        Colour of the other branches. Default black.
+    width : float
+        Width of the other branches. Default 1.
+    highlight_col : str or tuple
+        Colour of the highlighted branches. Default red.
+    highlight_width : float
+        Width of the highlighted branches. Default 2.
+
+    Returns
+    -------
+    cols : numpy.ndarray
+        Array of shape (n, 4) with the colour of each line.
+    widths : numpy.ndarray
+        Width of each line.
+    '''
+    lines = np.concatenate([highlight, highlight[~ct.is_leaf]])
+    cols = np.where(lines[:, None], to_rgba(highlight_col), to_rgba(col))
+    widths = np.where(lines, highlight_width, width).astype(float)
+    return cols, widths
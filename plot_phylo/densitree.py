@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
+from plot_phylo.compact import order_tree, tree_depth, join_trees
+from plot_phylo.layout import layout_tree, branch_segments
+from plot_phylo.panels import _rescale
+from plot_phylo.plot_phylo import StyleLookup
+from plot_phylo.treefile import iter_trees
+
+
+def tip_ranks(forest, tip_order, n_trees):
+    '''
+    Finds the position in tip_order of each leaf of several joined trees,
+    checking that every tree has exactly the tips in tip_order.
+
+    Parameters
+    ----------
+    forest : CompactTree
+        Trees joined with join_trees.
+    tip_order : numpy.ndarray
+        Names of all of the tips.
+    n_trees : int
+        Number of joined trees.
+
+    Returns
+    -------
+    ranks : numpy.ndarray
+        Position in tip_order of each leaf, in the order of
+        forest.leaves.
+    '''
+    names = forest.names[forest.leaves]
+    sorter = np.argsort(tip_order)
+    pos = np.searchsorted(tip_order, names, sorter=sorter)
+    ranks = sorter[np.minimum(pos, len(sorter) - 1)]
+    n_tips = len(tip_order)
+    # Each tree is a contiguous run of leaves, which must contain every
+    # tip exactly once
+    if (len(ranks) != n_trees * n_tips or np.any(tip_order[ranks] != names)
+            or np.any(np.sort(ranks.reshape(n_trees, n_tips), axis=1) !=
+                      np.arange(n_tips))):
+        raise RuntimeError("All of the trees must have the same tips")
+    return ranks
+
+
+def consensus_order(cts, tip_order=None):
+    '''
+    Finds an order of the tips which suits all of the trees. Each tree
+    is sorted to follow the starting order as closely as its topology
+    allows and the tips are then ordered by their mean position.
+
+    Parameters
+    ----------
+    cts : list
+        CompactTrees sharing the same tips.
+    tip_order : list
+        Starting order of the tips, by default the order of the first
+        tree.
+
+    Returns
+    -------
+    order : list
+        Names of the tips, from the top of the plot to the bottom.
+    '''
+    if tip_order is None:
+        tip_order = cts[0].names[cts[0].leaves]
+    tip_order = np.asarray(tip_order, dtype=object)
+    rank = {nam: i for i, nam in enumerate(tip_order)}
+    forest = order_tree(join_trees(cts), rank)
+    ranks = tip_ranks(forest, tip_order, len(cts))
+    total = np.bincount(ranks, weights=np.tile(np.arange(len(tip_order)),
+                                               len(cts)))
+    return list(tip_order[np.argsort(total, kind='stable')])
+
+
+def densitree_segments(cts, tip_order,
+                       xpos=0,
+                       ypos=0,
+                       width=10,
+                       height=10,
+                       branch_lengths=True,
+                       max_depth=None,
+                       align_tips=True,
+                       reverse=False):
+    '''
+    Lays out every tree with its tips at fixed positions and collects
+    the branches of all of the trees into a single array. The trees are
+    joined into one so they are all laid out together.
+
+    Parameters
+    ----------
+    cts : list
+        CompactTrees sharing the same tips.
+    tip_order : list
+        Names of the tips, from the top of the plot to the bottom.
+    xpos : float
+        Position of the roots on the x axis, in axis units.
+    ypos : float
+        Position of the bottom of the trees on the y axis, in axis units.
+    width : float
+        Width of the trees in axis units.
+    height : float
+        Height of the trees in axis units.
+    branch_lengths : bool
+        If True, use the branch lengths provided in the trees, otherwise
+        fix all branches to the same length. Default True.
+    max_depth : float
+        Total branch length, or number of branches if branch_lengths is
+        False, shown across the full width. By default the depth of the
+        deepest tree.
+    align_tips : bool
+        If True, each tree is shifted so that its farthest tip is at the
+        end of the width, otherwise each root is at xpos. Default True.
+    reverse : bool
+        If True, show the roots on the right hand side. Default False.
+
+    Returns
+    -------
+    segments : numpy.ndarray
+        Array of shape (n, 2, 2) with the branches of each tree in turn,
+        in the order returned by branch_segments for each tree.
+    '''
+    tip_order = np.asarray(tip_order, dtype=object)
+    rank = {nam: i for i, nam in enumerate(tip_order)}
+    # Ties keep their order, so the trees stay in the same order
+    forest = order_tree(join_trees(cts), rank)
+    ranks = tip_ranks(forest, tip_order, len(cts))
+    depth = tree_depth(forest)
+    if max_depth is None:
+        # Without branch lengths, the new root adds one level to every
+        # tree, so depth[0] is the greatest number of branches
+        max_depth = depth[1] if branch_lengths else depth[0]
+    layout = layout_tree(forest, xpos, ypos, height, width,
+                         (max_depth - 1, max_depth, len(tip_order)),
+                         branch_lengths=branch_lengths, reverse=reverse,
+                         tip_pos=ranks)
+
+    # Move each tree so its root or its farthest tip is at the edge
+    roots = forest.children(0)
+    sizes = np.diff(np.append(roots, forest.n_nodes))
+    if align_tips:
+        edge = xpos if reverse else xpos + width
+        if reverse:
+            shift = edge - np.minimum.reduceat(layout.x, roots)
+        else:
+            shift = edge - np.maximum.reduceat(layout.x, roots)
+    else:
+        edge = xpos + width if reverse else xpos
+        shift = edge - layout.x[roots]
+    tree = np.append(-1, np.repeat(np.arange(len(cts)), sizes))
+    shift = np.append(0, np.repeat(shift, sizes))
+    internal = np.flatnonzero(~forest.is_leaf)
+    segments = branch_segments(layout)
+    segments[:forest.n_nodes, :, 0] += shift[:, None]
+    segments[forest.n_nodes:, :, 0] += shift[internal, None]
+    # Group the lines by tree, dropping the branch and vertical line of
+    # the new root which sort first
+    order = np.argsort(np.append(tree, tree[internal]), kind='stable')
+    return segments[order[2:]]
+
+
+def density_raster(segments, extent, shape):
+    '''
+    Counts the number of horizontal and vertical line segments crossing
+    each pixel of an image.
+
+    Parameters
+    ----------
+    segments : numpy.ndarray
+        Array of shape (n, 2, 2) of horizontal and vertical lines.
+    extent : tuple(float, float, float, float)
+        Left, right, bottom and top of the image in axis units.
+    shape : tuple(int, int)
+        Number of rows and columns of the image.
+
+    Returns
+    -------
+    counts : numpy.ndarray
+        Number of lines crossing each pixel, with the first row at the
+        bottom.
+    '''
+    rows, cols = shape
+    left, right, bottom, top = extent
+    xpix = (segments[:, :, 0] - left) / (right - left) * cols
+    ypix = (segments[:, :, 1] - bottom) / (top - bottom) * rows
+    xpix = np.clip(xpix.astype(np.int64), 0, cols - 1)
+    ypix = np.clip(ypix.astype(np.int64), 0, rows - 1)
+    flat = ypix[:, 0] == ypix[:, 1]
+
+    # Each line adds one at its first pixel and subtracts one after its
+    # last pixel, so a cumulative sum along the line gives the counts
+    across = np.zeros((rows, cols + 1), dtype=np.int64)
+    r = ypix[flat, 0]
+    np.add.at(across, (r, xpix[flat].min(axis=1)), 1)
+    np.add.at(across, (r, xpix[flat].max(axis=1) + 1), -1)
+    down = np.zeros((rows + 1, cols), dtype=np.int64)
+    c = xpix[~flat, 0]
+    np.add.at(down, (ypix[~flat].min(axis=1), c), 1)
+    np.add.at(down, (ypix[~flat].max(axis=1) + 1, c), -1)
+    return (np.cumsum(across, axis=1)[:, :-1] +
+            np.cumsum(down, axis=0)[:-1])
+
+
+def plot_densitree(trees, ax,
+                   xpos=0,
+                   ypos=0,
+                   width=10,
+                   height=10,
+                   tip_order=None,
+                   branch_lengths=True,
+                   max_depth=None,
+                   align_tips=True,
+                   reverse=False,
+                   raster=False,
+                   raster_size=(1000, 1000),
+                   show_axis=False,
+                   col_dict=None,
+                   label_dict=None,
+                   font_size=10,
+                   line_col='black',
+                   line_width=1,
+                   alpha=0.05,
+                   bold=None):
+    '''
+    Overlays many trees with the same tips, for example a posterior
+    sample, to show the uncertainty in their topology and branch lengths.
+
+    The tips are placed in a single consensus order and the branches of
+    all of the trees are drawn as one LineCollection or, with
+    raster=True, as one image of the density of the branches.
+
+    Parameters
+    ----------
+    trees : str or iterable
+        Either the path to a file containing one or more Newick trees,
+        or an iterable of Newick strings, paths or CompactTrees.
+        Required.
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object where the trees will be plotted.
+        Required.
+    xpos : float
+        Position of the roots on the x axis. Default 0.
+    ypos : float
+        Position of the bottom of the trees on the y axis. Default 0.
+    width : float
+        Width of the trees, in axis units. Default 10.
+    height : float
+        Height of the trees, in axis units. Default 10.
+    tip_order : list
+        Names of the tips, from the top of the plot to the bottom. By
+        default a consensus order of all of the trees is used.
+    branch_lengths : bool
+        If True, the branch lengths provided in the trees are used,
+        otherwise all branches are fixed to the same length. Default True.
+    max_depth : float
+        Total branch length shown across the full width. By default the
+        depth of the deepest tree.
+    align_tips : bool
+        If True, each tree is shifted so that its farthest tip lines up
+        with the tip labels, otherwise the roots are lined up. Default
+        True.
+    reverse : bool
+        If True, show the roots on the right hand side. Default False.
+    raster : bool
+        If True, draw the density of the branches as an image rather
+        than drawing every line, which is faster for very large samples.
+        Default False.
+    raster_size : tuple(int, int)
+        Number of rows and columns of the image. Default (1000, 1000).
+    show_axis : bool
+        Show the axis on the output plot. Default False.
+    col_dict : dict
+        Dictionary with tip labels as keys and colours as values, tips
+        which are not specified will be black.
+    label_dict : dict
+        Dictionary with current tip labels as keys and desired tip labels
+        as values.
+    font_size : int
+        Font size for tip labels. Default 10.
+    line_col : str or tuple
+        Colour of the branches. Default is black.
+    line_width : float
+        Width of the branches. Default 1.
+    alpha : float
+        Transparency of the branches of each tree. Default 0.05.
+    bold : list
+        List of tip labels to show in bold.
+
+    Returns
+    -------
+    branches : matplotlib.collections.LineCollection or
+               matplotlib.image.AxesImage
+        The branches of all of the trees.
+    texts : list
+        Tip label text objects, from the top of the plot to the bottom.
+    '''
+    cts = list(iter_trees(trees))
+    if not cts:
+        raise RuntimeError("No trees found")
+    if tip_order is None:
+        tip_order = consensus_order(cts)
+    segments = densitree_segments(cts, tip_order, xpos, ypos, width, height,
+                                  branch_lengths=branch_lengths,
+                                  max_depth=max_depth, align_tips=align_tips,
+                                  reverse=reverse)
+
+    autoscale = (ax.get_autoscalex_on(), ax.get_autoscaley_on())
+    if raster:
+        # Pad by half a pixel so lines on the edges are covered
+        rows, cols = raster_size
+        xpad = width / (cols - 1) / 2
+        ypad = height / (rows - 1) / 2
+        extent = (xpos - xpad, xpos + width + xpad,
+                  ypos - ypad, ypos + height + ypad)
+        counts = density_raster(segments, extent, raster_size)
+        # Matches the opacity of the same number of overlapping lines
+        rgba = np.zeros(counts.shape + (4,))
+        rgba[:, :, :3] = to_rgba(line_col)[:3]
+        rgba[:, :, 3] = 1 - (1 - alpha) ** counts
+        branches = ax.imshow(rgba, aspect='auto', interpolation='nearest',
+                             origin='lower', extent=extent, zorder=2)
+        _rescale(ax, autoscale)
+    else:
+        branches = LineCollection(segments, colors=line_col,
+                                  linewidths=line_width, alpha=alpha,
+                                  capstyle='projecting', zorder=2)
+        ax.add_collection(branches)
+        ax.autoscale_view()
+
+    cols = StyleLookup(col_dict, 'black')
+    labels = StyleLookup(label_dict)
+    bold = frozenset(bold or ())
+    if reverse:
+        text_x = xpos
+        ha = 'right'
+    else:
+        text_x = xpos + width
+        ha = 'left'
+    yint = height / max(len(tip_order) - 1, 1)
+    texts = []
+    for i, nam in enumerate(tip_order):
+        texts.append(ax.text(text_x, ypos + height - i * yint,
+                             "  %s  " % labels[nam], color=cols[nam],
+                             fontsize=font_size, va='center', ha=ha,
+                             fontweight='bold' if nam in bold else 'normal'))
+    if not show_axis:
+        ax.set_axis_off()
+    return (branches, texts)
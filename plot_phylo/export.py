@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+import json
+import struct
+import numpy as np
+from plot_phylo.layout import (TreeLayout, branch_segments,
+                               unrooted_segments)
+
+MAGIC = b'PPLAYOUT'
+VERSION = 1
+
+
+def estimate_label_boxes(result):
+    '''
+    Estimates the box around each tip label of a tree drawn by
+    plot_phylo from the number of characters in the label, measuring
+    only the longest label, which is much faster than measuring every
+    label for large trees.
+
+    Parameters
+    ----------
+    result : PlotResult
+        A tree drawn by plot_phylo with a rectangular layout.
+
+    Returns
+    -------
+    boxes : numpy.ndarray
+        Array of shape (n, 4) with the minimum x, minimum y, maximum x
+        and maximum y of each tip label, in axis units, in the same
+        order as result.names.
+    '''
+    layout = result.layout
+    n_chars = np.array([len(txt.get_text()) for txt in result.texts])
+    if len(n_chars) == 0:
+        return np.zeros((0, 4))
+    longest = int(np.argmax(n_chars))
+    renderer = result.ax.figure.canvas.get_renderer()
+    extent = result.texts[longest].get_window_extent(renderer)
+    # Pixels per axis unit
+    origin, unit = result.ax.transData.transform([(0, 0), (1, 1)])
+    sx, sy = np.abs(unit - origin)
+    width = n_chars * extent.width / max(n_chars[longest], 1) / sx
+    half = extent.height / 2 / sy
+    y = layout.y[layout.tips]
+    if layout.ha == 'right':
+        xmin = layout.text_x - width
+    else:
+        xmin = layout.text_x
+    return np.column_stack([xmin, y - half, xmin + width, y + half])
+
+
+def layout_tables(drawn):
+    '''
+    Collects the positions of a laid out tree into three tables of
+    columns, one array per column: nodes, tips and segments.
+
+    nodes has the parent, x, y, dist, support, tip and name of every
+    node, in the order of layout.tree, and xstart for rectangular
+    layouts. Node attributes, such as NHX annotations, are included as
+    attrs.name columns. tips has the node of each tip in the order they
+    are drawn, their label and, for a tree drawn with plot_phylo in a
+    rectangular layout, text_x and estimated label boxes as xmin, ymin,
+    xmax and ymax. segments has the start x0, y0 and end x1, y1 of each
+    line of the branches and the node each line belongs to.
+
+    Parameters
+    ----------
+    drawn : PlotResult, TreeLayout or UnrootedLayout
+        A tree drawn by plot_phylo or a layout.
+
+    Returns
+    -------
+    tables : dict
+        Dictionary with the names of the tables as keys and dictionaries
+        of column names and arrays as values.
+    '''
+    result = drawn if hasattr(drawn, 'layout') else None
+    layout = drawn.layout if result is not None else drawn
+    tree = layout.tree
+    rect = isinstance(layout, TreeLayout)
+
+    nodes = {'parent': tree.parent, 'x': layout.x, 'y': layout.y}
+    if rect:
+        nodes['xstart'] = layout.xstart
+    nodes.update({'dist': tree.dist, 'support': tree.support,
+                  'tip': tree.is_leaf, 'name': tree.names})
+    for key, values in tree.attrs.items():
+        nodes['attrs.%s' % key] = values
+
+    tips = {'node': layout.tips}
+    if result is not None:
+        tips['label'] = result.labels
+    else:
+        tips['label'] = tree.names[layout.tips]
+    if rect:
+        tips['text_x'] = layout.text_x
+        if result is not None:
+            boxes = estimate_label_boxes(result)
+            for i, col in enumerate(('xmin', 'ymin', 'xmax', 'ymax')):
+                tips[col] = boxes[:, i]
+
+    if rect:
+        segs = branch_segments(layout)
+        # One horizontal line per node, then one vertical line per
+        # internal node
+        seg_nodes = np.concatenate([np.arange(tree.n_nodes),
+                                    np.flatnonzero(~tree.is_leaf)])
+    else:
+        segs = unrooted_segments(layout)
+        seg_nodes = np.arange(tree.n_nodes)
+    segments = {'node': seg_nodes,
+                'x0': segs[:, 0, 0], 'y0': segs[:, 0, 1],
+                'x1': segs[:, 1, 0], 'y1': segs[:, 1, 1]}
+    return {'nodes': nodes, 'tips': tips, 'segments': segments}
+
+
+def _json_chunks(values, decimals, chunk_size):
+    # JSON text of an array, one chunk at a time, with null for missing
+    # values
+    values = np.asarray(values)
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        if chunk.dtype == bool:
+            chunk = chunk.astype(np.int8)
+        elif chunk.dtype.kind == 'f':
+            if decimals is not None:
+                chunk = np.round(chunk, decimals)
+            missing = np.isnan(chunk)
+            if missing.any():
+                chunk = chunk.astype(object)
+                chunk[missing] = None
+        text = json.dumps(chunk.tolist(), separators=(',', ':'))
+        yield text[1:-1]
+
+
+def _write_json(out, tables, decimals, chunk_size):
+    out.write(b'{"n_nodes":%i,"n_tips":%i,"n_segments":%i' % (
+        len(tables['nodes']['x']), len(tables['tips']['node']),
+        len(tables['segments']['node'])))
+    for table, columns in tables.items():
+        out.write(b',"%s":{' % table.encode())
+        for i, (name, values) in enumerate(columns.items()):
+            out.write(b'%s%s:[' % (b',' if i else b'',
+                                   json.dumps(name).encode()))
+            first = True
+            for text in _json_chunks(values, decimals, chunk_size):
+                if text:
+                    if not first:
+                        out.write(b',')
+                    out.write(text.encode())
+                    first = False
+            out.write(b']')
+        out.write(b'}')
+    out.write(b'}')
+
+
+def _utf8_buffers(values):
+    # Arrow style string column: the UTF-8 text of every value one after
+    # the other, with the offset of each value in the text
+    values = np.asarray(values, dtype=object)
+    nulls = np.equal(values, None)
+    if nulls.any():
+        values = np.where(nulls, '', values)
+    strings = [str(v) for v in values] if len(values) else []
+    data = np.frombuffer('\0'.join(strings).encode(), dtype=np.uint8)
+    seps = np.flatnonzero(data == 0)
+    if len(seps) == max(len(strings) - 1, 0):
+        starts = np.concatenate([[0], seps + 1]) - np.arange(len(strings))
+        data = data[data != 0]
+    else:
+        # A value contains a null character, so encode one at a time
+        encoded = [s.encode() for s in strings]
+        starts = np.cumsum([0] + [len(e) for e in encoded[:-1]])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    offsets = np.append(starts, len(data)).astype('<i8')
+    if len(strings) == 0:
+        offsets = np.zeros(1, dtype='<i8')
+    return offsets, data, (nulls if nulls.any() else None)
+
+
+def _column_buffers(values):
+    # Type of a column and the arrays which store it
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return 'bool', {'values': values.astype(np.uint8)}
+    if values.dtype.kind in 'iu':
+        return 'int64', {'values': values.astype('<i8')}
+    if values.dtype.kind == 'f':
+        return 'float64', {'values': values.astype('<f8')}
+    offsets, data, nulls = _utf8_buffers(values)
+    buffers = {'offsets': offsets, 'data': data}
+    if nulls is not None:
+        buffers['nulls'] = nulls.astype(np.uint8)
+    return 'utf8', buffers
+
+
+def _write_columns(out, tables):
+    # The header lists every buffer with its offset from the end of the
+    # header, so it is written first and the buffers are then written
+    # straight from the arrays, each starting on a multiple of 8 bytes
+    header = {'version': VERSION, 'tables': dict()}
+    buffers = []
+    offset = 0
+    for table, columns in tables.items():
+        header['tables'][table] = described = dict()
+        for name, values in columns.items():
+            kind, arrays = _column_buffers(values)
+            described[name] = {'type': kind, 'length': len(values)}
+            for role, arr in arrays.items():
+                arr = np.ascontiguousarray(arr)
+                described[name][role] = [offset, arr.nbytes]
+                buffers.append(arr)
+                offset += arr.nbytes + (-arr.nbytes % 8)
+    text = json.dumps(header, separators=(',', ':')).encode()
+    text += b' ' * (-(len(text) + 16) % 8)
+    out.write(MAGIC + struct.pack('<Q', len(text)) + text)
+    for arr in buffers:
+        out.write(memoryview(arr).cast('B'))
+        out.write(b'\0' * (-arr.nbytes % 8))
+
+
+def export_layout(drawn, out,
+                  format=None,
+                  decimals=None,
+                  chunk_size=1 << 16):
+    '''
+    Writes the positions of every node, tip label and branch of a laid
+    out tree, for drawing the tree elsewhere, for example in a browser.
+    The columns are written directly from the arrays of the layout, as
+    described in layout_tables, without creating an object for each
+    node.
+
+    Two formats are available. "json" writes one JSON object with the
+    number of nodes, tips and segments and an object for each table,
+    with a list of values for each column. The lists are written in
+    chunks as they are converted, True and False are written as 1 and 0
+    and missing values are null.
+
+    "columns" writes a binary file with one buffer per column, as in
+    Apache Arrow. The file starts with the bytes PPLAYOUT, the length
+    of a JSON header as an unsigned 64 bit little endian integer and the
+    header, which gives the type and length of each column and the
+    position and size of its buffers, counted from the end of the header.
+    Numbers are little endian float64, int64 or uint8 for True and
+    False. Text columns have an int64 offsets buffer with the start of
+    each value in a UTF-8 data buffer and the end of the last value, and
+    a uint8 nulls buffer if any values are missing. Each buffer starts
+    on a multiple of 8 bytes, so it can be viewed directly as a typed
+    array.
+
+    Parameters
+    ----------
+    drawn : PlotResult, TreeLayout or UnrootedLayout
+        A tree drawn by plot_phylo or a layout.
+    out : str or file object
+        Path to write to, or a file object open for writing bytes.
+    format : str
+        "json" or "columns". By default "json" if the path ends with
+        .json and "columns" otherwise.
+    decimals : int
+        Number of decimal places to round numbers to in JSON, to make
+        the file smaller. By default they are not rounded.
+    chunk_size : int
+        Number of values converted to JSON at once.
+    '''
+    if format is None:
+        format = ('json' if isinstance(out, str) and
+                  out.lower().endswith('.json') else 'columns')
+    if format not in ('json', 'columns'):
+        raise RuntimeError("Unknown layout format %s, use json or "
+                           "columns" % format)
+    tables = layout_tables(drawn)
+    if isinstance(out, str):
+        with open(out, 'wb') as outf:
+            export_layout(drawn, outf, format=format, decimals=decimals,
+                          chunk_size=chunk_size)
+        return
+    if format == 'json':
+        _write_json(out, tables, decimals, chunk_size)
+    else:
+        _write_columns(out, tables)
+
+
+def read_layout(path):
+    '''
+    Reads a layout written by export_layout, in either format.
+
+    Columns of numbers in the columns format are read without copying
+    them from a memory mapped file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    tables : dict
+        Dictionary with the names of the tables as keys and dictionaries
+        of column names and arrays as values, as returned by
+        layout_tables.
+    '''
+    with open(path, 'rb') as inf:
+        start = inf.read(len(MAGIC))
+        if start != MAGIC:
+            inf.seek(0)
+            data = json.load(inf)
+            return {table: {name: np.array(values)
+                            for name, values in data[table].items()}
+                    for table in ('nodes', 'tips', 'segments')}
+        size, = struct.unpack('<Q', inf.read(8))
+        header = json.loads(inf.read(size))
+    raw = np.memmap(path, dtype=np.uint8, mode='r')
+    base = len(MAGIC) + 8 + size
+    types = {'float64': '<f8', 'int64': '<i8', 'bool': np.uint8}
+
+    def view(spec, dtype):
+        offset, nbytes = spec
+        return raw[base + offset:base + offset + nbytes].view(dtype)
+
+    tables = dict()
+    for table, columns in header['tables'].items():
+        tables[table] = dict()
+        for name, spec in columns.items():
+            if spec['type'] != 'utf8':
+                values = view(spec['values'], types[spec['type']])
+                if spec['type'] == 'bool':
+                    values = values.astype(bool)
+            else:
+                offsets = view(spec['offsets'], '<i8')
+                data = bytes(view(spec['data'], np.uint8))
+                values = np.array([data[a:b].decode() for a, b in
+                                   zip(offsets[:-1], offsets[1:])],
+                                  dtype=object)
+                if 'nulls' in spec:
+                    values[view(spec['nulls'], np.uint8) == 1] = None
+            tables[table][name] = values
+    return tables
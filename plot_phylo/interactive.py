@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+import numpy as np
+from plot_phylo.layout import TreeLayout
+
+
+class SortedIndex(object):
+    '''
+    Points sorted on the y axis, so the points within a band of y values
+    are found with two binary searches and only these are compared.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Position of each point on the x axis.
+    y : numpy.ndarray
+        Position of each point on the y axis.
+    '''
+    __slots__ = ('order', 'x', 'y')
+
+    def __init__(self, x, y):
+        self.order = np.argsort(y, kind='stable')
+        self.x = np.asarray(x, dtype=float)[self.order]
+        self.y = np.asarray(y, dtype=float)[self.order]
+
+    def band(self, y, dy):
+        '''
+        Finds the points with a y position within dy of y, in O(log n)
+        plus the number of points found.
+
+        Returns
+        -------
+        points : numpy.ndarray
+            Original indices of the points, in order of their y position.
+        x : numpy.ndarray
+            Position of these points on the x axis.
+        y : numpy.ndarray
+            Position of these points on the y axis.
+        '''
+        start = np.searchsorted(self.y, y - dy, side='left')
+        end = np.searchsorted(self.y, y + dy, side='right')
+        return (self.order[start:end], self.x[start:end],
+                self.y[start:end])
+
+    def nearest(self, x, y, sx, sy, radius):
+        '''
+        Finds the nearest point to a position, measuring distances in
+        pixels.
+
+        Parameters
+        ----------
+        x : float
+            Position on the x axis.
+        y : float
+            Position on the y axis.
+        sx : float
+            Pixels per axis unit on the x axis.
+        sy : float
+            Pixels per axis unit on the y axis.
+        radius : float
+            Largest distance to search, in pixels.
+
+        Returns
+        -------
+        point : int or None
+            Index of the nearest point, None if there are no points
+            within the radius.
+        '''
+        points, px, py = self.band(y, radius / sy)
+        if len(points) == 0:
+            return None
+        dist = np.hypot((px - x) * sx, (py - y) * sy)
+        best = np.argmin(dist)
+        if dist[best] > radius:
+            return None
+        return int(points[best])
+
+
+class TreeInspector(object):
+    '''
+    Shows the name and support of the node or tip label under the mouse
+    in a tooltip and reports clicks on nodes, for a tree drawn by
+    plot_phylo.
+
+    The nodes and tip labels are indexed by their y position from the
+    layout, so each mouse movement only compares the points close to the
+    mouse rather than asking every text object if it contains the mouse.
+    Tip labels are treated as boxes with a width estimated from their
+    number of characters. The tooltip is animated and drawn with
+    blitting where the canvas supports it, so the tree itself is not
+    drawn again as the mouse moves.
+
+    Parameters
+    ----------
+    result : PlotResult
+        A tree drawn by plot_phylo.
+    tolerance : float
+        Largest distance from the mouse to a node, in pixels. Default 8.
+    on_click : function
+        Function called with the information about a node, as returned
+        by info, when the node is clicked. Default None.
+    show_support : bool
+        If True, show the support of internal nodes in the tooltip.
+        Default True.
+    hover : bool
+        If True, show a tooltip while the mouse is over a node. Default
+        True.
+
+    Attributes
+    ----------
+    node : int or None
+        Node of layout.tree under the mouse.
+    tooltip : matplotlib.text.Annotation
+        The tooltip.
+    marker : matplotlib.lines.Line2D
+        Circle drawn around the node under the mouse.
+    '''
+    def __init__(self, result,
+                 tolerance=8,
+                 on_click=None,
+                 show_support=True,
+                 hover=True):
+        self.result = result
+        self.ax = result.ax
+        self.canvas = self.ax.figure.canvas
+        self.tolerance = tolerance
+        self.on_click = on_click
+        self.show_support = show_support
+        self.node = None
+        self.background = None
+
+        layout = result.layout
+        self.nodes = SortedIndex(layout.x, layout.y)
+        if isinstance(layout, TreeLayout) and len(result.texts):
+            self.labels = SortedIndex(layout.text_x, layout.y[layout.tips])
+            self.n_chars = np.array([len(txt.get_text())
+                                     for txt in result.texts])
+            # Measure a single label to convert characters to pixels
+            longest = int(np.argmax(self.n_chars))
+            renderer = self.canvas.get_renderer()
+            extent = result.texts[longest].get_window_extent(renderer)
+            self.char_width = extent.width / max(self.n_chars[longest], 1)
+            self.label_height = extent.height
+        else:
+            self.labels = None
+
+        self.tooltip = self.ax.annotate(
+            "", xy=(0, 0), xytext=(12, 12), textcoords='offset points',
+            bbox={'boxstyle': 'round', 'fc': 'lightyellow', 'alpha': 0.9},
+            fontsize=9, zorder=10, visible=False, animated=True,
+            annotation_clip=False)
+        self.marker = self.ax.plot([], [], 'o', ms=10, mfc='none',
+                                   mec='red', zorder=10,
+                                   animated=True)[0]
+        self.cids = [self.canvas.mpl_connect('draw_event', self._on_draw),
+                     self.canvas.mpl_connect('button_press_event',
+                                             self._on_press)]
+        if hover:
+            self.cids.append(self.canvas.mpl_connect('motion_notify_event',
+                                                     self._on_move))
+
+    def disconnect(self):
+        '''
+        Stops responding to the mouse and removes the tooltip.
+        '''
+        for cid in self.cids:
+            self.canvas.mpl_disconnect(cid)
+        self.cids = []
+        self.tooltip.remove()
+        self.marker.remove()
+        self.canvas.draw_idle()
+
+    def _scale(self):
+        # Pixels per axis unit, the axes are always linear
+        origin, unit = self.ax.transData.transform([(0, 0), (1, 1)])
+        return np.abs(unit - origin)
+
+    def _label_at(self, x, y, sx, sy):
+        # Tip whose label box contains the position
+        tips, tx, ty = self.labels.band(y, self.label_height / 2 / sy)
+        if len(tips) == 0:
+            return None
+        width = self.n_chars[tips] * self.char_width / sx
+        if self.result.layout.ha == 'right':
+            inside = (x <= tx) & (x >= tx - width)
+        else:
+            inside = (x >= tx) & (x <= tx + width)
+        if not inside.any():
+            return None
+        hits = np.flatnonzero(inside)
+        best = hits[np.argmin(np.abs(ty[hits] - y))]
+        return int(self.result.nodes[tips[best]])
+
+    def nearest(self, x, y):
+        '''
+        Finds the node at a position, either the nearest node within the
+        tolerance or the tip whose label contains the position.
+
+        Parameters
+        ----------
+        x : float
+            Position on the x axis, in axis units.
+        y : float
+            Position on the y axis, in axis units.
+
+        Returns
+        -------
+        node : int or None
+            Index of the node in layout.tree, None if there is none.
+        '''
+        sx, sy = self._scale()
+        node = self.nodes.nearest(x, y, sx, sy, self.tolerance)
+        if node is None and self.labels is not None:
+            node = self._label_at(x, y, sx, sy)
+        return node
+
+    def info(self, node):
+        '''
+        Describes a node.
+
+        Parameters
+        ----------
+        node : int
+            Index of the node in layout.tree.
+
+        Returns
+        -------
+        info : dict
+            The node, its name, support, the length of its branch, its
+            position as x and y and if it is a tip.
+        '''
+        tree = self.result.layout.tree
+        return {'node': node,
+                'name': tree.names[node],
+                'support': float(tree.support[node]),
+                'dist': float(tree.dist[node]),
+                'x': float(self.result.layout.x[node]),
+                'y': float(self.result.layout.y[node]),
+                'tip': bool(tree.is_leaf[node])}
+
+    def _describe(self, info):
+        lines = []
+        if info['name']:
+            lines.append(str(info['name']))
+        elif not info['tip']:
+            lines.append("node %i" % info['node'])
+        if self.show_support and not info['tip']:
+            lines.append("support: %g" % info['support'])
+        lines.append("length: %g" % info['dist'])
+        return "\n".join(lines)
+
+    def _on_draw(self, event):
+        # The whole figure has been drawn, so save it to blit over
+        if self.canvas.supports_blit:
+            self.background = self.canvas.copy_from_bbox(
+                self.ax.figure.bbox)
+            self._draw_tooltip()
+
+    def _draw_tooltip(self):
+        if self.tooltip.get_visible():
+            self.ax.draw_artist(self.marker)
+            self.ax.draw_artist(self.tooltip)
+
+    def _show(self, node):
+        if node == self.node:
+            return
+        self.node = node
+        if node is None:
+            self.tooltip.set_visible(False)
+            self.marker.set_data([], [])
+        else:
+            info = self.info(node)
+            self.tooltip.xy = (info['x'], info['y'])
+            self.tooltip.set_text(self._describe(info))
+            self.tooltip.set_visible(True)
+            self.marker.set_data([info['x']], [info['y']])
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        # Only the tooltip is drawn, over the saved image of the tree
+        self.canvas.restore_region(self.background)
+        self._draw_tooltip()
+        self.canvas.blit(self.ax.figure.bbox)
+
+    def _on_move(self, event):
+        if event.inaxes is not self.ax:
+            self._show(None)
+            return
+        self._show(self.nearest(event.xdata, event.ydata))
+
+    def _on_press(self, event):
+        if event.inaxes is not self.ax or self.on_click is None:
+            return
+        node = self.nearest(event.xdata, event.ydata)
+        if node is not None:
+            self.on_click(self.info(node))
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+import numpy as np
+from plot_phylo.compact import (node_depths, subtree_sizes, _level_groups,
+                                _root_distances)
+
+
+class TreeLayout(object):
+    '''
+    Positions of every node of a tree on the axis, in axis units.
+
+    Attributes
+    ----------
+    tree : CompactTree
+        The tree which has been laid out.
+    x : numpy.ndarray
+        Position of each node on the x axis - the tip of the branch for
+        leaves and the vertical line for internal nodes.
+    xstart : numpy.ndarray
+        Position on the x axis where the branch leading to each node
+        starts.
+    y : numpy.ndarray
+        Position of each node on the y axis.
+    tips : numpy.ndarray
+        Indices of the leaves, ordered from the top of the tree.
+    text_x : numpy.ndarray
+        Position of each tip label on the x axis, in the same order as
+        tips.
+    ali_x : numpy.ndarray or None
+        End of the alignment line for each tip if the tips are aligned,
+        in the same order as tips.
+    ha : str
+        Horizontal alignment of the tip labels.
+    reverse : bool
+        True if the root is on the right hand side.
+    '''
+    __slots__ = ('tree', 'x', 'xstart', 'y', 'tips', 'text_x', 'ali_x',
+                 'ha', 'reverse')
+
+    def __init__(self, tree, x, xstart, y, tips, text_x, ali_x, ha,
+                 reverse):
+        self.tree = tree
+        self.x = x
+        self.xstart = xstart
+        self.y = y
+        self.tips = tips
+        self.text_x = text_x
+        self.ali_x = ali_x
+        self.ha = ha
+        self.reverse = reverse
+
+
+class UnrootedLayout(object):
+    '''
+    Positions of every node of a tree drawn unrooted, in axis units.
+
+    Attributes
+    ----------
+    tree : CompactTree
+        The tree which has been laid out.
+    x : numpy.ndarray
+        Position of each node on the x axis.
+    y : numpy.ndarray
+        Position of each node on the y axis.
+    tips : numpy.ndarray
+        Indices of the leaves, in the order they are placed around the
+        tree, anticlockwise.
+    angle : numpy.ndarray
+        Direction of the branch leading to each node, in radians.
+    rotation : numpy.ndarray
+        Rotation of each tip label in degrees, in the same order as
+        tips, so that no label is upside down.
+    ha : numpy.ndarray
+        Horizontal alignment of each tip label, in the same order as
+        tips.
+    scale : float
+        Length of one unit of branch length in axis units.
+    '''
+    __slots__ = ('tree', 'x', 'y', 'tips', 'angle', 'rotation', 'ha',
+                 'scale')
+
+    def __init__(self, tree, x, y, tips, angle, rotation, ha, scale):
+        self.tree = tree
+        self.x = x
+        self.y = y
+        self.tips = tips
+        self.angle = angle
+        self.rotation = rotation
+        self.ha = ha
+        self.scale = scale
+
+
+def layout_tree(ct, xpos=0, ypos=0, height=10, width=10, depth=None,
+                align_tips=False, rev_align_tips=False,
+                branch_lengths=True, reverse=False, tip_pos=None):
+    '''
+    Calculates the position of every node of the tree using vectorised
+    operations on the arrays of a CompactTree. The positions match those
+    used by draw_tree.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to lay out.
+    xpos : float
+        Position of the root node on the x axis, in axis units.
+    ypos : float
+        Position of the bottom of the tree on the y axis, in axis units.
+    height : float
+        Height of the tree in axis units.
+    width : float
+        Width of the tree in axis units.
+    depth : tuple(float, float, float)
+        Total height and width of the tree in terms of number of
+        nodes, total branch length, number of tips.
+    align_tips : bool
+        If True, the tip labels will be aligned rather than positioned at
+        the end of the branches. Default False.
+    rev_align_tips : bool
+        If True  the tip labels are right aligned
+        if reverse=False and left aligned if reverse=True.
+    branch_lengths : bool
+        If True, use the branch lengths provided in the tree, otherwise fix
+        all branches to the same length. Default True.
+    reverse : bool
+        If True, reverse the tree on the y-axis, showing the root on the
+        right hand side. Default False.
+    tip_pos : numpy.ndarray
+        Position of each leaf, in the order of ct.leaves, counted in
+        tips from the top of the tree. By default the leaves are placed
+        in order.
+
+    Returns
+    -------
+    layout : TreeLayout
+        Node positions.
+    '''
+    # Branch weights and total width in tree units, as in draw_tree
+    if branch_lengths:
+        weights = ct.dist
+        tot_width = depth[1]
+        cum = node_depths(ct)
+    else:
+        weights = np.ones(ct.n_nodes)
+        tot_width = depth[0] + 1
+        cum = node_depths(ct, topology_only=True)
+    xint = width / tot_width
+
+    # Mirrored trees run from right to left
+    if reverse:
+        origin = xpos + width
+        sign = -1
+        ha = 'right'
+    else:
+        origin = xpos
+        sign = 1
+        ha = 'left'
+    x = origin + sign * cum * xint
+    xstart = x - sign * weights * xint
+
+    # Tips are evenly spaced from the top of the tree, each internal
+    # node is halfway between its first and last child
+    tips = ct.leaves
+    yint = height / max(depth[2] - 1, 1)
+    y = np.zeros(ct.n_nodes)
+    if tip_pos is None:
+        tip_pos = np.arange(len(tips))
+    y[tips] = ypos + height - tip_pos * yint
+    first = ct.child_idx[ct.child_ptr[:-1][~ct.is_leaf]]
+    last = ct.child_idx[ct.child_ptr[1:][~ct.is_leaf] - 1]
+    internal = np.flatnonzero(~ct.is_leaf)
+    pos = np.zeros(ct.n_nodes, dtype=np.int64)
+    pos[internal] = np.arange(len(internal))
+    for nodes in _level_groups(ct.level):
+        nodes = nodes[~ct.is_leaf[nodes]]
+        y[nodes] = (y[first[pos[nodes]]] + y[last[pos[nodes]]]) / 2
+
+    if align_tips or rev_align_tips:
+        ali_x = np.full(len(tips), origin + sign * (width + 1))
+        text_x = ali_x.copy()
+    else:
+        ali_x = None
+        text_x = x[tips]
+    return TreeLayout(ct, x, xstart, y, tips, text_x, ali_x, ha, reverse)
+
+
+def branch_segments(layout):
+    '''
+    Converts the node positions of a layout to the line segments of the
+    branches.
+
+    Parameters
+    ----------
+    layout : TreeLayout
+        Positions of the nodes of the tree.
+
+    Returns
+    -------
+    segments : numpy.ndarray
+        Array of shape (n, 2, 2) of the start and end of each line, the
+        horizontal line leading to each node in node order followed by
+        the vertical line of each internal node.
+    '''
+    ct = layout.tree
+    x = layout.x
+    y = layout.y
+    internal = np.flatnonzero(~ct.is_leaf)
+    first = ct.child_idx[ct.child_ptr[internal]]
+    last = ct.child_idx[ct.child_ptr[internal + 1] - 1]
+    segments = np.empty((ct.n_nodes + len(internal), 2, 2))
+    segments[:ct.n_nodes, 0, 0] = x
+    segments[:ct.n_nodes, 1, 0] = layout.xstart
+    segments[:ct.n_nodes, :, 1] = y[:, None]
+    segments[ct.n_nodes:, :, 0] = x[internal, None]
+    segments[ct.n_nodes:, 0, 1] = y[first]
+    segments[ct.n_nodes:, 1, 1] = y[last]
+    return segments
+
+
+def unrooted_layout(ct, xpos=0, ypos=0, width=10, height=10,
+                    branch_lengths=True):
+    '''
+    Calculates the position of every node of the tree with the equal
+    angle algorithm, drawing the tree unrooted. Each node is given a
+    wedge of the circle in proportion to its number of tips, which is
+    split between its children, and its branch points to the middle of
+    its wedge.
+
+    In preorder the tips below each node are a contiguous run, so the
+    wedges come from a cumulative count of the tips and the positions
+    from cumulative sums along the paths to the root, with no per node
+    loop.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        Tree to lay out.
+    xpos : float
+        Position of the left of the tree on the x axis, in axis units.
+    ypos : float
+        Position of the bottom of the tree on the y axis, in axis units.
+    width : float
+        Width of the tree in axis units.
+    height : float
+        Height of the tree in axis units.
+    branch_lengths : bool
+        If True, use the branch lengths provided in the tree, otherwise
+        fix all branches to the same length. Default True.
+
+    Returns
+    -------
+    layout : UnrootedLayout
+        Node positions, scaled to fit in the area given without
+        changing the aspect ratio.
+    '''
+    is_leaf = ct.is_leaf
+    unit = 2 * np.pi / ct.n_leaves
+    before = np.cumsum(is_leaf) - is_leaf
+    angle = (before + subtree_sizes(ct) / 2) * unit
+    if branch_lengths:
+        weights = ct.dist
+    else:
+        weights = np.ones(ct.n_nodes)
+    x = _root_distances(ct.parent, weights * np.cos(angle))
+    y = _root_distances(ct.parent, weights * np.sin(angle))
+
+    # Fit the tree into the area, centred
+    xrange = max(x.max() - x.min(), 1e-12)
+    yrange = max(y.max() - y.min(), 1e-12)
+    scale = min(width / xrange, height / yrange)
+    x = xpos + width / 2 + (x - (x.max() + x.min()) / 2) * scale
+    y = ypos + height / 2 + (y - (y.max() + y.min()) / 2) * scale
+
+    # Labels on the left hand side are flipped to read left to right
+    tips = ct.leaves
+    degrees = np.degrees(angle[tips])
+    flip = (degrees > 90) & (degrees < 270)
+    rotation = np.where(flip, degrees - 180, degrees)
+    rotation[rotation >= 270] -= 360
+    ha = np.where(flip, 'right', 'left')
+    return UnrootedLayout(ct, x, y, tips, angle, rotation, ha, scale)
+
+
+def unrooted_segments(layout):
+    '''
+    Converts the node positions of an unrooted layout to the line
+    segments of the branches.
+
+    Parameters
+    ----------
+    layout : UnrootedLayout
+        Positions of the nodes of the tree.
+
+    Returns
+    -------
+    segments : numpy.ndarray
+        Array of shape (n, 2, 2) of the start and end of the branch
+        leading to each node, in node order. The root has a branch of
+        length zero.
+    '''
+    parent = layout.tree.parent.copy()
+    parent[0] = 0
+    segments = np.empty((layout.tree.n_nodes, 2, 2))
+    segments[:, 0, 0] = layout.x[parent]
+    segments[:, 0, 1] = layout.y[parent]
+    segments[:, 1, 0] = layout.x
+    segments[:, 1, 1] = layout.y
+    return segments
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+import array
+import bz2
+import codecs
+import itertools
+import lzma
+import os
+import re
+import zlib
+from plot_phylo.compact import CompactTree, attr_columns
+
+# Brackets, separators, comments, quoted labels and any other label or
+# branch length, which may contain spaces
+_TOKENS = re.compile(r"[(),;:]|\[[^\]]*\]|'(?:[^']|'')*'|[^(),;:\[']+")
+# key=value pairs of extended Newick comments, values may be quoted or
+# in braces
+_PAIRS = re.compile(r'\s*([^=,\s]+)\s*=\s*("[^"]*"|\{[^}]*\}|[^,]*)')
+
+# Magic numbers of the supported compression formats, with a function
+# creating an incremental decompressor for each
+_COMPRESSED = [(b'\x1f\x8b', lambda: zlib.decompressobj(wbits=47)),
+               (b'\xfd7zXZ\x00', lzma.LZMADecompressor),
+               (b'BZh', bz2.BZ2Decompressor)]
+
+
+def is_compressed(path):
+    '''
+    Checks if a file is compressed with gzip, xz or bzip2, from the
+    first bytes of the file rather than its extension.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    compressed : bool
+        True if the file is compressed in one of these formats.
+    '''
+    with open(path, 'rb') as inf:
+        head = inf.read(6)
+    return any(head.startswith(magic) for magic, _ in _COMPRESSED)
+
+
+def read_chunks(source, chunk_size=1 << 16):
+    '''
+    Reads text from a file one chunk at a time, decompressing gzip, xz
+    and bzip2 files as they are read, so neither the compressed nor the
+    decompressed file is ever held in memory.
+
+    Parameters
+    ----------
+    source : str or file object
+        Either the path to a file or an open file object, in binary or
+        text mode. The format is recognised from the first bytes of the
+        file, files which are not compressed are read as they are.
+    chunk_size : int
+        Number of bytes to read from the file at once.
+
+    Yields
+    ------
+    text : str
+        Each chunk of text, decoded as UTF-8.
+    '''
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as inf:
+            yield from read_chunks(inf, chunk_size)
+        return
+    data = source.read(chunk_size)
+    if isinstance(data, str):
+        while data:
+            yield data
+            data = source.read(chunk_size)
+        return
+    # Enough of the file is needed to recognise the longest magic number
+    while 0 < len(data) < 6:
+        more = source.read(chunk_size)
+        if not more:
+            break
+        data += more
+    new = next((new for magic, new in _COMPRESSED
+                if data.startswith(magic)), None)
+    decompressor = new() if new is not None else None
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while data:
+        if decompressor is not None:
+            out = []
+            while data:
+                out.append(decompressor.decompress(data))
+                data = b''
+                if decompressor.eof:
+                    # Files can contain several compressed streams one
+                    # after the other
+                    data = decompressor.unused_data
+                    decompressor = new()
+            data = b''.join(out)
+        yield decoder.decode(data)
+        data = source.read(chunk_size)
+    yield decoder.decode(b'', final=True)
+
+
+def _tokens(chunks):
+    # Tokens of a Newick tree read in chunks. A token at the end of a
+    # chunk may continue in the next one, so it is kept back until the
+    # next chunk is read, as is an unfinished quote or comment.
+    rest = ''
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        text = rest + chunk if not final else rest
+        pos = 0
+        end = len(text)
+        while pos < end:
+            match = _TOKENS.match(text, pos)
+            if match is None:
+                if final:
+                    raise RuntimeError("Error in parsing Newick format: "
+                                       "unfinished quote or comment")
+                break
+            if match.end() == end and not final:
+                break
+            token = match.group().strip()
+            if token:
+                yield token
+            pos = match.end()
+        rest = text[pos:]
+
+
+def parse_annotation(comment):
+    '''
+    Reads the attributes in an NHX or extended Newick comment.
+
+    Parameters
+    ----------
+    comment : str
+        The comment, including the square brackets, either in NHX format
+        [&&NHX:key=value:key=value] or in the extended Newick format used
+        by BEAST and others, [&key=value,key=value].
+
+    Returns
+    -------
+    attrs : dict
+        Attribute names as keys and values as strings, empty if the
+        comment is not an annotation.
+    '''
+    body = comment[1:-1]
+    if body.startswith('&&NHX'):
+        pairs = (item.partition('=') for item in body[5:].split(':')
+                 if item)
+        return {key: value for key, _, value in pairs}
+    if body.startswith('&'):
+        return {key: value.strip('"')
+                for key, value in _PAIRS.findall(body[1:])}
+    return dict()
+
+
+def parse_newick(newick):
+    '''
+    Reads a Newick tree into a CompactTree in a single pass, including
+    any NHX or extended Newick annotations, which are stored as one
+    array per attribute in the attrs of the tree.
+
+    Labels of internal nodes are read as support values if they are
+    numbers and as names otherwise. As in ete3, branches without a
+    length are given a length of 1, except above the root, and quoted
+    labels keep their quotes.
+
+    Parameters
+    ----------
+    newick : str or iterable
+        Newick formatted tree, either as one string or as an iterable of
+        consecutive pieces of the text, such as those yielded by
+        read_chunks. The pieces are only read until the end of the first
+        tree.
+
+    Returns
+    -------
+    ct : CompactTree
+        Array representation of the tree.
+    '''
+    # Nodes are created as they are opened, which is preorder. Numbers
+    # are kept in typed arrays, which take a fraction of the memory of
+    # lists of Python floats
+    parent = array.array('q', [-1])
+    dist = array.array('d', [0.0])
+    support = array.array('d', [1.0])
+    names = ['']
+    columns = dict()
+    stack = []
+    cur = 0
+    after_colon = False
+    closed = False
+    if isinstance(newick, str):
+        newick = [newick]
+    for token in _tokens(newick):
+        if token == '(':
+            stack.append(cur)
+            cur = len(parent)
+            parent.append(stack[-1])
+            dist.append(1.0)
+            support.append(1.0)
+            names.append('')
+            closed = False
+        elif token == ',':
+            if not stack:
+                raise RuntimeError("Error in parsing Newick format: "
+                                   "unexpected ','")
+            cur = len(parent)
+            parent.append(stack[-1])
+            dist.append(1.0)
+            support.append(1.0)
+            names.append('')
+            closed = False
+        elif token == ')':
+            if not stack:
+                raise RuntimeError("Error in parsing Newick format: "
+                                   "unbalanced brackets")
+            cur = stack.pop()
+            closed = True
+        elif token == ':':
+            after_colon = True
+            continue
+        elif token == ';':
+            break
+        elif token[0] == '[':
+            for key, value in parse_annotation(token).items():
+                columns.setdefault(key, dict())[cur] = value
+            # Comments may come between a colon and the branch length,
+            # as in BEAST2 branch annotations
+            continue
+        elif after_colon:
+            try:
+                dist[cur] = float(token)
+            except ValueError:
+                raise RuntimeError("Error in parsing Newick format: "
+                                   "invalid branch length '%s'" % token)
+        elif closed:
+            try:
+                support[cur] = float(token)
+            except ValueError:
+                names[cur] = token
+        else:
+            names[cur] = token
+        after_colon = False
+    if stack:
+        raise RuntimeError("Error in parsing Newick format: "
+                           "unbalanced brackets")
+    return CompactTree(parent, dist, support, names,
+                       attr_columns(columns, len(parent)))
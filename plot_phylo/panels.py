@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+import os
+import numpy as np
+import matplotlib.colors
+
+# Default colours for alignment characters, nucleotides use the first
+# four entries, amino acids are coloured by their properties
+alignment_colours = {'A': '#64c864', 'C': '#6464ff', 'G': '#ffa500',
+                     'T': '#ff6464', 'U': '#ff6464',
+                     'R': '#e6a0a0', 'H': '#8282d2', 'K': '#e6a0a0',
+                     'D': '#e66464', 'E': '#e66464', 'S': '#fab45a',
+                     'N': '#00dcdc', 'Q': '#00dcdc', 'P': '#dc9682',
+                     'I': '#0f820f', 'L': '#0f820f', 'M': '#e6e600',
+                     'F': '#3232aa', 'W': '#b45ab4', 'Y': '#3232aa',
+                     'V': '#0f820f', '-': 'white', '.': 'white'}
+
+
+def heatmap_matrix(data, names):
+    '''
+    Reorders the rows of a matrix to match a list of tip names, in one
+    vectorised step. Tips without a row are filled with NaN.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame, dict or tuple
+        Either a DataFrame indexed by tip name, a dictionary with tip
+        names as keys and rows of values as values, or a tuple of a list
+        of row names and a 2D array.
+    names : list
+        Tip names in the desired order.
+
+    Returns
+    -------
+    matrix : numpy.ndarray
+        Array with one row per name.
+    columns : list
+        Column labels, if provided by a DataFrame, otherwise None.
+    '''
+    columns = None
+    if hasattr(data, 'index') and hasattr(data, 'to_numpy'):
+        rownames = list(data.index)
+        values = data.to_numpy(dtype=float)
+        columns = list(data.columns)
+    elif isinstance(data, dict):
+        rownames = list(data.keys())
+        values = np.array([data[k] for k in rownames], dtype=float)
+    else:
+        rownames, values = data
+        values = np.asarray(values, dtype=float)
+    values = values.reshape(len(rownames), -1)
+
+    lookup = dict(zip(rownames, range(len(rownames))))
+    rows = np.array([lookup.get(n, -1) for n in names], dtype=np.int64)
+    matrix = np.full((len(names), values.shape[1]), np.nan)
+    matrix[rows >= 0] = values[rows[rows >= 0]]
+    return (matrix, columns)
+
+
+def tip_label_edge(ax, texts, reverse):
+    '''
+    Finds the outer edge of the tip labels, the rightmost point for a
+    standard tree or the leftmost point for a mirrored tree, in axis
+    units.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    texts : list
+        Tip label text objects.
+    reverse : bool
+        True if the root of the tree is on the right hand side.
+
+    Returns
+    -------
+    edge : float
+        Position of the edge of the labels on the x axis.
+    '''
+    renderer = ax.figure.canvas.get_renderer()
+    inv = ax.transData.inverted()
+    xs = np.array([inv.transform(t.get_window_extent(renderer))[:, 0]
+                   for t in texts])
+    if reverse:
+        return xs.min()
+    return xs.max()
+
+
+def draw_heatmap(ax, layout, data, xpos, width,
+                 cmap='viridis',
+                 vmin=None,
+                 vmax=None):
+    '''
+    Draws a matrix of values next to the tips of a tree as a single
+    image, with one row aligned to each tip.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    layout : TreeLayout
+        Positions of the nodes of the tree.
+    data : pandas.DataFrame, dict or tuple
+        Values to plot, either a DataFrame indexed by tip name, a
+        dictionary with tip names as keys and rows of values as values,
+        or a tuple of a list of row names and a 2D array. Tips without
+        values are left blank.
+    xpos : float
+        Position of the side of the heatmap closest to the tree on the x
+        axis, in axis units.
+    width : float
+        Width of the heatmap in axis units.
+    cmap : str or matplotlib.colors.Colormap
+        Colour map for the values. Default viridis.
+    vmin : float
+        Value mapped to the bottom of the colour map.
+    vmax : float
+        Value mapped to the top of the colour map.
+
+    Returns
+    -------
+    image : matplotlib.image.AxesImage
+        The heatmap.
+    '''
+    names = layout.tree.names[layout.tips]
+    matrix, _ = heatmap_matrix(data, names)
+
+    # Each row spans half the distance to the neighbouring tips, tips are
+    # evenly spaced
+    y = layout.y[layout.tips]
+    if len(y) > 1:
+        half = (y[0] - y[-1]) / (len(y) - 1) / 2
+    else:
+        half = 0.5
+    if layout.reverse:
+        left = xpos - width
+    else:
+        left = xpos
+    autoscale = (ax.get_autoscalex_on(), ax.get_autoscaley_on())
+    image = ax.imshow(np.ma.masked_invalid(matrix), aspect='auto',
+                      interpolation='nearest', origin='upper', cmap=cmap,
+                      vmin=vmin, vmax=vmax,
+                      extent=(left, left + width, y[-1] - half, y[0] + half))
+    _rescale(ax, autoscale)
+    return (image)
+
+
+def place_beside_labels(ax, images, texts, reverse, max_iter=5):
+    '''
+    Moves images so that they start at the outer edge of the tip labels,
+    side by side in the order given.
+
+    The size of the labels in axis units depends on the axis limits,
+    which change as the images are moved if the axis is autoscaled, so
+    the position is refined until it is stable.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    images : list
+        matplotlib.image.AxesImage objects to move.
+    texts : list
+        Tip label text objects.
+    reverse : bool
+        True if the root of the tree is on the right hand side, the
+        images are then placed to the left of the labels.
+    max_iter : int
+        Maximum number of refinements.
+    '''
+    autoscale = (ax.get_autoscalex_on(), ax.get_autoscaley_on())
+    for i in range(max_iter):
+        edge = tip_label_edge(ax, texts, reverse)
+        if np.isclose(edge, images[0].get_extent()[1 if reverse else 0]):
+            break
+        for image in images:
+            left, right, bottom, top = image.get_extent()
+            if reverse:
+                image.set_extent((edge - right + left, edge, bottom, top))
+                edge -= right - left
+            else:
+                image.set_extent((edge, edge + right - left, bottom, top))
+                edge += right - left
+        _rescale(ax, autoscale)
+
+
+def _rescale(ax, autoscale):
+    '''
+    Images set the axis limits to their own extent, so rescale the
+    autoscaled axes to fit everything which has been drawn.
+    '''
+    if any(autoscale):
+        ax.relim()
+        ax.autoscale_view(scalex=autoscale[0], scaley=autoscale[1])
+
+
+def encode_alignment(fasta, out=None):
+    '''
+    Encodes a FASTA formatted multiple sequence alignment as a matrix of
+    uint8 character codes on disk, which can then be memory-mapped.
+
+    The file is read twice, once to find the names and alignment length
+    and once to write each sequence, so only one sequence is held in
+    memory at a time.
+
+    Parameters
+    ----------
+    fasta : str
+        Path to the alignment.
+    out : str
+        Path for the encoded matrix, by default the path to the
+        alignment with the suffix .npy. The sequence names are written
+        to the same path with the suffix .names.
+
+    Returns
+    -------
+    out : str
+        Path to the encoded matrix.
+    '''
+    if out is None:
+        out = fasta + ".npy"
+    names = []
+    lengths = []
+    with open(fasta, "rb") as infile:
+        for line in infile:
+            line = line.strip()
+            if line.startswith(b">"):
+                names.append(line[1:].decode())
+                lengths.append(0)
+            elif line:
+                lengths[-1] += len(line)
+    if len(set(lengths)) > 1:
+        raise RuntimeError(
+            "Sequences in alignment %s are not the same length" % fasta)
+
+    matrix = np.lib.format.open_memmap(
+        out, mode="w+", dtype=np.uint8,
+        shape=(len(names), lengths[0] if lengths else 0))
+    with open(fasta, "rb") as infile:
+        row = -1
+        seq = []
+        for line in infile:
+            line = line.strip()
+            if line.startswith(b">"):
+                if row >= 0:
+                    matrix[row] = np.frombuffer(b"".join(seq).upper(),
+                                                dtype=np.uint8)
+                row += 1
+                seq = []
+            elif line:
+                seq.append(line)
+        if row >= 0:
+            matrix[row] = np.frombuffer(b"".join(seq).upper(),
+                                        dtype=np.uint8)
+    matrix.flush()
+    del matrix
+    with open(out + ".names", "w") as outfile:
+        outfile.write("\n".join(names) + "\n")
+    return (out)
+
+
+def read_alignment(fasta, cache=None):
+    '''
+    Memory-maps an encoded multiple sequence alignment, encoding it first
+    if the encoded matrix does not exist or is older than the alignment.
+
+    Parameters
+    ----------
+    fasta : str
+        Path to the FASTA formatted alignment.
+    cache : str
+        Path for the encoded matrix, by default the path to the
+        alignment with the suffix .npy.
+
+    Returns
+    -------
+    names : list
+        Sequence names, in the same order as the rows.
+    matrix : numpy.memmap
+        Read only matrix of uint8 character codes, one row per sequence.
+    '''
+    if cache is None:
+        cache = fasta + ".npy"
+    if (not os.path.exists(cache) or
+            not os.path.exists(cache + ".names") or
+            os.path.getmtime(cache) < os.path.getmtime(fasta)):
+        encode_alignment(fasta, cache)
+    with open(cache + ".names") as infile:
+        names = infile.read().splitlines()
+    return (names, np.load(cache, mmap_mode="r"))
+
+
+def alignment_lut(colours=None, default='lightgrey'):
+    '''
+    Builds a lookup table converting uint8 character codes to RGBA
+    colours.
+
+    Parameters
+    ----------
+    colours : dict
+        Characters as keys and colours as values. Lower case characters
+        are given the same colour. By default alignment_colours is used.
+    default : str
+        Colour for characters which are not in colours.
+
+    Returns
+    -------
+    lut : numpy.ndarray
+        Array of shape (256, 4) of RGBA values between 0 and 255.
+    '''
+    if colours is None:
+        colours = alignment_colours
+    lut = np.tile(np.array(matplotlib.colors.to_rgba(default)), (256, 1))
+    for char, col in colours.items():
+        rgba = matplotlib.colors.to_rgba(col)
+        lut[ord(char.upper())] = rgba
+        lut[ord(char.lower())] = rgba
+    return (np.round(lut * 255).astype(np.uint8))
+
+
+def draw_alignment(ax, layout, alignment, xpos, width,
+                   columns=None,
+                   colours=None,
+                   max_pixels=None):
+    '''
+    Draws a multiple sequence alignment next to the tips of a tree as a
+    single image, with one row aligned to each tip.
+
+    Only the requested window of columns is read from the alignment and
+    it is downsampled to the resolution of the axis first, so very large
+    memory-mapped alignments can be drawn quickly.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    layout : TreeLayout
+        Positions of the nodes of the tree.
+    alignment : str or tuple
+        Either the path to a FASTA formatted alignment, which is encoded
+        and memory-mapped with read_alignment, or a tuple of a list of
+        sequence names and a matrix of uint8 character codes.
+    xpos : float
+        Position of the side of the alignment closest to the tree on the
+        x axis, in axis units.
+    width : float
+        Width of the alignment in axis units.
+    columns : tuple(int, int)
+        First and last (exclusive) column of the alignment to show.
+        By default all columns are shown.
+    colours : dict
+        Characters as keys and colours as values, by default
+        alignment_colours.
+    max_pixels : tuple(int, int)
+        Maximum number of columns and rows in the image. By default this
+        is the size of the panel in pixels.
+
+    Returns
+    -------
+    image : matplotlib.image.AxesImage
+        The alignment.
+    '''
+    if isinstance(alignment, str):
+        alignment = read_alignment(alignment)
+    names, matrix = alignment
+    if columns is None:
+        columns = (0, matrix.shape[1])
+
+    tips = layout.tips
+    y = layout.y[tips]
+    if len(y) > 1:
+        half = (y[0] - y[-1]) / (len(y) - 1) / 2
+    else:
+        half = 0.5
+    if layout.reverse:
+        left = xpos - width
+    else:
+        left = xpos
+    extent = (left, left + width, y[-1] - half, y[0] + half)
+
+    # Keep at most one column and row of the alignment per pixel
+    if max_pixels is None:
+        corners = ax.transData.transform([extent[0::2], extent[1::2]])
+        max_pixels = np.ceil(np.abs(corners[1] - corners[0])).astype(int)
+    ncols = columns[1] - columns[0]
+    colstep = max(1, int(np.ceil(ncols / max(max_pixels[0], 1))))
+    rowstep = max(1, int(np.ceil(len(tips) / max(max_pixels[1], 1))))
+    cols = np.arange(columns[0], columns[1], colstep)
+    shown = np.arange(0, len(tips), rowstep)
+
+    # Read the rows in file order, then put them in tip order
+    lookup = dict(zip(names, range(len(names))))
+    rows = np.array([lookup.get(n, -1)
+                     for n in layout.tree.names[tips[shown]]],
+                    dtype=np.int64)
+    codes = np.full((len(shown), len(cols)), ord("-"), dtype=np.uint8)
+    found = np.flatnonzero(rows >= 0)
+    order = found[np.argsort(rows[found], kind='stable')]
+    codes[order] = matrix[np.ix_(rows[order], cols)]
+
+    autoscale = (ax.get_autoscalex_on(), ax.get_autoscaley_on())
+    image = ax.imshow(alignment_lut(colours)[codes], aspect='auto',
+                      interpolation='nearest', origin='upper',
+                      extent=extent)
+    _rescale(ax, autoscale)
+    return (image)
@@ -1,5 +1,19 @@
 #!/usr/bin/env python3
 import ete3
+import os
+import matplotlib
+import numpy as np
+from collections.abc import Mapping
+from matplotlib.collections import LineCollection
+from plot_phylo.compact import (CompactTree, reroot, extract_clade,
+                                order_tree, tree_depth)
+from plot_phylo.newick import parse_newick, read_chunks, is_compressed
+from plot_phylo.layout import (TreeLayout, layout_tree, branch_segments,
+                               unrooted_layout, unrooted_segments)
+from plot_phylo.annotate import (draw_highlights, draw_node_markers,
+                                 draw_node_pies)
+from plot_phylo.panels import (draw_heatmap, draw_alignment, tip_label_edge,
+                               place_beside_labels)
 
 
 def plot_phylo(tree, ax,
@@ -15,19 +29,40 @@ def plot_phylo(tree, ax,
                scale_bar=True,
                scale_bar_width=None,
                reverse=False,
+               unrooted=False,
                outgroup=None,
-               col_dict={},
-               label_dict={},
+               order=None,
+               clade=None,
+               clade_context=0,
+               col_dict=None,
+               label_dict=None,
                font_size=10,
                line_col='black',
                line_width=1,
-               bold=[]):
+               bold=None,
+               highlight=None,
+               highlight_cols='lightgrey',
+               highlight_alpha=0.5,
+               node_sizes=None,
+               node_cols=None,
+               node_pies=None,
+               pie_cols=None,
+               pie_sizes=100,
+               heatmap=None,
+               heatmap_width=None,
+               heatmap_cmap='viridis',
+               alignment=None,
+               alignment_width=None,
+               alignment_columns=None):
     '''
     Parameters
     ----------
-    tree : str
-        Either the path to a newick formatted tree or a string containing
-        a newick formatted tree. Required.
+    tree : str, file object, numpy.ndarray, tuple or CompactTree
+        Either the path to a newick formatted tree, which may be
+        compressed with gzip, xz or bzip2, an open file containing a
+        newick formatted tree, a string containing a newick formatted
+        tree, a scipy linkage matrix, a tuple of a linkage matrix and
+        the names of its leaves or a CompactTree. Required.
     ax : matplotlib.axes._axes.Axes,
         An open matplotlib ax object where the tree will be plotted. Required.
     xpos : float
@@ -63,21 +98,44 @@ def plot_phylo(tree, ax,
     reverse: bool
         If True, reverse the tree on the y-axis, showing the root on the right
         hand side. Default False.
-    outgroup: str
+    unrooted: bool
+        If True, draw the tree unrooted with the equal angle layout,
+        with the tips spread around the tree, which suits large trees
+        without a meaningful root. The tree is fitted into width and
+        height without changing its shape. Cannot be combined with
+        align_tips, rev_align_tips, reverse, highlight, heatmap or
+        alignment. Default False.
+    outgroup: str or list
         Leaf to use as an outgroup, must be identical to the name of the
-        leaf in the tree file.
+        leaf in the tree file. If a list of leaf names is given, the tree
+        is rooted on their most recent common ancestor. "midpoint" roots
+        the tree at the midpoint of the longest path between two leaves.
+    order: str or dict
+        Order in which to draw the clades. "up" ladderizes the tree with
+        the largest clades at the top, "down" with the largest clades
+        at the bottom. A dictionary with tip labels as keys and sortable
+        values orders each clade by the smallest value of its tips.
+        By default the order in the tree file is used.
+    clade: str or list
+        Only plot part of the tree. Either the name of a node, or a list
+        of leaf names, in which case the clade below their most recent
+        common ancestor is plotted. Only this clade is laid out and
+        drawn, and the scale bar is based on the clade.
+    clade_context: int
+        Number of levels above the clade to include, to show its
+        closest relatives. Default 0.
     col_dict : dict
         User provided dictionary with tip labels as keys and colours
         (in any format accepted by matplotlib
          https://matplotlib.org/stable/users/explain/colors/colors.html
         as values. If this is not
         specified all labels will be black, if only some labels are specified
-        all others will be black.
+        all others will be black. The dictionary is not modified.
     label_dict : TYPE, optional
         User provided dictionary with current tip labels as keys and desired
         tip labels as values. If this is not specified all labels
         will be as specified in the newick, if some labels are specified
-        all others will match the newick.
+        all others will match the newick. The dictionary is not modified.
     font_size : int
         Font size for tip labels. Default 10.
     line_col : str or tuple
@@ -88,46 +146,140 @@ def plot_phylo(tree, ax,
         Line width. Default 2.
     bold: list
         List of tip labels to show in bold.
+    highlight: list or dict
+        Clades to highlight with a rectangle. Each clade is either the
+        name of a node or a list of leaf names, in which case the clade
+        below their most recent common ancestor is highlighted. If a
+        dictionary is given, the keys are used as clade names and drawn
+        next to a bracket beyond the tip labels.
+    highlight_cols: str or dict
+        Colour of the highlights, either a single colour or a dictionary
+        with clade names as keys and colours as values. Default
+        lightgrey.
+    highlight_alpha: float
+        Transparency of the highlights. Default 0.5.
+    node_sizes: float, str, dict or array
+        Draw a marker on each internal node with this area in points
+        squared, either one size or one per node. Values for each node
+        are given as the name of a node attribute, a dictionary with node
+        names as keys or an array in the order of the nodes of the tree
+        as it is read, before rerooting or reordering. Nodes with a size
+        of zero or NaN have no marker.
+    node_cols: str, dict or array
+        Colour of the node markers, either one colour or one per node.
+        Markers of size 30 are drawn if node_sizes is not given.
+    node_pies: str, dict or array
+        Draw a pie chart on nodes, such as the probability of each
+        ancestral state, from the fractions of each category at each
+        node, as an array of shape (n_nodes, k) or a dictionary with
+        node names as keys and rows of fractions as values. Nodes
+        without fractions have no pie.
+    pie_cols: list
+        Colour of each category of the pie charts. By default the
+        colours of the tab10 colour map.
+    pie_sizes: float, str, dict or array
+        Area of the pie charts in points squared, either one size or one
+        per node. Default 100.
+    heatmap: pandas.DataFrame, dict or tuple
+        Matrix of values to draw next to the tip labels, with one row
+        per tip. Either a DataFrame indexed by tip label, a dictionary
+        with tip labels as keys and rows of values as values, or a tuple
+        of a list of tip labels and a 2D array. Tips without values are
+        left blank.
+    heatmap_width: float
+        Width of the heatmap in axis units. If not specified, the heatmap
+        will be half the width of the tree.
+    heatmap_cmap: str or matplotlib.colors.Colormap
+        Colour map for the heatmap. Default viridis.
+    alignment: str or tuple
+        Multiple sequence alignment to draw next to the tip labels,
+        usually with align_tips=True. Either the path to a FASTA file,
+        which is encoded to a uint8 matrix on disk the first time it is
+        used and then memory-mapped, or a tuple of a list of sequence
+        names and a matrix of uint8 character codes. Only the columns
+        shown are read, at the resolution of the figure.
+    alignment_width: float
+        Width of the alignment in axis units. If not specified, the
+        alignment will be the same width as the tree.
+    alignment_columns: tuple(int, int)
+        First and last (exclusive) alignment columns to show. By default
+        the whole alignment is shown.
 
 
     Returns
     -------
-    ps : list
-        List of lists - ordered as tip labels, tip label text objects,
-        alignment lines (if aligned). All are in the same order.
+    result : PlotResult
+        The drawn tree, which can be restyled with set_colors,
+        set_labels, set_bold and set_line_style without drawing it
+        again. It can also be used as a dictionary of the positions of
+        the tip labels, as returned by get_boxes.
     '''
-    # Read the tree
-    try:
-        T = ete3.Tree(tree)
-    except ete3.parser.newick.NewickError:
-        try:
-            # Allows for trees with named internal nodes
-            T = ete3.Tree(tree, format=1)
-        except ete3.parser.newick.NewickError as e:
-            raise RuntimeError(f"Error in parsing Newick format: {e}")
-    if outgroup and outgroup in set(T.get_leaf_names()):
-        T.set_outgroup(outgroup)
-
-    # Define dictionaries for colours and labels if not provided
-    for nam in T.get_leaf_names():
-        if nam not in label_dict:
-            label_dict[nam] = nam
-        if nam not in col_dict:
-            col_dict[nam] = 'black'
-    # Dictionary to pass apperance params to the plotting function
+    # Read the tree, rerooting and layout use an array representation
+    ct = read_tree(tree)
+    if node_sizes is None and node_cols is not None:
+        node_sizes = 30
+    node_options = {'node_sizes': node_sizes, 'node_cols': node_cols,
+                    'node_pies': node_pies, 'pie_sizes': pie_sizes}
+    follow = any(np.ndim(values) > 0 and not isinstance(values, Mapping)
+                 for values in node_options.values())
+    follow &= outgroup is not None or clade is not None or order is not None
+    if follow:
+        # Arrays of node values follow their nodes through rerooting and
+        # reordering as the original position of each node
+        ct = CompactTree(ct.parent, ct.dist, ct.support, ct.names,
+                         dict(ct.attrs, _node=np.arange(ct.n_nodes,
+                                                        dtype=float)))
+    if outgroup is not None:
+        ct = reroot(ct, outgroup)
+    if clade is not None:
+        ct = extract_clade(ct, clade, context=clade_context)
+    if order is not None:
+        ct = order_tree(ct, order)
+    if follow:
+        node_options = _follow_nodes(ct.attrs.pop('_node'), node_options)
+
+    # Dictionary to pass apperance params to the plotting function, tips
+    # missing from col_dict and label_dict fall back to the defaults
+    # without changing the dictionaries
     appearance = {'font_size': font_size,
                   'line_col': line_col,
                   'line_width': line_width,
-                  'col_dict': col_dict,
-                  'label_dict': label_dict,
+                  'col_dict': StyleLookup(col_dict, 'black'),
+                  'label_dict': StyleLookup(label_dict),
                   'show_support': show_support,
-                  'bold': bold}
+                  'bold': frozenset(bold or ())}
 
     # Calculate the total height and width of the original tree
     # in terms of number of nodes, total branch length, number of tips
-    maxdist = ((T.get_farthest_leaf(topology_only=True)[1],
-                T.get_farthest_leaf(topology_only=False)[1],
-                len(T)))
+    maxdist = tree_depth(ct)
+
+    if unrooted:
+        options = {'align_tips': align_tips,
+                   'rev_align_tips': rev_align_tips,
+                   'reverse': reverse,
+                   'highlight': highlight is not None,
+                   'heatmap': heatmap is not None,
+                   'alignment': alignment is not None}
+        for option, used in options.items():
+            if used:
+                raise RuntimeError(
+                    "%s cannot be used with an unrooted tree" % option)
+        layout = unrooted_layout(ct, xpos=xpos, ypos=ypos, width=width,
+                                 height=height,
+                                 branch_lengths=branch_lengths)
+        ps, branches = draw_unrooted(ax, layout, appearance)
+        markers, pies = _draw_node_options(ax, layout, node_options,
+                                           pie_cols)
+        if not show_axis:
+            ax.set_axis_off()
+        if scale_bar and branch_lengths:
+            # The scale bar is sized from the width of one unit of
+            # branch length
+            draw_scale_bar(ax, layout.scale * maxdist[1], height, maxdist,
+                           xpos, ypos, scale_bar_width=scale_bar_width,
+                           appearance=appearance)
+        return (PlotResult(ax, layout, ps, branches, appearance['bold'],
+                           markers=markers, pies=pies))
 
     # Without branch lengths the tree has a root which appears at position -1,
     # so shift the tree over by one unit
@@ -137,25 +289,19 @@ def plot_phylo(tree, ax,
     elif align_tips:
         width -= 1
 
-    if reverse:
-        xpos = -xpos
-    # Call the main function. The second and third returns are used
-    # internally when the function is called recursively but
-    # are not needed by the user
-
-    _, _, ps = draw_tree(T, ax,
-                         x=xpos,
-                         y=-ypos-height,
-                         x0=xpos,
-                         ps=[],
+    # Calculate the position of every node, then draw the tree
+    layout = layout_tree(ct,
+                         xpos=xpos,
+                         ypos=ypos,
                          height=height,
                          width=width,
                          depth=maxdist,
                          align_tips=align_tips,
                          rev_align_tips=rev_align_tips,
                          branch_lengths=branch_lengths,
-                         reverse=reverse,
-                         appearance=appearance)
+                         reverse=reverse)
+    ps, branches = draw_layout(ax, layout, appearance)
+    markers, pies = _draw_node_options(ax, layout, node_options, pie_cols)
 
     if rev_align_tips:
         ps = reverse_align(ax, ps, reverse)
@@ -163,16 +309,653 @@ def plot_phylo(tree, ax,
     if not show_axis:
         ax.set_axis_off()
     if scale_bar and branch_lengths:
-        if not reverse:
-            draw_scale_bar(ax, width, height, maxdist, xpos, ypos,
-                           scale_bar_width=scale_bar_width,
-                           appearance=appearance)
-        else:
-            draw_scale_bar(ax, width, height, maxdist, -xpos, ypos,
-                           scale_bar_width=scale_bar_width,
-                           appearance=appearance)
+        draw_scale_bar(ax, width, height, maxdist, xpos, ypos,
+                       scale_bar_width=scale_bar_width,
+                       appearance=appearance)
     textobj = [p[1] for p in ps]
-    return (get_boxes(ax, textobj))
+    # Anything placed beyond the tip labels also goes beyond clade names
+    edgeobj = textobj
+    if highlight is not None:
+        _, _, clade_labels = draw_highlights(ax, layout, highlight,
+                                             cols=highlight_cols,
+                                             alpha=highlight_alpha,
+                                             texts=textobj,
+                                             font_size=font_size,
+                                             line_col=line_col,
+                                             line_width=line_width)
+        edgeobj = textobj + clade_labels
+    # Side panels are placed just beyond the tip labels, the alignment
+    # is placed beyond the heatmap if there is one
+    panels = []
+    if heatmap is not None:
+        if heatmap_width is None:
+            heatmap_width = width / 2
+        panels.append(draw_heatmap(ax, layout, heatmap,
+                                   xpos=tip_label_edge(ax, edgeobj, reverse),
+                                   width=heatmap_width,
+                                   cmap=heatmap_cmap))
+    if alignment is not None:
+        if alignment_width is None:
+            alignment_width = width
+        panels.append(draw_alignment(ax, layout, alignment,
+                                     xpos=tip_label_edge(ax, edgeobj,
+                                                         reverse),
+                                     width=alignment_width,
+                                     columns=alignment_columns))
+    if panels:
+        place_beside_labels(ax, panels, edgeobj, reverse)
+    return (PlotResult(ax, layout, ps, branches, appearance['bold'],
+                       markers=markers, pies=pies))
+
+
+def _follow_nodes(origin, node_options):
+    '''
+    Puts arrays of node values given for the tree as it was read into
+    the order of the nodes of the rerooted or reordered tree, from the
+    original position of each node. Nodes added by rerooting have no
+    marker or pie.
+    '''
+    missing = np.isnan(origin)
+    index = np.where(missing, 0, origin).astype(np.int64)
+    followed = dict()
+    for key, values in node_options.items():
+        if np.ndim(values) > 0 and not isinstance(values, Mapping):
+            values = np.asarray(values)[index]
+        elif key.endswith('sizes') and np.ndim(values) == 0 and \
+                not isinstance(values, str) and values is not None:
+            values = np.full(len(origin), values)
+        if key in ('node_sizes', 'node_pies', 'pie_sizes') and \
+                isinstance(values, np.ndarray):
+            values = values.astype(float)
+            values[missing] = np.nan
+        followed[key] = values
+    return followed
+
+
+def _draw_node_options(ax, layout, node_options, pie_cols):
+    '''
+    Draws the node markers and pie charts requested in plot_phylo, each
+    as a single collection, returning None for those not requested.
+    '''
+    markers = None
+    pies = None
+    if node_options['node_sizes'] is not None:
+        markers = draw_node_markers(
+            ax, layout, sizes=node_options['node_sizes'],
+            cols=('black' if node_options['node_cols'] is None
+                  else node_options['node_cols']))
+    if node_options['node_pies'] is not None:
+        pies = draw_node_pies(ax, layout, node_options['node_pies'],
+                              cols=pie_cols,
+                              sizes=node_options['pie_sizes'])
+    return markers, pies
+
+
+def default_appearance():
+    '''
+    Creates a new dictionary of appearance parameters with the defaults
+    of plot_phylo, for the drawing functions when none is given.
+
+    Returns
+    -------
+    appearance : dict
+        Dictionary of parameters specifying the appearance of the tree.
+    '''
+    return {'font_size': 10,
+            'line_col': 'black',
+            'line_width': 1,
+            'col_dict': StyleLookup(None, 'black'),
+            'label_dict': StyleLookup(),
+            'show_support': True,
+            'bold': frozenset()}
+
+
+class StyleLookup(object):
+    '''
+    Read only view of a user provided dictionary of tip styles, with a
+    default for tips which are not in the dictionary. The dictionary is
+    never modified, so the same dictionary can be reused for any number
+    of trees.
+
+    Parameters
+    ----------
+    mapping : dict or None
+        Dictionary with tip labels as keys and styles as values.
+    default : object
+        Style for tips which are not in the dictionary. If None, the tip
+        label itself is returned.
+    '''
+    __slots__ = ('mapping', 'default')
+
+    def __init__(self, mapping=None, default=None):
+        if mapping is None:
+            mapping = dict()
+        self.mapping = mapping
+        self.default = default
+
+    def __getitem__(self, nam):
+        try:
+            return self.mapping[nam]
+        except KeyError:
+            if self.default is None:
+                return nam
+            return self.default
+
+    def __contains__(self, nam):
+        return nam in self.mapping
+
+    def get(self, nam, default=None):
+        return self.mapping.get(nam, default)
+
+
+def attribute_colours(values,
+                      cmap=None,
+                      colours=None,
+                      vmin=None,
+                      vmax=None,
+                      missing='lightgrey'):
+    '''
+    Converts an array of node attributes to colours in one step.
+
+    Numeric values are mapped continuously onto a colour map, any other
+    values are treated as categories, which are given the colours in
+    colours or otherwise the colours of a qualitative colour map in
+    sorted order.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        One value for each node or tip, such as a column of the attrs of
+        a CompactTree. NaN and None are missing values.
+    cmap : str or matplotlib.colors.Colormap
+        Colour map to use. By default viridis for numbers and tab10, or
+        tab20 for more than ten categories.
+    colours : dict
+        Dictionary with categories as keys and colours as values.
+        Categories which are not in the dictionary are given the missing
+        colour. Only used for categorical values.
+    vmin : float
+        Value shown with the lowest colour, by default the smallest value.
+    vmax : float
+        Value shown with the highest colour, by default the largest value.
+    missing : str or tuple
+        Colour for missing values. Default lightgrey.
+
+    Returns
+    -------
+    rgba : numpy.ndarray
+        Array of shape (n, 4) with the colour of each value.
+    key : dict or matplotlib.cm.ScalarMappable
+        For categories, a dictionary with each category as a key and its
+        colour as the value, for a legend. For numbers, a ScalarMappable
+        which can be passed to matplotlib.pyplot.colorbar.
+    '''
+    values = np.asarray(values)
+    missing = matplotlib.colors.to_rgba(missing)
+    rgba = np.tile(np.array(missing), (len(values), 1))
+    if isinstance(cmap, str):
+        cmap = matplotlib.colormaps[cmap]
+    if values.dtype.kind in 'biuf':
+        values = values.astype(float)
+        present = ~np.isnan(values)
+        if cmap is None:
+            cmap = matplotlib.colormaps['viridis']
+        if present.any():
+            if vmin is None:
+                vmin = values[present].min()
+            if vmax is None:
+                vmax = values[present].max()
+        norm = matplotlib.colors.Normalize(vmin, vmax)
+        rgba[present] = cmap(norm(values[present]))
+        key = matplotlib.cm.ScalarMappable(norm=norm, cmap=cmap)
+        key.set_array(values[present])
+        return rgba, key
+
+    present = np.not_equal(values, None)
+    cats, inv = np.unique(values[present].astype(str), return_inverse=True)
+    if colours is not None:
+        lut = np.array([matplotlib.colors.to_rgba(colours.get(c, missing))
+                        for c in cats]).reshape(-1, 4)
+    else:
+        if cmap is None:
+            cmap = matplotlib.colormaps['tab10' if len(cats) <= 10 else
+                                        'tab20']
+        if hasattr(cmap, 'colors'):
+            # Qualitative maps are indexed by category, repeating if
+            # there are more categories than colours
+            lut = cmap(np.arange(len(cats)) % cmap.N)
+        else:
+            lut = cmap(np.linspace(0, 1, len(cats)))
+    rgba[present] = lut[inv.reshape(-1)]
+    return rgba, {str(c): tuple(map(float, col)) for c, col in zip(cats, lut)}
+
+
+class PlotResult(Mapping):
+    '''
+    A tree drawn by plot_phylo. The tip labels and branches can be
+    restyled in place, which only changes the existing artists, so it is
+    much faster than drawing the tree again.
+
+    The tips are described by arrays in the order they are drawn, from
+    the top of the tree, so tips can be found and annotated without
+    looping over the tree. Each name is looked up in constant time with
+    index, and find and search also handle duplicated names and
+    prefixes.
+
+    It is also a read only dictionary of the positions of the tip labels
+    with the displayed tip labels as keys, as returned by get_boxes.
+    These are calculated the first time they are needed, and again after
+    the labels are restyled. If two tips show the same label only the
+    last is kept in the dictionary, the boxes attribute has every tip.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        The ax object the tree is drawn on.
+    layout : TreeLayout or UnrootedLayout
+        Positions of the nodes of the tree.
+    ps : list
+        List of lists - ordered as tip labels, tip label text objects,
+        alignment lines (if aligned), as returned by draw_layout.
+    branches : matplotlib.collections.LineCollection
+        The branches of the tree.
+    bold : set
+        Tip labels which are shown in bold.
+    markers : matplotlib.collections.PathCollection
+        The node markers, None if there are none.
+    pies : matplotlib.collections.PolyCollection
+        The wedges of the node pie charts, None if there are none.
+
+    Attributes
+    ----------
+    names : numpy.ndarray
+        Name of each tip in the tree.
+    labels : numpy.ndarray
+        Label shown for each tip.
+    nodes : numpy.ndarray
+        Index of the node of each tip in layout.tree.
+    texts : list
+        Tip label text objects.
+    lines : list or None
+        Alignment lines of each tip, None if the tips are not aligned.
+    index : dict
+        Position of each tip name, the first position if the name is
+        duplicated.
+    '''
+    __slots__ = ('ax', 'layout', 'texts', 'lines', 'branches', 'markers',
+                 'pies', 'names', 'labels', 'nodes', 'index', '_unique',
+                 '_sorted', '_segments', '_bold', '_boxes', '_box_array')
+
+    def __init__(self, ax, layout, ps, branches, bold=frozenset(),
+                 markers=None, pies=None):
+        self.ax = ax
+        self.layout = layout
+        self.markers = markers
+        self.pies = pies
+        self.texts = [p[1] for p in ps]
+        if ps and len(ps[0]) > 2:
+            self.lines = [p[2] for p in ps]
+        else:
+            self.lines = None
+        self.branches = branches
+        self.nodes = layout.tips
+        self.names = layout.tree.names[layout.tips]
+        self.labels = np.array([txt.get_text().strip()
+                                for txt in self.texts], dtype=object)
+        # Filling in reverse keeps the first position of duplicates
+        n = len(self.names)
+        self.index = dict(zip(self.names[::-1], range(n - 1, -1, -1)))
+        self._unique = len(self.index) == n
+        self._sorted = None
+        self._segments = None
+        self._bold = set(n for n in bold if n in self.index)
+        self._boxes = None
+        self._box_array = None
+
+    @property
+    def ps(self):
+        '''
+        The tips as a list of lists, ordered as tip labels, tip label
+        text objects, alignment lines (if aligned), as returned by
+        draw_layout.
+        '''
+        if self.lines is None:
+            return [[nam, txt] for nam, txt in zip(self.names, self.texts)]
+        return [[nam, txt, line] for nam, txt, line in zip(
+            self.names, self.texts, self.lines)]
+
+    @property
+    def tip_x(self):
+        '''
+        Position of the end of the branch of each tip on the x axis.
+        '''
+        return self.layout.x[self.nodes]
+
+    @property
+    def tip_y(self):
+        '''
+        Position of each tip on the y axis.
+        '''
+        return self.layout.y[self.nodes]
+
+    @property
+    def segments(self):
+        '''
+        Array of shape (n, 2, 2) with the start and end of each line of
+        self.branches.
+        '''
+        if self._segments is None:
+            if isinstance(self.layout, TreeLayout):
+                self._segments = branch_segments(self.layout)
+            else:
+                self._segments = unrooted_segments(self.layout)
+        return self._segments
+
+    @property
+    def boxes(self):
+        '''
+        Array of shape (n, 4) with the minimum x, minimum y, maximum x
+        and maximum y of each tip label, in axis units.
+        '''
+        if self._box_array is None:
+            renderer = self.ax.figure.canvas.get_renderer()
+            corners = np.array([txt.get_window_extent(renderer).get_points()
+                                for txt in self.texts]).reshape(-1, 2)
+            # Convert every corner to axis units at once
+            corners = self.ax.transData.inverted().transform(corners)
+            self._box_array = corners.reshape(-1, 4)
+        return self._box_array
+
+    def find(self, name):
+        '''
+        Finds every tip with a name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the tip in the tree.
+
+        Returns
+        -------
+        positions : numpy.ndarray
+            Positions of the tips with this name, empty if there are
+            none.
+        '''
+        if self._unique:
+            i = self.index.get(name)
+            if i is None:
+                return np.zeros(0, dtype=np.int64)
+            return np.array([i], dtype=np.int64)
+        if name not in self.index:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.names == name)
+
+    def search(self, prefix):
+        '''
+        Finds every tip with a name starting with a prefix, using a
+        sorted copy of the names so only the matches are visited.
+
+        Parameters
+        ----------
+        prefix : str
+            Start of the tip names.
+
+        Returns
+        -------
+        positions : numpy.ndarray
+            Positions of the matching tips, from the top of the tree.
+        '''
+        if self._sorted is None:
+            order = np.argsort(self.names, kind='stable')
+            self._sorted = (order, self.names[order])
+        order, names = self._sorted
+        start = np.searchsorted(names, prefix, side='left')
+        # No name can continue with a character after the last one
+        end = np.searchsorted(names, prefix + chr(0x10ffff), side='left')
+        return np.sort(order[start:end])
+
+    # Dictionary of label positions
+    def _get_boxes(self):
+        if self._boxes is None:
+            self._boxes = get_boxes(self.ax, self.texts)
+        return self._boxes
+
+    def __getitem__(self, nam):
+        return self._get_boxes()[nam]
+
+    def __iter__(self):
+        return iter(self._get_boxes())
+
+    def __len__(self):
+        return len(self._get_boxes())
+
+    def _texts_for(self, mapping):
+        # Text objects of the tips in mapping which are in the tree
+        for nam, value in mapping.items():
+            for i in self.find(nam):
+                yield i, self.texts[i], value
+
+    def _changed(self, labels=True):
+        # The setters mark the artists as stale, so interactive figures
+        # are redrawn without drawing anything here
+        if labels:
+            self._boxes = None
+            self._box_array = None
+
+    def set_colors(self, col_dict, default=None):
+        '''
+        Changes the colours of the tip labels.
+
+        Parameters
+        ----------
+        col_dict : dict
+            Dictionary with tip labels as keys and colours as values.
+            Tips which are not in the tree are ignored.
+        default : str or tuple
+            Colour for all other tips. By default their colour is not
+            changed.
+        '''
+        # Each change redraws the text, so only change those which differ
+        if default is not None:
+            for txt in self.texts:
+                if txt.get_color() != default:
+                    txt.set_color(default)
+        for i, txt, col in self._texts_for(col_dict):
+            if txt.get_color() != col:
+                txt.set_color(col)
+        self._changed(labels=False)
+
+    def set_labels(self, label_dict):
+        '''
+        Changes the text of the tip labels.
+
+        Parameters
+        ----------
+        label_dict : dict
+            Dictionary with the original tip labels as keys and the new
+            labels as values. Tips which are not in the tree are ignored.
+        '''
+        for i, txt, label in self._texts_for(label_dict):
+            self.labels[i] = label
+            label = "  %s  " % label
+            if txt.get_text() != label:
+                txt.set_text(label)
+        self._changed()
+
+    def set_bold(self, bold):
+        '''
+        Sets which tip labels are shown in bold, all other labels are
+        shown in normal weight. Only labels which change are updated.
+
+        Parameters
+        ----------
+        bold : list
+            Original tip labels to show in bold.
+        '''
+        bold = set(n for n in bold if n in self.index)
+        for nam in bold ^ self._bold:
+            weight = 'bold' if nam in bold else 'normal'
+            for i in self.find(nam):
+                self.texts[i].set_fontweight(weight)
+        self._bold = bold
+        self._changed()
+
+    def tip_values(self, attr):
+        '''
+        Values of a node attribute read from the tree file for each tip.
+
+        Parameters
+        ----------
+        attr : str
+            Name of the attribute, a key of the attrs of the tree.
+
+        Returns
+        -------
+        values : numpy.ndarray
+            Value for each tip, from the top of the tree.
+        '''
+        return self._attr(attr)[self.nodes]
+
+    def _attr(self, attr):
+        try:
+            return self.layout.tree.attrs[attr]
+        except KeyError:
+            raise RuntimeError("Attribute %s not found in the tree" % attr)
+
+    def set_colors_by(self, attr, **kwargs):
+        '''
+        Colours the tip labels by a node attribute read from the tree
+        file. The colours are looked up for all tips at once and only the
+        labels which change are updated.
+
+        Parameters
+        ----------
+        attr : str
+            Name of the attribute, a key of the attrs of the tree.
+        **kwargs
+            Further arguments to attribute_colours, such as cmap, colours,
+            vmin, vmax or missing.
+
+        Returns
+        -------
+        key : dict or matplotlib.cm.ScalarMappable
+            The colour of each category or the colour scale, as returned
+            by attribute_colours.
+        '''
+        rgba, key = attribute_colours(self.tip_values(attr), **kwargs)
+        for txt, col in zip(self.texts, rgba):
+            col = tuple(col)
+            if matplotlib.colors.to_rgba(txt.get_color()) != col:
+                txt.set_color(col)
+        self._changed(labels=False)
+        return key
+
+    def set_line_colors_by(self, attr, **kwargs):
+        '''
+        Colours the branches by a node attribute read from the tree file,
+        with each branch taking the colour of the node below it. The
+        lines joining the children of a node take the colour of the node.
+
+        Parameters
+        ----------
+        attr : str
+            Name of the attribute, a key of the attrs of the tree.
+        **kwargs
+            Further arguments to attribute_colours, such as cmap, colours,
+            vmin, vmax or missing.
+
+        Returns
+        -------
+        key : dict or matplotlib.cm.ScalarMappable
+            The colour of each category or the colour scale, as returned
+            by attribute_colours.
+        '''
+        rgba, key = attribute_colours(self._attr(attr), **kwargs)
+        if isinstance(self.layout, TreeLayout):
+            # One horizontal line per node, then one vertical line per
+            # internal node, as in branch_segments
+            tree = self.layout.tree
+            internal = np.flatnonzero(~tree.is_leaf)
+            rgba = np.concatenate([rgba, rgba[internal]])
+        self.branches.set_color(rgba)
+        self._changed(labels=False)
+        return key
+
+    def set_line_style(self, color=None, width=None, style=None):
+        '''
+        Changes the style of all of the branches.
+
+        Parameters
+        ----------
+        color : str, tuple or list
+            Colour of the branches, or a list with a colour for each
+            branch in the order of self.branches.
+        width : float or list
+            Width of the branches.
+        style : str
+            Line style of the branches, in any format accepted by
+            matplotlib, for example "--".
+        '''
+        if color is not None:
+            self.branches.set_color(color)
+        if width is not None:
+            self.branches.set_linewidth(width)
+        if style is not None:
+            self.branches.set_linestyle(style)
+        self._changed(labels=False)
+
+
+def read_tree(tree):
+    '''
+    Reads a newick tree into a CompactTree. NHX and extended Newick
+    annotations, such as [&&NHX:host=bat] or [&rate=0.5], are kept as
+    one array per attribute in the attrs of the tree.
+
+    Compressed files and open files are decompressed and parsed one
+    chunk at a time, so the text of the tree is never held in memory.
+
+    Parameters
+    ----------
+    tree : str, file object, numpy.ndarray, tuple or CompactTree
+        Either the path to a newick formatted tree, which may be
+        compressed with gzip, xz or bzip2, an open file in binary or
+        text mode containing a newick formatted tree, which may also be
+        compressed, a string containing a newick formatted tree, a scipy
+        linkage matrix, with the leaves named by their number, a tuple
+        of a linkage matrix and the names of its leaves, in the order of
+        the observations, or a CompactTree, which is returned unchanged.
+
+    Returns
+    -------
+    ct : CompactTree
+        Array representation of the tree.
+    '''
+    if isinstance(tree, CompactTree):
+        return tree
+    if isinstance(tree, np.ndarray):
+        return CompactTree.from_linkage(tree)
+    if isinstance(tree, tuple) and len(tree) == 2:
+        linkage, names = tree
+        return CompactTree.from_linkage(linkage, names=names)
+    if hasattr(tree, 'read'):
+        return parse_newick(read_chunks(tree))
+    if os.path.exists(tree):
+        if is_compressed(tree):
+            return parse_newick(read_chunks(tree))
+        with open(tree) as inf:
+            tree = inf.read()
+    if '[&' in tree:
+        # Annotated trees are read into columns of attributes directly
+        return parse_newick(tree)
+    try:
+        T = ete3.Tree(tree)
+    except ete3.parser.newick.NewickError:
+        try:
+            # Allows for trees with named internal nodes
+            T = ete3.Tree(tree, format=1)
+        except ete3.parser.newick.NewickError as e:
+            raise RuntimeError(f"Error in parsing Newick format: {e}")
+    return CompactTree.from_ete3(T)
 
 
 def get_boxes(ax, texts):
@@ -225,7 +1008,7 @@ def draw_tree(tree, ax,
               x=0,
               y=0,
               x0=0,
-              ps=[],
+              ps=None,
               height=10,
               width=10,
               depth=None,
@@ -233,7 +1016,7 @@ def draw_tree(tree, ax,
               rev_align_tips=False,
               branch_lengths=True,
               reverse=False,
-              appearance={}):
+              appearance=None):
     '''
     Plot a phylogenetic tree in matplotlib
 
@@ -248,7 +1031,8 @@ def draw_tree(tree, ax,
     y : float
         Current position on y axis.
     ps: list
-        Used internally, list of tip labels and x and y positions
+        Used internally, list of tip labels and x and y positions. A new
+        list is started if this is None.
     height: float
         Height of the tree in axis units
     width: float
@@ -270,6 +1054,7 @@ def draw_tree(tree, ax,
         hand side. Default False.
     appearance: dict
         Dictionary of parameters specifying the appearance of the tree.
+        By default, the defaults of plot_phylo are used.
 
     Returns
     -------
@@ -281,6 +1066,13 @@ def draw_tree(tree, ax,
         List of lists - ordered as tip labels, tip label text objects,
         alignment lines (if aligned). All are in the same order.
     '''
+    # Each call starts its own list and appearance, so nothing is shared
+    # between calls
+    if ps is None:
+        ps = []
+    if appearance is None:
+        appearance = default_appearance()
+
     # This is the increment for the position of each terminal node on
     # the y axis.
     # The number of nodes - 1 is used because one branch will be at position 0
@@ -440,6 +1232,141 @@ def draw_tree(tree, ax,
         return (y, ym, ps)
 
 
+def draw_layout(ax, layout, appearance):
+    '''
+    Draws a tree from the node positions calculated by layout_tree.
+    The positions match draw_tree, but all of the branches are drawn as
+    a single LineCollection, so they can be restyled together.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    layout : TreeLayout
+        Positions of the nodes of the tree.
+    appearance: dict
+        Dictionary of parameters specifying the appearance of the tree.
+
+    Returns
+    -------
+    ps  list
+        List of lists - ordered as tip labels, tip label text objects,
+        alignment lines (if aligned). All are in the same order.
+    branches : matplotlib.collections.LineCollection
+        The branches, the horizontal line leading to each node in node
+        order followed by the vertical line of each internal node.
+    '''
+    ct = layout.tree
+    x = layout.x
+    y = layout.y
+    ps = []
+    for i, tip in enumerate(layout.tips):
+        nam = ct.names[tip]
+        # Plot the tip label
+        if nam in appearance['bold']:
+            bold = 'bold'
+        else:
+            bold = 'normal'
+        textpos = ax.text(layout.text_x[i], y[tip],
+                          "  %s  " % appearance['label_dict'][nam],
+                          color=appearance['col_dict'][nam],
+                          fontsize=appearance['font_size'],
+                          va='center', ha=layout.ha, fontweight=bold)
+
+        # Add an extra line to the aligned tips if align_tips is specified
+        if layout.ali_x is not None:
+            line = ax.plot([x[tip], layout.ali_x[i]], [y[tip], y[tip]],
+                           color=appearance['line_col'], alpha=0.2,
+                           ls="--",
+                           lw=appearance['line_width'])
+            ps.append([nam, textpos, line])
+        else:
+            ps.append([nam, textpos])
+
+    # Colours and widths can also be given for each line, in the order of
+    # branch_segments
+    cols = appearance.get('branch_cols')
+    widths = appearance.get('branch_widths')
+    # Match the caps and layer of lines drawn with ax.plot
+    branches = LineCollection(branch_segments(layout),
+                              colors=(appearance['line_col'] if cols is None
+                                      else cols),
+                              linewidths=(appearance['line_width']
+                                          if widths is None else widths),
+                              capstyle='projecting', zorder=2)
+    ax.add_collection(branches)
+    ax.autoscale_view()
+
+    # Add branch support if specified
+    if appearance['show_support']:
+        for node in np.flatnonzero(~ct.is_leaf):
+            if not layout.reverse:
+                ax.text(x[node], y[node], " %.2f" % ct.support[node],
+                        ha='left', va='center',
+                        fontsize=appearance['font_size']-2)
+            else:
+                ax.text(x[node], y[node], "%.2f " % ct.support[node],
+                        ha='right', va='center',
+                        fontsize=appearance['font_size']-2)
+    return (ps, branches)
+
+
+def draw_unrooted(ax, layout, appearance):
+    '''
+    Draws an unrooted tree from the node positions calculated by
+    unrooted_layout, with each tip label rotated to follow its branch.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    layout : UnrootedLayout
+        Positions of the nodes of the tree.
+    appearance: dict
+        Dictionary of parameters specifying the appearance of the tree.
+
+    Returns
+    -------
+    ps  list
+        List of lists - ordered as tip labels, tip label text objects.
+    branches : matplotlib.collections.LineCollection
+        The branches, the line leading to each node in node order.
+    '''
+    ct = layout.tree
+    x = layout.x
+    y = layout.y
+    ps = []
+    for i, tip in enumerate(layout.tips):
+        nam = ct.names[tip]
+        if nam in appearance['bold']:
+            bold = 'bold'
+        else:
+            bold = 'normal'
+        textpos = ax.text(x[tip], y[tip],
+                          "  %s  " % appearance['label_dict'][nam],
+                          color=appearance['col_dict'][nam],
+                          fontsize=appearance['font_size'],
+                          va='center', ha=layout.ha[i],
+                          rotation=layout.rotation[i],
+                          rotation_mode='anchor', fontweight=bold)
+        ps.append([nam, textpos])
+
+    # Branches meet at angles, so round the ends to join them
+    branches = LineCollection(unrooted_segments(layout),
+                              colors=appearance['line_col'],
+                              linewidths=appearance['line_width'],
+                              capstyle='round', zorder=2)
+    ax.add_collection(branches)
+    ax.autoscale_view()
+
+    if appearance['show_support']:
+        for node in np.flatnonzero(~ct.is_leaf):
+            ax.text(x[node], y[node], " %.2f" % ct.support[node],
+                    ha='left', va='center',
+                    fontsize=appearance['font_size']-2)
+    return (ps, branches)
+
+
 def reverse_align(ax, ps, reverse):
     '''
     Realigns the text in the tip labels so that for a standard tree, the
@@ -525,7 +1452,7 @@ def reverse_align(ax, ps, reverse):
 
 def draw_scale_bar(ax, width, height, depth, left, bottom,
                    scale_bar_width=None,
-                   appearance={'font_size': 10}):
+                   appearance=None):
     '''
     Adds a scale bar to the tree - only when branch lengths are specified.
 
@@ -551,7 +1478,10 @@ def draw_scale_bar(ax, width, height, depth, left, bottom,
         tree width * 0.25 is used
     appearance: dict
         Dictionary of parameters specifying the appearance of the tree.
+        By default, the defaults of plot_phylo are used.
     '''
+    if appearance is None:
+        appearance = default_appearance()
     # depth[1] - total width of the tree in tree units
     # width - total width of tree in axis units
     # xint - width of one tree unit in axis units
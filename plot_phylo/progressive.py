@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+import time
+import numpy as np
+from matplotlib.collections import LineCollection, PolyCollection
+from plot_phylo.compact import subtree_sizes, tree_depth
+from plot_phylo.layout import layout_tree, branch_segments
+from plot_phylo.plot_phylo import (read_tree, PlotResult, StyleLookup,
+                                   default_appearance, draw_scale_bar)
+
+
+def skeleton_level(ct, max_nodes):
+    '''
+    Finds the deepest level of a tree which can be drawn in full with
+    at most a given number of nodes.
+
+    Parameters
+    ----------
+    ct : CompactTree
+        The tree.
+    max_nodes : int
+        Largest number of nodes to draw.
+
+    Returns
+    -------
+    level : int
+        Number of branches between the root and the deepest nodes to
+        draw, at least 0 so the root is always drawn.
+    '''
+    counts = np.cumsum(np.bincount(ct.level))
+    return max(int(np.searchsorted(counts, max_nodes, side='right')) - 1, 0)
+
+
+def collapsed_triangles(layout, nodes, sizes=None):
+    '''
+    Outlines the clades below nodes as triangles, from each node to the
+    furthest tip of its clade, spanning the tips of the clade.
+
+    Parameters
+    ----------
+    layout : TreeLayout
+        Positions of the nodes of the tree.
+    nodes : numpy.ndarray
+        Index of the node at the base of each clade.
+    sizes : numpy.ndarray
+        Number of nodes in the subtree of each node of the tree, found
+        with subtree_sizes if not given.
+
+    Returns
+    -------
+    vertices : numpy.ndarray
+        Array of shape (n, 3, 2) with the corners of each triangle.
+    '''
+    ct = layout.tree
+    if sizes is None:
+        sizes = subtree_sizes(ct, np.ones(ct.n_nodes, dtype=np.int64))
+    nodes = np.asarray(nodes, dtype=np.int64)
+    # The tips of each clade are a contiguous run of layout.tips
+    first = np.searchsorted(layout.tips, nodes)
+    last = np.searchsorted(layout.tips, nodes + sizes[nodes])
+    tip_x = np.append(layout.x[layout.tips], 0)
+    bounds = np.ravel([first, last], order='F')
+    if layout.reverse:
+        far = np.minimum.reduceat(tip_x, bounds)[::2]
+    else:
+        far = np.maximum.reduceat(tip_x, bounds)[::2]
+    tip_y = layout.y[layout.tips]
+    vertices = np.empty((len(nodes), 3, 2))
+    vertices[:, 0, 0] = layout.x[nodes]
+    vertices[:, 0, 1] = layout.y[nodes]
+    vertices[:, 1:, 0] = far[:, None]
+    vertices[:, 1, 1] = tip_y[first]
+    vertices[:, 2, 1] = tip_y[last - 1]
+    return vertices
+
+
+class ProgressiveTree(object):
+    '''
+    Draws a large tree a piece at a time, so an interactive figure,
+    such as one in a Jupyter notebook, shows the tree straight away and
+    stays responsive while the detail is added.
+
+    The layout of the whole tree is calculated first, which takes a
+    fraction of a second even for very large trees, and a skeleton of
+    the top levels of the tree is drawn, with the clades below them
+    collapsed into triangles. Each call to step then adds more of the
+    tree: the branches level by level, at least doubling the number of
+    branches drawn each time, so the single branch collection is
+    rebuilt only a few times, and then the tip labels in chunks until
+    the time budget of the step is used up. New labels are blitted onto
+    the figure where the canvas supports it rather than drawing the
+    whole figure again.
+
+    The steps can be run by a timer of the figure with start, which
+    returns control to the event loop between steps, or driven by the
+    caller with steps or finish. Matplotlib artists cannot be changed
+    from other threads, so every step runs in the thread which owns the
+    figure. A render can be cancelled at any time, leaving what has
+    been drawn so far.
+
+    Parameters
+    ----------
+    tree : str, file object, numpy.ndarray or CompactTree
+        The tree, as accepted by read_tree.
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    xpos : float
+        Position of the root node on the x axis, in axis units.
+    ypos : float
+        Position of the bottom of the tree on the y axis, in axis units.
+    width : float
+        Width of the tree in axis units. Default 10.
+    height : float
+        Height of the tree in axis units. Default 10.
+    branch_lengths : bool
+        If True, use the branch lengths provided in the tree, otherwise
+        fix all branches to the same length. Default True.
+    reverse : bool
+        If True, reverse the tree on the y-axis, showing the root on the
+        right hand side. Default False.
+    show_axis : bool
+        If False, hide the axis. Default False.
+    show_labels : bool
+        If True, add the tip labels once the branches are complete.
+        Default True.
+    scale_bar : bool
+        If True, draw a scale bar with the skeleton. Default True.
+    col_dict : dict
+        Dictionary with tip labels as keys and colours as values.
+    label_dict : dict
+        Dictionary with tip labels as keys and the text to show as
+        values.
+    bold : list
+        Tip labels to show in bold.
+    font_size : int
+        Font size for the tip labels. Default 10.
+    line_col : str or tuple
+        Colour of the branches. Default black.
+    line_width : float
+        Width of the branches. Default 1.
+    collapsed_col : str or tuple
+        Colour of the triangles of collapsed clades. Default lightgrey.
+    skeleton_nodes : int
+        Largest number of nodes in the skeleton, which sets the number of
+        levels drawn at first. Default 5000.
+    chunk_size : int
+        Smallest number of branches added in a step. Default 5000.
+    label_chunk : int
+        Number of tip labels created between checks of the time budget.
+        Default 50.
+    budget : float
+        Time in seconds a step spends creating and drawing tip labels
+        before returning. Default 0.1.
+
+    Attributes
+    ----------
+    layout : TreeLayout
+        Positions of the nodes of the tree.
+    branches : matplotlib.collections.LineCollection
+        The branches drawn so far.
+    collapsed : matplotlib.collections.PolyCollection
+        Triangles of the clades which are not drawn yet.
+    texts : list
+        Tip label text objects created so far, in the order of
+        layout.tips.
+    drawn : numpy.ndarray
+        True for each node whose branch has been drawn.
+    done : bool
+        True once the whole tree has been drawn.
+    cancelled : bool
+        True if the render was cancelled.
+    result : PlotResult or None
+        The finished tree, as returned by plot_phylo, None until done.
+    '''
+    def __init__(self, tree, ax,
+                 xpos=0,
+                 ypos=0,
+                 width=10,
+                 height=10,
+                 branch_lengths=True,
+                 reverse=False,
+                 show_axis=False,
+                 show_labels=True,
+                 scale_bar=True,
+                 col_dict=None,
+                 label_dict=None,
+                 bold=None,
+                 font_size=10,
+                 line_col='black',
+                 line_width=1,
+                 collapsed_col='lightgrey',
+                 skeleton_nodes=5000,
+                 chunk_size=5000,
+                 label_chunk=50,
+                 budget=0.1):
+        self.ax = ax
+        self.canvas = ax.figure.canvas
+        self.show_labels = show_labels
+        self.chunk_size = chunk_size
+        self.label_chunk = label_chunk
+        self.budget = budget
+        self.appearance = default_appearance()
+        self.appearance.update({'font_size': font_size,
+                                'line_col': line_col,
+                                'line_width': line_width,
+                                'col_dict': StyleLookup(col_dict, 'black'),
+                                'label_dict': StyleLookup(label_dict),
+                                'bold': frozenset(bold or ())})
+        self.done = False
+        self.cancelled = False
+        self.result = None
+        self.texts = []
+        self.timer = None
+        self.painted = False
+
+        ct = read_tree(tree)
+        depth = tree_depth(ct)
+        if not branch_lengths:
+            xpos += 1
+            width -= 2
+        self.layout = layout_tree(ct, xpos=xpos, ypos=ypos, height=height,
+                                  width=width, depth=depth,
+                                  branch_lengths=branch_lengths,
+                                  reverse=reverse)
+        self.segments = branch_segments(self.layout)
+        self.sizes = subtree_sizes(ct, np.ones(ct.n_nodes, dtype=np.int64))
+        # Nodes are added level by level, in preorder within each level
+        self.order = np.argsort(ct.level, kind='stable')
+        self.drawn = np.zeros(ct.n_nodes, dtype=bool)
+        self.n_drawn = 0
+
+        self.branches = LineCollection([], colors=line_col,
+                                       linewidths=line_width,
+                                       capstyle='projecting', zorder=2)
+        self.collapsed = PolyCollection([], facecolors=collapsed_col,
+                                        edgecolors='none', zorder=1)
+        ax.add_collection(self.collapsed)
+        ax.add_collection(self.branches)
+        # The limits cover the whole tree from the start, so they do not
+        # change as the tree is filled in
+        ax.update_datalim([(xpos, ypos), (xpos + width, ypos + height)])
+        ax.autoscale_view()
+        if not show_axis:
+            ax.set_axis_off()
+        if scale_bar and branch_lengths:
+            draw_scale_bar(ax, width, height, depth, xpos, ypos,
+                           appearance=self.appearance)
+        self.cid = self.canvas.mpl_connect('draw_event', self._on_draw)
+
+        level = skeleton_level(ct, skeleton_nodes)
+        self._add(int(np.count_nonzero(ct.level <= level)))
+
+    def _on_draw(self, event):
+        # New labels can only be blitted over a figure which has been
+        # drawn
+        self.painted = True
+
+    def _add(self, count):
+        # Draws the branches of the next nodes in level order and
+        # collapses the clades below nodes with undrawn children
+        ct = self.layout.tree
+        new = self.order[self.n_drawn:self.n_drawn + count]
+        self.drawn[new] = True
+        self.n_drawn += len(new)
+        children = np.bincount(ct.parent[self.drawn & (ct.parent >= 0)],
+                               minlength=ct.n_nodes)
+        complete = children == ct.n_children
+        internal = ~ct.is_leaf
+        # One horizontal line per node, then the vertical line of each
+        # internal node once all of its children are drawn
+        lines = np.concatenate([self.drawn,
+                                (self.drawn & complete)[internal]])
+        self.branches.set_segments(self.segments[lines])
+        collapsed = np.flatnonzero(self.drawn & internal & ~complete)
+        self.collapsed.set_verts(collapsed_triangles(self.layout, collapsed,
+                                                     self.sizes))
+        self.canvas.draw_idle()
+
+    def _add_labels(self, deadline):
+        # Creates tip labels in chunks until the deadline has passed.
+        # Drawing the labels takes longer than creating them, so each
+        # chunk is also drawn before the deadline is checked
+        layout = self.layout
+        names = layout.tree.names
+        appearance = self.appearance
+        blit = self.painted and self.canvas.supports_blit
+        while len(self.texts) < len(layout.tips) and \
+                time.perf_counter() < deadline:
+            first = len(self.texts)
+            for i in range(first, min(first + self.label_chunk,
+                                      len(layout.tips))):
+                nam = names[layout.tips[i]]
+                weight = 'bold' if nam in appearance['bold'] else 'normal'
+                self.texts.append(self.ax.text(
+                    layout.text_x[i], layout.y[layout.tips[i]],
+                    "  %s  " % appearance['label_dict'][nam],
+                    color=appearance['col_dict'][nam],
+                    fontsize=appearance['font_size'], va='center',
+                    ha=layout.ha, fontweight=weight))
+            if blit:
+                # Only the new labels are drawn, over the figure as it is
+                for text in self.texts[first:]:
+                    self.ax.draw_artist(text)
+        if blit:
+            self.canvas.blit(self.ax.figure.bbox)
+        else:
+            self.canvas.draw_idle()
+
+    def step(self):
+        '''
+        Adds the next piece of the tree, either the next levels of
+        branches or as many tip labels as fit in the time budget.
+
+        Returns
+        -------
+        more : bool
+            True if there is more to draw, False once the tree is
+            finished or the render was cancelled.
+        '''
+        if self.done or self.cancelled:
+            return False
+        deadline = time.perf_counter() + self.budget
+        ct = self.layout.tree
+        if self.n_drawn < ct.n_nodes:
+            self._add(max(self.chunk_size, self.n_drawn))
+            return True
+        if self.show_labels and len(self.texts) < len(self.layout.tips):
+            self._add_labels(deadline)
+            if len(self.texts) < len(self.layout.tips):
+                return True
+        self._finish()
+        return False
+
+    def _finish(self):
+        names = self.layout.tree.names[self.layout.tips]
+        ps = [[nam, text] for nam, text in zip(names, self.texts)]
+        self.result = PlotResult(self.ax, self.layout, ps, self.branches,
+                                 self.appearance['bold'])
+        self.done = True
+        self._stop()
+        self.canvas.draw_idle()
+
+    def steps(self):
+        '''
+        Runs the render one step at a time, for cooperative scheduling,
+        for example from an asyncio task which awaits between steps.
+
+        Yields
+        ------
+        render : ProgressiveTree
+            This object, after each step.
+        '''
+        while self.step():
+            yield self
+
+    def finish(self):
+        '''
+        Runs the remaining steps without stopping.
+
+        Returns
+        -------
+        result : PlotResult or None
+            The finished tree, None if the render was cancelled.
+        '''
+        while self.step():
+            pass
+        return self.result
+
+    def start(self, interval=10):
+        '''
+        Runs the steps from a timer of the figure, so the event loop of
+        an interactive backend, such as ipympl in Jupyter, handles other
+        events between steps. Non-interactive backends have no event
+        loop, so use steps or finish with them instead.
+
+        Parameters
+        ----------
+        interval : int
+            Delay between steps in milliseconds. Default 10.
+        '''
+        self._stop()
+        self.timer = self.canvas.new_timer(interval=interval)
+        self.timer.add_callback(self._on_timer)
+        self.timer.start()
+
+    def _on_timer(self):
+        if not self.step():
+            self._stop()
+
+    def _stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
+        if self.cid is not None and (self.done or self.cancelled):
+            self.canvas.mpl_disconnect(self.cid)
+            self.cid = None
+
+    def cancel(self):
+        '''
+        Stops the render, leaving the parts of the tree drawn so far.
+        '''
+        if not self.done:
+            self.cancelled = True
+        self._stop()
+
+
+def plot_progressive(tree, ax, start=True, interval=10, **kwargs):
+    '''
+    Draws a tree progressively: a skeleton of the tree is shown
+    straight away and the rest of the tree is filled in by the timer of
+    the figure, as described in ProgressiveTree.
+
+    Parameters
+    ----------
+    tree : str, file object, numpy.ndarray or CompactTree
+        The tree, as accepted by read_tree.
+    ax : matplotlib.axes._axes.Axes
+        An open matplotlib ax object
+    start : bool
+        If True, start filling in the tree from the timer of the figure.
+        Otherwise only the skeleton is drawn and the caller runs the
+        steps. Default True.
+    interval : int
+        Delay between steps in milliseconds. Default 10.
+    **kwargs
+        Further arguments to ProgressiveTree.
+
+    Returns
+    -------
+    render : ProgressiveTree
+        The render in progress, which can be cancelled, and whose result
+        is the finished tree.
+    '''
+    render = ProgressiveTree(tree, ax, **kwargs)
+    if start:
+        render.start(interval)
+    return render
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import concurrent.futures
+import os
+import time
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from plot_phylo.plot_phylo import plot_phylo
+
+
+def render_figure(tree, kwargs, path, figsize=(10, 10), dpi=100):
+    '''
+    Draws a tree on a new figure and saves it. pyplot keeps global state
+    which is not thread safe, so the figure is created directly with the
+    Agg canvas and is never registered with pyplot.
+
+    Parameters
+    ----------
+    tree : str or CompactTree
+        Either the path to a newick formatted tree, a string containing
+        a newick formatted tree or a CompactTree.
+    kwargs : dict
+        Further arguments to plot_phylo, or None.
+    path : str
+        Path to save the image to, the format is taken from the
+        extension.
+    figsize : tuple(float, float)
+        Width and height of the figure in inches. Default (10, 10).
+    dpi : float
+        Resolution of the image. Default 100.
+
+    Returns
+    -------
+    seconds : float
+        Time taken to draw and save the figure.
+    '''
+    start = time.perf_counter()
+    f = Figure(figsize=figsize)
+    FigureCanvasAgg(f)
+    a = f.add_subplot(111)
+    plot_phylo(tree, a, **(kwargs or {}))
+    f.savefig(path, dpi=dpi, bbox_inches='tight')
+    return time.perf_counter() - start
+
+
+def render_jobs(jobs,
+                max_workers=None,
+                figsize=(10, 10),
+                dpi=100,
+                baseline=False):
+    '''
+    Renders many trees into separate figures at the same time in a pool
+    of threads. plot_phylo and its helpers keep no state between calls
+    and Agg releases the GIL while rasterising and saving, so the jobs
+    overlap without affecting each other.
+
+    Parameters
+    ----------
+    jobs : list
+        List of (tree, kwargs, path) tuples, where kwargs is a dictionary
+        of further arguments to plot_phylo, or None.
+    max_workers : int
+        Number of threads, by default the number of CPUs.
+    figsize : tuple(float, float)
+        Width and height of each figure in inches. Default (10, 10).
+    dpi : float
+        Resolution of the images. Default 100.
+    baseline : bool
+        If True, the jobs are first rendered one at a time in this
+        thread, so the speedup is measured rather than estimated.
+        Default False.
+
+    Returns
+    -------
+    report : dict
+        The number of jobs and threads, the total time taken in seconds
+        as elapsed, the time taken by each job as job_seconds, in the
+        same order as the jobs, and the speedup over rendering the jobs
+        one at a time. Without the baseline, the speedup is estimated as
+        the sum of the job times divided by the elapsed time, which
+        overestimates it when the threads slow each other down.
+    '''
+    jobs = list(jobs)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    serial = None
+    if baseline:
+        start = time.perf_counter()
+        for tree, kwargs, path in jobs:
+            render_figure(tree, kwargs, path, figsize=figsize, dpi=dpi)
+        serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        futures = [pool.submit(render_figure, tree, kwargs, path,
+                               figsize=figsize, dpi=dpi)
+                   for tree, kwargs, path in jobs]
+        job_seconds = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    if serial is None:
+        serial = sum(job_seconds)
+    return {'jobs': len(jobs),
+            'threads': max_workers,
+            'elapsed': elapsed,
+            'job_seconds': job_seconds,
+            'serial': serial,
+            'speedup': serial / elapsed if elapsed > 0 else 1.0}
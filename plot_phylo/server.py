@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+'''
+Local HTTP server which renders trees with plot_phylo.
+
+Trees are rendered in a pool of worker processes using the Agg backend.
+Identical requests which arrive while a tree is being rendered share a
+single render, and finished images are stored in a bounded on-disk cache
+keyed on the content of the request.
+
+Run with
+
+    python -m plot_phylo.server --port 8000 --cache_dir plot_cache
+
+then POST a JSON object to /render, for example
+
+    {"tree": "((A:1,B:1):1,C:2);", "format": "svg",
+     "kwargs": {"align_tips": true}, "figsize": [8, 10]}
+
+GET /metrics returns the request counts, cache hit rate and render
+latency as JSON.
+'''
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import inspect
+import io
+import json
+import multiprocessing
+import os
+import time
+
+# Arguments of plot_phylo which are set by the server
+RESERVED = ('tree', 'ax')
+# Arguments of plot_phylo which read or write files, which clients may
+# not use
+FILE_ARGUMENTS = ('alignment',)
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+def plot_phylo_defaults():
+    '''
+    Returns the default value of each optional argument of plot_phylo.
+    '''
+    from plot_phylo.plot_phylo import plot_phylo
+    params = inspect.signature(plot_phylo).parameters
+    return dict((nam, p.default) for nam, p in params.items()
+                if nam not in RESERVED)
+
+
+def normalise_kwargs(kwargs, defaults=None):
+    '''
+    Removes arguments which are set to their default value, so that
+    requests which draw the same plot have the same cache key. Arguments
+    which read or write files on the server are refused.
+
+    Parameters
+    ----------
+    kwargs : dict
+        Arguments to pass to plot_phylo.
+    defaults : dict
+        Default value of each argument of plot_phylo, as returned by
+        plot_phylo_defaults.
+
+    Returns
+    -------
+    kwargs : dict
+        Arguments which differ from the default values.
+    '''
+    if defaults is None:
+        defaults = plot_phylo_defaults()
+    if not isinstance(kwargs, dict):
+        raise RuntimeError("kwargs must be a JSON object")
+    refused = [k for k in kwargs if k in FILE_ARGUMENTS]
+    if refused:
+        raise RuntimeError("plot_phylo arguments which use files are not "
+                           "accepted: %s" % ", ".join(sorted(refused)))
+    unknown = [k for k in kwargs if k not in defaults]
+    if unknown:
+        raise RuntimeError("Unknown plot_phylo arguments: %s" % ", ".join(
+            sorted(unknown)))
+    return dict((k, v) for k, v in kwargs.items() if v != defaults[k])
+
+
+def cache_key(newick, fmt, kwargs, figsize):
+    '''
+    Hashes the content of a render request.
+
+    Parameters
+    ----------
+    newick : str
+        Newick formatted tree.
+    fmt : str
+        Output format, png or svg.
+    kwargs : dict
+        Normalised arguments to pass to plot_phylo.
+    figsize : list
+        Width and height of the figure in inches.
+
+    Returns
+    -------
+    key : str
+        Hexadecimal SHA-256 hash of the request.
+    '''
+    h = hashlib.sha256()
+    h.update(newick.strip().encode())
+    h.update(b'\0')
+    h.update(json.dumps([fmt, kwargs, list(figsize)],
+                        sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def init_worker():
+    '''
+    Sets up a worker process to draw without a display.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render_tree(newick, fmt, kwargs, figsize):
+    '''
+    Draws a tree on a new figure and returns the image. This runs in the
+    worker processes.
+
+    Parameters
+    ----------
+    newick : str
+        Newick formatted tree.
+    fmt : str
+        Output format, png or svg.
+    kwargs : dict
+        Arguments to pass to plot_phylo.
+    figsize : list
+        Width and height of the figure in inches.
+
+    Returns
+    -------
+    image : bytes
+        The rendered image.
+    '''
+    import matplotlib.pyplot as plt
+    from plot_phylo.newick import parse_newick
+    from plot_phylo.plot_phylo import plot_phylo
+
+    # The text is always parsed as a tree, so it can never be looked up
+    # as the path to a file
+    ct = parse_newick(newick)
+    f = plt.figure(figsize=figsize)
+    try:
+        a = f.add_subplot(111)
+        plot_phylo(ct, a, **kwargs)
+        buf = io.BytesIO()
+        f.savefig(buf, format=fmt, bbox_inches='tight')
+    finally:
+        plt.close(f)
+    return buf.getvalue()
+
+
+class ImageCache(object):
+    '''
+    Bounded on-disk cache of rendered images, stored in one file per
+    image named by the hash of the request. When the cache is full the
+    least recently used images are removed.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to store the images in, created if it doesn't exist.
+    max_bytes : int
+        Maximum total size of the images in the cache.
+    '''
+    __slots__ = ('directory', 'max_bytes', 'entries', 'size')
+
+    def __init__(self, directory, max_bytes=256 * 1024 ** 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # Least recently used first, images left by an earlier run are
+        # ordered by their last access time
+        files = []
+        for nam in os.listdir(directory):
+            path = os.path.join(directory, nam)
+            if os.path.isfile(path) and not nam.endswith('.tmp'):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, nam, stat.st_size))
+        self.entries = collections.OrderedDict(
+            (nam, size) for _, nam, size in sorted(files))
+        self.size = sum(self.entries.values())
+        self._evict()
+
+    def _path(self, nam):
+        return os.path.join(self.directory, nam)
+
+    def get(self, key, fmt):
+        '''
+        Returns a cached image, or None if it is not in the cache.
+        '''
+        nam = "%s.%s" % (key, fmt)
+        if nam not in self.entries:
+            return None
+        try:
+            with open(self._path(nam), 'rb') as inf:
+                data = inf.read()
+        except OSError:
+            self.size -= self.entries.pop(nam)
+            return None
+        self.entries.move_to_end(nam)
+        os.utime(self._path(nam))
+        return data
+
+    def put(self, key, fmt, data):
+        '''
+        Stores an image, removing the least recently used images if the
+        cache is full.
+        '''
+        nam = "%s.%s" % (key, fmt)
+        if len(data) > self.max_bytes:
+            return
+        # Write to a temporary file first so a partly written image is
+        # never read
+        tmp = self._path(nam + '.tmp')
+        with open(tmp, 'wb') as outf:
+            outf.write(data)
+        os.replace(tmp, self._path(nam))
+        self.size += len(data) - self.entries.pop(nam, 0)
+        self.entries[nam] = len(data)
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            nam, size = self.entries.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(self._path(nam))
+            except OSError:
+                pass
+
+
+class RenderServer(object):
+    '''
+    Asyncio HTTP server which renders trees in a process pool.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory for the image cache.
+    max_cache_bytes : int
+        Maximum total size of the image cache.
+    workers : int
+        Number of worker processes, by default the number of CPUs.
+    host : str
+        Address to listen on, must be a local address.
+    port : int
+        Port to listen on, 0 to choose a free port.
+    max_latencies : int
+        Number of recent requests used for the latency metrics.
+    '''
+    def __init__(self, cache_dir,
+                 max_cache_bytes=256 * 1024 ** 2,
+                 workers=None,
+                 host='127.0.0.1',
+                 port=8000,
+                 max_latencies=1000):
+        if host not in LOCAL_HOSTS:
+            raise RuntimeError(
+                "The render server only listens on localhost, not %s" % host)
+        self.cache = ImageCache(cache_dir, max_cache_bytes)
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.defaults = plot_phylo_defaults()
+        self.pool = None
+        self.server = None
+        # Renders which are in progress, keyed on the cache key
+        self.pending = dict()
+        self.counts = collections.Counter()
+        self.latencies = collections.deque(maxlen=max_latencies)
+
+    async def start(self):
+        '''
+        Starts the worker processes and begins listening. Sets self.port
+        to the port in use.
+        '''
+        # Forked workers would inherit the sockets of open connections
+        # and hold them open, so the workers are started fresh
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker)
+        self.server = await asyncio.start_server(self.handle, self.host,
+                                                 self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        '''
+        Stops listening and shuts down the worker processes.
+        '''
+        self.server.close()
+        await self.server.wait_closed()
+        self.pool.shutdown()
+
+    async def render(self, request):
+        '''
+        Returns the image for a render request, from the cache, from a
+        render of the same request which is already in progress, or by
+        rendering it in the process pool.
+
+        Parameters
+        ----------
+        request : dict
+            Request with the keys tree (a Newick string) and optionally
+            format (png or svg, default png), kwargs (arguments to
+            plot_phylo) and figsize (width and height in inches).
+
+        Returns
+        -------
+        image : bytes
+            The rendered image.
+        fmt : str
+            Format of the image.
+        '''
+        if not isinstance(request, dict):
+            raise RuntimeError("The request must be a JSON object")
+        newick = request.get('tree')
+        # Only Newick strings are accepted, never paths to files
+        if not isinstance(newick, str) or not newick.strip().endswith(';'):
+            raise RuntimeError("tree must be a Newick formatted string")
+        fmt = request.get('format', 'png')
+        if fmt not in FORMATS:
+            raise RuntimeError("format must be one of %s" % ", ".join(
+                FORMATS))
+        kwargs = normalise_kwargs(request.get('kwargs', {}), self.defaults)
+        figsize = list(request.get('figsize', [10, 10]))
+        key = cache_key(newick, fmt, kwargs, figsize)
+
+        data = self.cache.get(key, fmt)
+        if data is not None:
+            self.counts['cache_hits'] += 1
+            return data, fmt
+        if key in self.pending:
+            self.counts['coalesced'] += 1
+            return await asyncio.shield(self.pending[key]), fmt
+
+        self.counts['renders'] += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, render_tree, newick, fmt,
+                                      kwargs, figsize)
+        self.pending[key] = future
+        try:
+            data = await asyncio.shield(future)
+        finally:
+            del self.pending[key]
+        self.cache.put(key, fmt, data)
+        return data, fmt
+
+    def metrics(self):
+        '''
+        Returns the request counts, cache hit rate and latency of recent
+        requests in milliseconds.
+        '''
+        out = dict(self.counts)
+        served = sum(self.counts[k]
+                     for k in ('cache_hits', 'coalesced', 'renders'))
+        if served:
+            out['cache_hit_rate'] = self.counts['cache_hits'] / served
+        else:
+            out['cache_hit_rate'] = 0.0
+        out['cache_bytes'] = self.cache.size
+        out['cache_entries'] = len(self.cache.entries)
+        out['pending'] = len(self.pending)
+        if self.latencies:
+            lat = sorted(self.latencies)
+            out['latency_ms'] = {
+                'mean': sum(lat) / len(lat),
+                'p50': lat[len(lat) // 2],
+                'p95': lat[min(int(len(lat) * 0.95), len(lat) - 1)],
+                'max': lat[-1]}
+        return out
+
+    async def handle(self, reader, writer):
+        '''
+        Handles one HTTP request.
+        '''
+        start = time.perf_counter()
+        try:
+            method, path, body = await read_request(reader)
+            if method == 'GET' and path == '/metrics':
+                status, ctype = 200, 'application/json'
+                data = json.dumps(self.metrics()).encode()
+            elif method == 'POST' and path == '/render':
+                self.counts['requests'] += 1
+                try:
+                    data, fmt = await self.render(json.loads(body))
+                    status, ctype = 200, FORMATS[fmt]
+                except (RuntimeError, ValueError, TypeError) as err:
+                    self.counts['errors'] += 1
+                    status, ctype = 400, 'text/plain'
+                    data = str(err).encode()
+                self.latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                status, ctype, data = 404, 'text/plain', b'Not found'
+        except Exception as err:
+            self.counts['errors'] += 1
+            status, ctype, data = 500, 'text/plain', str(err).encode()
+        await write_response(writer, status, ctype, data)
+
+    def serve_forever(self):
+        '''
+        Runs the server until it is interrupted.
+        '''
+        async def run():
+            await self.start()
+            try:
+                await self.server.serve_forever()
+            finally:
+                await self.stop()
+        asyncio.run(run())
+
+
+async def read_request(reader):
+    '''
+    Reads the method, path and body of an HTTP request.
+    '''
+    line = await reader.readline()
+    parts = line.decode('latin-1').split()
+    if len(parts) < 2:
+        raise RuntimeError("Malformed request")
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            break
+        nam, _, value = header.decode('latin-1').partition(':')
+        if nam.strip().lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length) if length else b''
+    return parts[0].upper(), parts[1], body
+
+
+async def write_response(writer, status, ctype, data):
+    '''
+    Writes an HTTP response and closes the connection.
+    '''
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+               500: 'Internal Server Error'}
+    head = ("HTTP/1.1 %i %s\r\nContent-Type: %s\r\nContent-Length: %i\r\n"
+            "Connection: close\r\n\r\n" % (status, reasons[status], ctype,
+                                           len(data)))
+    writer.write(head.encode() + data)
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local HTTP server which renders trees with plot_phylo")
+    parser.add_argument("--host", default='127.0.0.1', choices=LOCAL_HOSTS)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache_dir", default='plot_phylo_cache')
+    parser.add_argument("--max_cache_mb", type=float, default=256)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    server = RenderServer(args.cache_dir,
+                          max_cache_bytes=int(args.max_cache_mb * 1024 ** 2),
+                          workers=args.workers,
+                          host=args.host,
+                          port=args.port)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+import numpy as np
+from matplotlib.collections import LineCollection
+from plot_phylo.compact import (subtree_sizes, preorder_positions, _reorder,
+                                tree_depth)
+from plot_phylo.layout import layout_tree
+from plot_phylo.plot_phylo import read_tree, draw_layout, StyleLookup
+from plot_phylo.compare import compare_trees, branch_styles
+
+
+def plot_tanglegram(tree1, tree2, ax,
+                    links=None,
+                    xpos=0,
+                    ypos=0,
+                    width=10,
+                    height=10,
+                    gap=10,
+                    untangle=True,
+                    max_iter=10,
+                    show_axis=False,
+                    show_support=False,
+                    align_tips=False,
+                    branch_lengths=True,
+                    col_dict=None,
+                    label_dict=None,
+                    font_size=10,
+                    line_col='black',
+                    line_width=1,
+                    bold=None,
+                    link_col='grey',
+                    link_width=1,
+                    link_alpha=0.6,
+                    compare=None,
+                    diff_col='red',
+                    diff_width=2):
+    '''
+    Draws two trees facing each other, with lines connecting associated
+    tips, for example hosts and parasites or genes and species.
+
+    The tips are matched using their indices rather than their labels
+    and the connecting lines are drawn as a single LineCollection.
+
+    Parameters
+    ----------
+    tree1 : str or CompactTree
+        Tree to draw on the left, either the path to a newick formatted
+        tree, a string containing a newick formatted tree or a
+        CompactTree. Required.
+    tree2 : str or CompactTree
+        Tree to draw on the right, with the root on the right hand side.
+        Required.
+    ax : matplotlib.axes._axes.Axes,
+        An open matplotlib ax object where the trees will be plotted.
+        Required.
+    links : dict or list
+        Associations between the tips of the two trees, either a
+        dictionary with tips of tree1 as keys and a tip or list of tips
+        of tree2 as values, or a list of (tip1, tip2) pairs. By default,
+        tips with identical names are connected.
+    xpos : float
+        Position of the root of the left tree on the x axis. Default 0.
+    ypos : float
+        Position of the bottom of the trees on the y axis. Default 0.
+    width : float
+        Width of each tree, in axis units. Default 10.
+    height : float
+        Height of the trees, in axis units. Default 10.
+    gap : float
+        Distance between the tips of the two trees, in axis units, the
+        tip labels and connecting lines are drawn in this space.
+        Default 10.
+    untangle : bool
+        If True, rotate the children of the nodes of both trees to
+        reduce the number of crossing lines. Default True.
+    max_iter : int
+        Maximum number of rounds of rotation. Default 10.
+    show_axis : bool
+        Show the axis on the output plot. Default False.
+    show_support : bool
+        Display branch support on the internal nodes of the trees.
+        Default False.
+    align_tips : bool
+        If True, the tip labels will be aligned rather than positioned at
+        the end of the branches. Default False.
+    branch_lengths : bool
+        If True, the branch lengths provided in the trees are used,
+        otherwise all branches are fixed to the same length. Default True.
+    col_dict : dict
+        Dictionary with tip labels as keys and colours as values, tips
+        which are not specified will be black.
+    label_dict : dict
+        Dictionary with current tip labels as keys and desired tip labels
+        as values.
+    font_size : int
+        Font size for tip labels. Default 10.
+    line_col : str or tuple
+        Colour of the branches. Default is black.
+    line_width : float
+        Width of the branches. Default 1.
+    bold : list
+        List of tip labels to show in bold.
+    link_col : str or tuple
+        Colour of the connecting lines. Default grey.
+    link_width : float
+        Width of the connecting lines. Default 1.
+    link_alpha : float
+        Transparency of the connecting lines. Default 0.6.
+    compare : str
+        Either "rooted" or "unrooted" to compare the two trees, drawing
+        the branches of each tree which split the tips found in both
+        trees in a way not found in the other tree with diff_col and
+        diff_width. Tips are matched on their names. By default the
+        trees are not compared.
+    diff_col : str or tuple
+        Colour of the branches missing from the other tree. Default red.
+    diff_width : float
+        Width of the branches missing from the other tree. Default 2.
+
+    Returns
+    -------
+    layout1 : TreeLayout
+        Positions of the nodes of the left tree.
+    layout2 : TreeLayout
+        Positions of the nodes of the right tree.
+    links : matplotlib.collections.LineCollection
+        The connecting lines.
+    '''
+    ct1 = read_tree(tree1)
+    ct2 = read_tree(tree2)
+    idx1, idx2 = match_tips(ct1, ct2, links)
+    if compare not in (None, 'rooted', 'unrooted'):
+        raise RuntimeError("compare must be rooted or unrooted")
+
+    if untangle:
+        rank1, rank2 = untangle_trees(ct1, ct2, idx1, idx2,
+                                      max_iter=max_iter)
+        pos1 = preorder_positions(ct1.parent, rank1)
+        pos2 = preorder_positions(ct2.parent, rank2)
+        ct1 = _reorder(ct1.parent, rank1, ct1.dist, ct1.support, ct1.names,
+                       pos=pos1, attrs=ct1.attrs)
+        ct2 = _reorder(ct2.parent, rank2, ct2.dist, ct2.support, ct2.names,
+                       pos=pos2, attrs=ct2.attrs)
+        idx1 = pos1[idx1]
+        idx2 = pos2[idx2]
+
+    # Without branch lengths the root appears one unit outside the tree,
+    # as in plot_phylo
+    xpos2 = xpos + width + gap
+    if not branch_lengths:
+        xpos += 1
+        width -= 2
+    elif align_tips:
+        width -= 1
+
+    styles = [(None, None), (None, None)]
+    if compare is not None:
+        # The splits do not depend on the order of the children, so the
+        # untangled trees can be compared directly
+        comparison = compare_trees(ct1, ct2,
+                                   unrooted=compare == 'unrooted')
+        styles = [branch_styles(ct, missing, line_col, line_width,
+                                diff_col, diff_width)
+                  for ct, missing in [[ct1, comparison.missing1],
+                                      [ct2, comparison.missing2]]]
+
+    layouts = []
+    ps = []
+    for ct, x, reverse, (cols, widths) in [[ct1, xpos, False, styles[0]],
+                                           [ct2, xpos2, True, styles[1]]]:
+        appearance = {'font_size': font_size,
+                      'line_col': line_col,
+                      'line_width': line_width,
+                      'col_dict': StyleLookup(col_dict, 'black'),
+                      'label_dict': StyleLookup(label_dict),
+                      'show_support': show_support,
+                      'bold': frozenset(bold or ()),
+                      'branch_cols': cols,
+                      'branch_widths': widths}
+        layout = layout_tree(ct, xpos=x, ypos=ypos, height=height,
+                             width=width, depth=tree_depth(ct),
+                             align_tips=align_tips,
+                             branch_lengths=branch_lengths,
+                             reverse=reverse)
+        layouts.append(layout)
+        ps.append(draw_layout(ax, layout, appearance)[0])
+    layout1, layout2 = layouts
+
+    # Tip label positions, indexed by node
+    renderer = ax.figure.canvas.get_renderer()
+    inv = ax.transData.inverted()
+    edges = []
+    for layout, p, side in [[layout1, ps[0], 1], [layout2, ps[1], 0]]:
+        edge = np.zeros(layout.tree.n_nodes)
+        edge[layout.tips] = [inv.transform(t[1].get_window_extent(
+            renderer))[side][0] for t in p]
+        edges.append(edge)
+
+    segments = np.empty((len(idx1), 2, 2))
+    segments[:, 0, 0] = edges[0][idx1]
+    segments[:, 0, 1] = layout1.y[idx1]
+    segments[:, 1, 0] = edges[1][idx2]
+    segments[:, 1, 1] = layout2.y[idx2]
+    links = LineCollection(segments, colors=link_col, linewidths=link_width,
+                           alpha=link_alpha)
+    ax.add_collection(links)
+    if not show_axis:
+        ax.set_axis_off()
+    return (layout1, layout2, links)
+
+
+def match_tips(ct1, ct2, links=None):
+    '''
+    Converts associations between the tips of two trees into pairs of
+    node indices, using one hash lookup per tip.
+
+    Parameters
+    ----------
+    ct1 : CompactTree
+        First tree.
+    ct2 : CompactTree
+        Second tree.
+    links : dict or list
+        Either a dictionary with tips of ct1 as keys and a tip or list of
+        tips of ct2 as values, or a list of (tip1, tip2) pairs. By
+        default, tips with identical names are matched.
+
+    Returns
+    -------
+    idx1 : numpy.ndarray
+        Index of the first tip of each pair in ct1.
+    idx2 : numpy.ndarray
+        Index of the second tip of each pair in ct2.
+    '''
+    lookup1 = dict(zip(ct1.names[ct1.leaves], ct1.leaves))
+    lookup2 = dict(zip(ct2.names[ct2.leaves], ct2.leaves))
+    if links is None:
+        pairs = [(n, n) for n in lookup1 if n in lookup2]
+    elif isinstance(links, dict):
+        pairs = [(a, b) for a, bs in links.items()
+                 for b in ([bs] if isinstance(bs, str) else bs)]
+    else:
+        pairs = links
+    idx1 = []
+    idx2 = []
+    missing = []
+    for a, b in pairs:
+        if a in lookup1 and b in lookup2:
+            idx1.append(lookup1[a])
+            idx2.append(lookup2[b])
+        else:
+            missing.append("%s-%s" % (a, b))
+    if missing:
+        raise RuntimeError(
+            "Linked tips not found in trees: %s" % ", ".join(missing))
+    return (np.array(idx1, dtype=np.int64), np.array(idx2, dtype=np.int64))
+
+
+def count_crossings(pos1, pos2):
+    '''
+    Counts the number of pairs of connecting lines which cross, as the
+    number of inversions between the two tip orders, in O(m log m).
+
+    Parameters
+    ----------
+    pos1 : numpy.ndarray
+        Position of the first tip of each link in the first tree.
+    pos2 : numpy.ndarray
+        Position of the second tip of each link in the second tree.
+
+    Returns
+    -------
+    crossings : int
+        Number of crossing lines.
+    '''
+    if len(pos1) < 2:
+        return 0
+    order = np.lexsort((pos2, pos1))
+    ranks = np.unique(pos2, return_inverse=True)[1][order]
+    k = int(ranks.max()) + 1
+    # Fenwick tree of the number of lines seen so far at each rank
+    counts = [0] * (k + 1)
+    crossings = 0
+    for i, r in enumerate(ranks.tolist()):
+        j = r + 1
+        below = 0
+        while j > 0:
+            below += counts[j]
+            j -= j & -j
+        crossings += i - below
+        j = r + 1
+        while j <= k:
+            counts[j] += 1
+            j += j & -j
+    return crossings
+
+
+def _tip_positions(ct, rank):
+    '''
+    Position of each leaf from the top of the tree, if siblings are
+    ordered by rank.
+    '''
+    pos = preorder_positions(ct.parent, rank)
+    leaves = ct.leaves
+    tippos = np.zeros(ct.n_nodes)
+    tippos[leaves[np.argsort(pos[leaves])]] = np.arange(len(leaves))
+    return tippos
+
+
+def _barycentres(ct, idx, other_pos, own_pos, scale):
+    '''
+    Mean position in the other tree of the tips linked to each clade.
+    Clades without links keep their current mean position.
+    '''
+    total = np.zeros(ct.n_nodes)
+    count = np.zeros(ct.n_nodes)
+    np.add.at(total, idx, other_pos)
+    np.add.at(count, idx, 1)
+    total = subtree_sizes(ct, total)
+    count = subtree_sizes(ct, count)
+    current = subtree_sizes(ct, own_pos) / subtree_sizes(ct) * scale
+    return np.where(count > 0, total / np.maximum(count, 1), current)
+
+
+def untangle_trees(ct1, ct2, idx1, idx2, max_iter=10):
+    '''
+    Rotates the children of the nodes of two trees to reduce the number
+    of crossing connecting lines.
+
+    Each round sorts the children of every node of one tree by the mean
+    position of their linked tips in the other tree (the barycentre
+    heuristic), alternating between the trees. Each sort is a single
+    postorder pass, so a round is O(n log n). The best ordering seen is
+    kept.
+
+    Parameters
+    ----------
+    ct1 : CompactTree
+        First tree.
+    ct2 : CompactTree
+        Second tree.
+    idx1 : numpy.ndarray
+        Index of the first tip of each link in ct1.
+    idx2 : numpy.ndarray
+        Index of the second tip of each link in ct2.
+    max_iter : int
+        Maximum number of rounds.
+
+    Returns
+    -------
+    rank1 : numpy.ndarray
+        Sort key for the children of each node in ct1.
+    rank2 : numpy.ndarray
+        Sort key for the children of each node in ct2.
+    '''
+    rank1 = np.arange(ct1.n_nodes, dtype=float)
+    rank2 = np.arange(ct2.n_nodes, dtype=float)
+    pos1 = _tip_positions(ct1, rank1)
+    pos2 = _tip_positions(ct2, rank2)
+    scale1 = max(ct2.n_leaves - 1, 1) / max(ct1.n_leaves - 1, 1)
+    best = (count_crossings(pos1[idx1], pos2[idx2]), rank1, rank2)
+    for i in range(max_iter):
+        if best[0] == 0:
+            break
+        rank1 = _barycentres(ct1, idx1, pos2[idx2], pos1, scale1)
+        pos1 = _tip_positions(ct1, rank1)
+        rank2 = _barycentres(ct2, idx2, pos1[idx1], pos2, 1 / scale1)
+        pos2 = _tip_positions(ct2, rank2)
+        crossings = count_crossings(pos1[idx1], pos2[idx2])
+        if crossings >= best[0]:
+            break
+        best = (crossings, rank1, rank2)
+    return (best[1], best[2])
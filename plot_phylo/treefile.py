@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+import os
+import re
+import numpy as np
+from plot_phylo.plot_phylo import read_tree
+from plot_phylo.newick import read_chunks, is_compressed
+
+# First word of a Nexus statement, after any comments
+_KEYWORD = re.compile(rb"\s*(?:\[[^\]]*\]\s*)*([A-Za-z]+)")
+# Start of a Nexus tree statement, up to the equals sign before the tree
+_TREE_STATEMENT = re.compile(r"\s*(?:\[[^\]]*\]\s*)*tree\s+"
+                             r"(?:'(?:[^']|'')*'|[^\s=\[]+)\s*"
+                             r"(?:\[[^\]]*\]\s*)*=", re.IGNORECASE)
+# Pairs of a Nexus translate statement
+_TRANSLATE = re.compile(r"([^\s,]+)\s+('(?:[^']|'')*'|[^\s,;]+)")
+# Characters which can start or end a statement, quote or comment
+_SPECIAL = re.compile(rb"[;'\"\[\]]")
+
+
+def iter_newick(path, chunk_size=1 << 20):
+    '''
+    Reads the trees in a file containing one or more Newick trees, one
+    at a time, without reading the whole file into memory. Files
+    compressed with gzip, xz or bzip2 are decompressed as they are read.
+
+    Trees end with a semicolon, which may be followed by a line break.
+    Semicolons inside quoted labels and square bracket comments are
+    ignored.
+
+    Parameters
+    ----------
+    path : str or file object
+        Path to the tree file, or an open file in binary or text mode.
+    chunk_size : int
+        Number of bytes to read at once.
+
+    Yields
+    ------
+    newick : str
+        Each tree, as a Newick string including the final semicolon.
+    '''
+    buf = []
+    quote = None
+    depth = 0
+    for chunk in read_chunks(path, chunk_size):
+        start = 0
+        if quote is None and depth == 0 and not any(
+                c in chunk for c in "'\"["):
+            # Most files have no quotes or comments, so split on
+            # every semicolon
+            ends = chunk.split(';')
+            for part in ends[:-1]:
+                buf.append(part + ';')
+                newick = "".join(buf).strip()
+                buf = []
+                if newick != ';':
+                    yield newick
+            buf.append(ends[-1])
+            continue
+        for i, char in enumerate(chunk):
+            if quote is not None:
+                if char == quote:
+                    quote = None
+            elif char in "'\"" and depth == 0:
+                quote = char
+            elif char == '[':
+                depth += 1
+            elif char == ']':
+                depth -= 1
+            elif char == ';' and depth == 0:
+                buf.append(chunk[start:i+1])
+                newick = "".join(buf).strip()
+                buf = []
+                start = i + 1
+                if newick != ';':
+                    yield newick
+        buf.append(chunk[start:])
+    if "".join(buf).strip():
+        raise RuntimeError("Error in parsing Newick format: the last tree "
+                           "in %s does not end with a semicolon" % path)
+
+
+def iter_trees(trees):
+    '''
+    Converts a sequence of trees to CompactTrees, one at a time.
+
+    Parameters
+    ----------
+    trees : str, file object or iterable
+        Either the path to a file containing one or more Newick trees,
+        which may be compressed, an open file containing one or more
+        Newick trees or an iterable of Newick strings, paths or
+        CompactTrees.
+
+    Yields
+    ------
+    ct : CompactTree
+        Each tree.
+    '''
+    if isinstance(trees, str) or hasattr(trees, 'read'):
+        trees = iter_newick(trees)
+    for tree in trees:
+        yield read_tree(tree)
+
+
+def _statement_ends(inf, chunk_size):
+    # Byte offset after each semicolon outside quotes and comments.
+    # Chunks without quotes are scanned with numpy, tracking the depth
+    # of nested comments with a cumulative sum.
+    pos = 0
+    depth = 0
+    quote = None
+    while True:
+        chunk = inf.read(chunk_size)
+        if not chunk:
+            break
+        if quote is None and b"'" not in chunk and b'"' not in chunk:
+            arr = np.frombuffer(chunk, dtype=np.uint8)
+            level = np.cumsum((arr == ord('[')).astype(np.int32) -
+                              (arr == ord(']')), dtype=np.int32) + depth
+            yield from pos + 1 + np.flatnonzero((arr == ord(';')) &
+                                                (level == 0))
+            depth = int(level[-1])
+        else:
+            for match in _SPECIAL.finditer(chunk):
+                char = match.group()
+                if quote is not None:
+                    if char == quote:
+                        quote = None
+                elif char == b'[':
+                    depth += 1
+                elif char == b']':
+                    depth -= 1
+                elif depth == 0:
+                    if char == b';':
+                        yield pos + match.end()
+                    else:
+                        quote = char
+        pos += len(chunk)
+
+
+class TreeFile(object):
+    '''
+    Random access to the trees in a large Newick or Nexus file, such as
+    the posterior sample from BEAST or MrBayes.
+
+    The file is scanned once to find where each tree starts and ends,
+    and the offsets are saved next to the file, so later uses only read
+    the index. Reading a tree then only reads and parses that tree. The
+    translate table of a Nexus file is read the first time a tree is
+    read and applied to the names of each tree as it is read.
+
+    Parameters
+    ----------
+    path : str
+        Path to a file containing one or more Newick trees, each ending
+        with a semicolon, or a Nexus file with a trees block.
+    index_path : str or bool
+        Path to save the index to, by default the path of the tree file
+        with ".idx" added. The saved index is only used if the tree file
+        has not changed since it was written. If False, the index is not
+        saved.
+    chunk_size : int
+        Number of bytes to read at once while building the index.
+
+    Attributes
+    ----------
+    starts : numpy.ndarray
+        Byte offset of the start of each tree statement.
+    ends : numpy.ndarray
+        Byte offset of the end of each tree statement.
+    nexus : bool
+        True if the file is in Nexus format.
+    '''
+    def __init__(self, path, index_path=None, chunk_size=1 << 22):
+        self.path = path
+        if index_path is None:
+            index_path = path + ".idx"
+        self.index_path = index_path
+        self._translate = None
+        if is_compressed(path):
+            raise RuntimeError("%s is compressed, so trees cannot be read "
+                               "from it at random, use iter_newick to "
+                               "read the trees in order" % path)
+        stat = os.stat(path)
+        self._stamp = np.array([stat.st_size, stat.st_mtime_ns],
+                               dtype=np.int64)
+        if not (index_path and self._load_index()):
+            self._build_index(chunk_size)
+            if index_path:
+                with open(index_path, 'wb') as out:
+                    np.savez(out, starts=self.starts, ends=self.ends,
+                             translate=self._translate_span,
+                             nexus=np.array([self.nexus]),
+                             stamp=self._stamp)
+
+    def _load_index(self):
+        try:
+            with np.load(self.index_path) as index:
+                if not np.array_equal(index['stamp'], self._stamp):
+                    return False
+                self.starts = index['starts']
+                self.ends = index['ends']
+                self._translate_span = index['translate']
+                self.nexus = bool(index['nexus'][0])
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def _build_index(self, chunk_size):
+        with open(self.path, 'rb') as inf:
+            self.nexus = inf.read(64).lstrip().lower().startswith(b'#nexus')
+            inf.seek(0)
+            ends = np.fromiter(_statement_ends(inf, chunk_size),
+                               dtype=np.int64)
+            starts = np.concatenate([[0], ends[:-1]]).astype(np.int64)
+            inf.seek(ends[-1] if len(ends) else 0)
+            if not self.nexus and inf.read(256).strip():
+                raise RuntimeError("Error in parsing Newick format: the "
+                                   "last tree in %s does not end with a "
+                                   "semicolon" % self.path)
+            # Only the start of each statement is needed to know what it
+            # is
+            keep = np.zeros(len(starts), dtype=bool)
+            self._translate_span = np.array([-1, -1], dtype=np.int64)
+            for i, (start, end) in enumerate(zip(starts, ends)):
+                inf.seek(start)
+                head = inf.read(min(end - start, 256))
+                if self.nexus:
+                    match = _KEYWORD.match(head)
+                    word = match.group(1).lower() if match else b''
+                    keep[i] = word == b'tree'
+                    if word == b'translate':
+                        self._translate_span[:] = (start, end)
+                else:
+                    keep[i] = end - start > 256 or head.strip() != b';'
+        self.starts = starts[keep]
+        self.ends = ends[keep]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _read(self, start, end):
+        with open(self.path, 'rb') as inf:
+            inf.seek(start)
+            return inf.read(end - start).decode()
+
+    @property
+    def translate(self):
+        '''
+        Dictionary of the translate table of a Nexus file, with the
+        labels used in the trees as keys and the names of the tips as
+        values. Empty if there is no translate table.
+        '''
+        if self._translate is None:
+            table = dict()
+            start, end = self._translate_span
+            if start >= 0:
+                text = self._read(start, end)
+                body = text[text.lower().find('translate') + 9:]
+                for key, nam in _TRANSLATE.findall(body):
+                    if nam.startswith("'"):
+                        nam = nam[1:-1].replace("''", "'")
+                    table[key] = nam
+            self._translate = table
+        return self._translate
+
+    def newick(self, i):
+        '''
+        Reads the Newick string of one tree, without applying the
+        translate table.
+
+        Parameters
+        ----------
+        i : int
+            Position of the tree in the file, negative values count from
+            the end.
+
+        Returns
+        -------
+        newick : str
+            The tree in Newick format, including the final semicolon.
+        '''
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Tree %i not found, %s contains %i trees" %
+                             (i, self.path, len(self)))
+        text = self._read(self.starts[i], self.ends[i])
+        if self.nexus:
+            match = _TREE_STATEMENT.match(text)
+            if match is None:
+                raise RuntimeError("Error in parsing Nexus format: "
+                                   "invalid tree statement")
+            text = text[match.end():]
+        return text.strip()
+
+    def __getitem__(self, i):
+        '''
+        Reads one tree, applying the translate table if there is one.
+
+        Parameters
+        ----------
+        i : int
+            Position of the tree in the file, negative values count from
+            the end.
+
+        Returns
+        -------
+        ct : CompactTree
+            The tree, which can be passed straight to plot_phylo.
+        '''
+        ct = read_tree(self.newick(i))
+        table = self.translate
+        if table:
+            # The tree has only just been created, so nothing is cached
+            # which depends on the names
+            ct.names = np.array([table.get(nam, nam) for nam in ct.names],
+                                dtype=object)
+        return ct
@@ -25,7 +25,7 @@ setuptools.setup(
      url="https://github.com/KatyBrown/plot_phylo",
      packages=setuptools.find_packages(),
      package_dir={'plot_phylo': 'plot_phylo'},
-     install_requires=['matplotlib', 'ete3'],
+     install_requires=['matplotlib>=3.6', 'ete3', 'numpy'],
      scripts=['plot_phylo/plot_phylo.py'],
      classifiers=[
          "Programming Language :: Python :: 3",
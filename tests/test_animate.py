@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import matplotlib.pyplot as plt
+import matplotlib
+import plot_phylo
+import pytest
+import numpy as np
+matplotlib.use('Agg')
+
+trees = ["((A:1,B:2):1,(C:1,D:1):2);",
+         "((A:2,C:2):1,(B:1,D:1):1);",
+         "(A:1,(B:1,D:3):1);"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_iter_newick(tmp_path, chunk_size):
+    path = tmp_path / "trees.nw"
+    path.write_text("(A,B);\n('x;y':1,[a;b]C);\n\n(D,E);")
+    assert list(plot_phylo.iter_newick(str(path), chunk_size)) == [
+        "(A,B);", "('x;y':1,[a;b]C);", "(D,E);"]
+    path.write_text("(A,B);\n(C,D)\n")
+    with pytest.raises(RuntimeError, match="does not end with a semicolon"):
+        list(plot_phylo.iter_newick(str(path), chunk_size))
+
+
+def test_tree_animation():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    anim = plot_phylo.TreeAnimation(a, ['A', 'B', 'C', 'D'], height=3,
+                                    marker_size=4)
+    branches = anim.branches
+    artists = anim.update(trees[0])
+    assert artists[0] is branches
+    assert len(branches.get_segments()) == 7 + 3
+    assert [t.get_position()[1] for t in anim.texts] == [3, 2, 1, 0]
+    # Tips stay as close to tip_order as the topology allows
+    anim.update(trees[1])
+    assert anim.branches is branches
+    assert [t.get_position()[1] for t in anim.texts] == [3, 1, 2, 0]
+    # Missing tips are hidden
+    anim.update(trees[2])
+    assert [t.get_visible() for t in anim.texts] == [True, True, False,
+                                                     True]
+    assert np.ma.getmaskarray(anim.markers.get_offsets())[2].all()
+    with pytest.raises(RuntimeError, match="Tips not found"):
+        anim.update("(A,E);")
+    plt.close(f)
+
+
+def test_animate_trees(tmp_path):
+    path = tmp_path / "trees.nw"
+    path.write_text("\n".join(trees))
+    f = plt.figure()
+    a = f.add_subplot(111)
+    anim = plot_phylo.animate_trees(f, a, str(path), max_depth=8)
+    anim.save(str(tmp_path / "trees.gif"), writer='pillow')
+    tree_anim = anim.tree_animation
+    assert tree_anim.tip_order == ['A', 'B', 'C', 'D']
+    # The last frame is drawn on the shared scale
+    assert np.isclose(tree_anim.layout.x.max(), 10 * 4 / 8)
+    plt.close(f)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import matplotlib.pyplot as plt
+import matplotlib
+import plot_phylo
+import pytest
+import numpy as np
+matplotlib.use('Agg')
+
+
+def test_clade_nodes():
+    ct = plot_phylo.read_tree("((A:1,B:2)AB:1,((C:1,D:1)CD:2,E:1)F:1)R;")
+    nodes = plot_phylo.clade_nodes(ct, [['A', 'B'], ['C', 'E'], 'CD', ['D']])
+    assert list(ct.names[nodes]) == ['AB', 'F', 'CD', 'D']
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_draw_highlights(reverse):
+    ct = plot_phylo.read_tree("((A:1,B:2)AB:1,((C:1,D:1)CD:2,E:1)F:1)R;")
+    layout = plot_phylo.layout_tree(ct, ypos=0, height=4, width=4,
+                                    depth=plot_phylo.tree_depth(ct),
+                                    reverse=reverse)
+    f = plt.figure()
+    a = f.add_subplot(111)
+    texts = [a.text(layout.text_x[i], layout.y[tip], "  %s  " % nam,
+                    ha=layout.ha, va='center')
+             for i, (tip, nam) in enumerate(zip(layout.tips,
+                                                ct.get_leaf_names()))]
+    patches, brackets, labels = plot_phylo.draw_highlights(
+        a, layout, {'AB': ['A', 'B'], 'CD': 'CD'},
+        cols={'CD': 'red'}, texts=texts)
+    boxes = [p.get_extents() for p in patches.get_paths()]
+    # Tips are one unit apart, the boxes reach halfway to the next tip
+    assert np.allclose([boxes[0].y0, boxes[0].y1], [2.5, 4.5])
+    assert np.allclose([boxes[1].y0, boxes[1].y1], [0.5, 2.5])
+    # From the middle of the branch leading to CD to the tips of CD
+    mid = (layout.x[5] + layout.xstart[5]) / 2
+    assert np.allclose(sorted([boxes[1].x0, boxes[1].x1]),
+                       sorted([mid, layout.x[6]]))
+    assert len(patches.get_facecolors()) == 2
+    assert len(brackets.get_segments()) == 2
+    assert [t.get_text().strip() for t in labels] == ['AB', 'CD']
+    plt.close(f)
+
+
+def test_pie_vertices():
+    vertices, pies, categories = plot_phylo.pie_vertices(
+        [[1, 1, 0], [0, 0, 2]], resolution=8, start=0)
+    assert list(pies) == [0, 0, 1]
+    assert list(categories) == [0, 1, 2]
+    # Centre then the arc, one point per eighth of a circle
+    assert len(vertices[0]) == 6
+    assert np.allclose(vertices[0][0], [0, 0])
+    assert np.allclose(vertices[0][1], [0.5, 0])
+    assert np.allclose(vertices[0][-1], [-0.5, 0])
+    assert np.allclose(vertices[1][1], [-0.5, 0])
+    # A whole pie is a closed circle
+    assert np.allclose(vertices[2][1], vertices[2][-1])
+    assert np.allclose(np.hypot(*vertices[2][1:].T), 0.5)
+
+
+def test_draw_node_pies():
+    ct = plot_phylo.read_tree("((A:1,B:2)AB:1,((C:1,D:1)CD:2,E:1)F:1)R;")
+    layout = plot_phylo.layout_tree(ct, ypos=0, height=4, width=4,
+                                    depth=plot_phylo.tree_depth(ct))
+    f = plt.figure()
+    a = f.add_subplot(111)
+    fractions = np.full((ct.n_nodes, 2), np.nan)
+    fractions[~ct.is_leaf] = [[1, 0], [1, 3], [0, 0], [2, 2]]
+    pies = plot_phylo.draw_node_pies(a, layout, fractions,
+                                     cols=['red', 'blue'], sizes=50)
+    # One collection, with one wedge per category present, and nodes
+    # without fractions skipped
+    assert len(pies.get_paths()) == 5
+    internal = np.flatnonzero(~ct.is_leaf)
+    nodes = internal[[0, 1, 1, 3, 3]]
+    assert np.allclose(pies.get_offsets(),
+                       np.column_stack([layout.x[nodes], layout.y[nodes]]))
+    assert np.allclose(pies.get_facecolors()[:, 2], [0, 0, 1, 0, 1])
+    assert np.allclose(pies.get_sizes(), 50)
+    pies = plot_phylo.draw_node_pies(a, layout, {'CD': [1, 1, 2]})
+    assert np.allclose(pies.get_offsets(), [(layout.x[5], layout.y[5])] * 3)
+    plt.close(f)
+
+
+def test_draw_node_markers():
+    ct = plot_phylo.read_tree("((A:1,B:2)AB:1,((C:1,D:1)CD:2,E:1)F:1)R;")
+    layout = plot_phylo.layout_tree(ct, ypos=0, height=4, width=4,
+                                    depth=plot_phylo.tree_depth(ct))
+    f = plt.figure()
+    a = f.add_subplot(111)
+    sizes = np.arange(ct.n_nodes, dtype=float)
+    markers = plot_phylo.draw_node_markers(a, layout, sizes=sizes,
+                                           cols={'CD': 'red'})
+    # Internal nodes with a size above zero
+    assert np.allclose(markers.get_sizes(), [1, 4, 5])
+    assert np.allclose(markers.get_facecolors()[:, 3], [0, 0, 1])
+    markers = plot_phylo.draw_node_markers(a, layout, nodes=ct.leaves)
+    assert np.allclose(markers.get_offsets()[:, 0], layout.x[ct.leaves])
+    with pytest.raises(RuntimeError):
+        plot_phylo.draw_node_markers(a, layout, sizes=[1, 2])
+    plt.close(f)
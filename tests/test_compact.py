@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+import matplotlib.pyplot as plt
+import matplotlib
+import plot_phylo
+import pytest
+import ete3
+import numpy as np
+matplotlib.use('Agg')
+
+
+def read_tree(tree):
+    try:
+        return ete3.Tree(tree)
+    except ete3.parser.newick.NewickError:
+        return ete3.Tree(tree, format=1)
+
+
+def same_nodes(ct, node_iter):
+    nodes = list(node_iter)
+    return (list(ct.names) == [n.name for n in nodes] and
+            np.allclose(ct.dist, [n.dist for n in nodes]) and
+            np.allclose(ct.support, [n.support for n in nodes]))
+
+
+@pytest.mark.parametrize("tree", ["examples/primates.nw",
+                                  "examples/basic_tree.nw",
+                                  "examples/big_tree.nw"])
+def test_from_ete3(tree):
+    T = read_tree(tree)
+    ct = plot_phylo.CompactTree.from_ete3(T)
+    assert same_nodes(ct, T.traverse("preorder"))
+    assert ct.get_leaf_names() == T.get_leaf_names()
+    assert np.all(ct.parent[1:] < np.arange(1, ct.n_nodes))
+
+
+@pytest.mark.parametrize("tree", ["examples/primates.nw",
+                                  "examples/basic_tree.nw",
+                                  "examples/big_tree.nw"])
+def test_tree_depth(tree):
+    T = read_tree(tree)
+    ct = plot_phylo.CompactTree.from_ete3(T)
+    expected = (T.get_farthest_leaf(topology_only=True)[1],
+                T.get_farthest_leaf(topology_only=False)[1],
+                len(T))
+    assert np.allclose(plot_phylo.tree_depth(ct), expected)
+
+
+@pytest.mark.parametrize("outgroup", ["Homo sapiens",
+                                      "Lemur catta",
+                                      "Colobus angolensis",
+                                      "Galago moholi"])
+def test_reroot_matches_ete3(outgroup):
+    T = read_tree("examples/primates.nw")
+    ct = plot_phylo.reroot(plot_phylo.CompactTree.from_ete3(T), outgroup)
+    T.set_outgroup(outgroup)
+    assert same_nodes(ct, T.traverse("preorder"))
+
+
+def test_reroot_internal_node():
+    T = read_tree("examples/primates.nw")
+    ct = plot_phylo.CompactTree.from_ete3(T)
+    group = ['Homo sapiens', 'Pan troglodytes', 'Gorilla gorilla']
+    ct = plot_phylo.reroot(ct, group)
+    T.set_outgroup(T.get_common_ancestor(group))
+    assert same_nodes(ct, T.traverse("preorder"))
+    assert set(ct.names[ct.leaves][:3]) == set(group)
+
+
+def test_reroot_group_spanning_root():
+    ct = plot_phylo.CompactTree.from_ete3(
+        read_tree("((A:0.1,B:0.2)0.5,C:0.3,(D:1,E:2)0.3)0.95:0.1;"))
+    ct = plot_phylo.reroot(ct, ['A', 'B', 'C'])
+    first = ct.children(0)[0]
+    tips = ct.names[ct.leaves][:plot_phylo.subtree_sizes(ct)[first]]
+    assert set(tips) == {'A', 'B', 'C'}
+
+
+def test_reroot_midpoint():
+    T = read_tree("examples/primates.nw")
+    ct = plot_phylo.reroot(plot_phylo.CompactTree.from_ete3(T), 'midpoint')
+    depths = plot_phylo.node_depths(ct)
+    sizes = plot_phylo.subtree_sizes(ct)
+    c1, c2 = ct.children(0)
+    left = depths[ct.leaves[:sizes[c1]]].max()
+    right = depths[ct.leaves[sizes[c1]:]].max()
+    assert np.isclose(left, right)
+
+
+def test_reroot_unknown():
+    ct = plot_phylo.CompactTree.from_ete3(read_tree("examples/primates.nw"))
+    with pytest.raises(RuntimeError, match="not found in tree: Homo"):
+        plot_phylo.reroot(ct, ['Homo', 'Pan troglodytes'])
+
+
+def test_reroot_unary_root():
+    # The only child of the root holds every leaf
+    ct = plot_phylo.read_tree("((A:1,B:1)X:1);")
+    with pytest.raises(RuntimeError, match="every leaf"):
+        plot_phylo.reroot(ct, ['A', 'B'])
+
+
+@pytest.mark.parametrize("branch_lengths, reverse, align_tips",
+                         [[True, False, False],
+                          [False, False, False],
+                          [True, True, False],
+                          [False, True, True]])
+def test_layout_matches_draw_tree(branch_lengths, reverse, align_tips):
+    T = read_tree("examples/primates.nw")
+    ct = plot_phylo.CompactTree.from_ete3(T)
+    depth = plot_phylo.tree_depth(ct)
+    appearance = {'font_size': 10, 'line_col': 'black', 'line_width': 1,
+                  'col_dict': {n: 'black' for n in T.get_leaf_names()},
+                  'label_dict': {n: n for n in T.get_leaf_names()},
+                  'show_support': False, 'bold': []}
+    f = plt.figure()
+    a = f.add_subplot(111)
+    xpos = 2 if not reverse else -2
+    _, _, ps = plot_phylo.draw_tree(T, a, x=xpos, y=-12, x0=xpos, ps=[],
+                                    height=10, width=8, depth=depth,
+                                    align_tips=align_tips,
+                                    branch_lengths=branch_lengths,
+                                    reverse=reverse, appearance=appearance)
+    layout = plot_phylo.layout_tree(ct, xpos=2, ypos=2, height=10, width=8,
+                                    depth=depth, align_tips=align_tips,
+                                    branch_lengths=branch_lengths,
+                                    reverse=reverse)
+    plt.close()
+    expected = np.array([p[1].get_position() for p in ps])
+    assert np.allclose(layout.text_x, expected[:, 0])
+    assert np.allclose(layout.y[layout.tips], expected[:, 1])
+
+
+@pytest.mark.parametrize("order, direction", [["up", 1], ["down", 0]])
+def test_order_tree_ladderize(order, direction):
+    T = read_tree("examples/big_tree.nw")
+    ct = plot_phylo.CompactTree.from_ete3(T)
+    ordered = plot_phylo.order_tree(ct, order)
+    # The original tree is not changed
+    assert ct.get_leaf_names() == T.get_leaf_names()
+    sizes = plot_phylo.subtree_sizes(ordered)
+    for i in np.flatnonzero(~ordered.is_leaf):
+        csizes = sizes[ordered.children(i)]
+        if direction:
+            assert np.all(np.diff(csizes) <= 0)
+        else:
+            assert np.all(np.diff(csizes) >= 0)
+
+
+def test_order_tree_key():
+    ct = plot_phylo.CompactTree.from_ete3(
+        read_tree("((A:0.1,B:0.2)0.5,C:0.3,(D:1,E:2)0.3)0.95:0.1;"))
+    ordered = plot_phylo.order_tree(ct, {'E': 1, 'C': 2, 'B': 3})
+    assert ordered.get_leaf_names() == ['E', 'D', 'C', 'B', 'A']
+    with pytest.raises(RuntimeError, match="order must be"):
+        plot_phylo.order_tree(ct, 'sideways')
+
+
+@pytest.mark.parametrize("context", [0, 1, 10])
+def test_extract_clade(context):
+    tree = read_tree("examples/primates.nw")
+    ct = plot_phylo.CompactTree.from_ete3(tree)
+    sub = plot_phylo.extract_clade(ct, ['Homo sapiens', 'Gorilla gorilla'],
+                                   context=context)
+    node = tree.get_common_ancestor('Homo sapiens', 'Gorilla gorilla')
+    for i in range(context):
+        if not node.is_root():
+            node = node.up
+    assert sub.get_leaf_names() == node.get_leaf_names()
+    nodes = list(node.traverse("preorder"))
+    assert list(sub.names) == [n.name for n in nodes]
+    assert sub.dist[0] == 0
+    assert np.allclose(sub.dist[1:], [n.dist for n in nodes[1:]])
+
+
+def test_extract_clade_by_name():
+    ct = plot_phylo.read_tree("((A:1,B:2)AB:1,(C:1,D:1)CD:2)R;")
+    sub = plot_phylo.extract_clade(ct, 'CD')
+    assert sub.get_leaf_names() == ['C', 'D']
+    assert plot_phylo.tree_depth(sub) == (0, 1, 2)
+    with pytest.raises(RuntimeError, match="not found in tree: EF"):
+        plot_phylo.extract_clade(ct, 'EF')
+
+
+def test_lca_index():
+    tree = read_tree("examples/big_tree.nw")
+    ct = plot_phylo.CompactTree.from_ete3(tree)
+    nodes = list(tree.traverse("preorder"))
+    index = plot_phylo.lca_index(ct)
+    rng = np.random.default_rng(1)
+    a = rng.integers(0, ct.n_nodes, 200)
+    b = rng.integers(0, ct.n_nodes, 200)
+    for i, j, k in zip(a, b, index.query(a, b)):
+        if i == j:
+            assert k == i
+        else:
+            assert nodes[k] is tree.get_common_ancestor(nodes[i], nodes[j])
+    tips = ct.leaves[[3, 10, 40]]
+    assert index.mrca(tips) == plot_phylo.get_mrca(ct, tips)
+
+
+def test_join_trees():
+    cts = [plot_phylo.read_tree("((A:1,B:2)AB:1,C:1)R;"),
+           plot_phylo.read_tree("(D:1,E:1)S;")]
+    forest = plot_phylo.join_trees(cts)
+    assert list(forest.names) == ['', 'R', 'AB', 'A', 'B', 'C', 'S', 'D',
+                                  'E']
+    assert list(forest.parent) == [-1, 0, 1, 2, 2, 1, 0, 6, 6]
+    assert list(forest.children(0)) == [1, 6]
+    assert forest.dist[[1, 6]].tolist() == [0, 0]
+    assert np.allclose(plot_phylo.node_depths(forest)[forest.leaves],
+                       [2, 3, 1, 1, 1])
+
+
+def test_unrooted_layout():
+    ct = plot_phylo.read_tree("((A:1,B:1):1,(C:1,D:1):1,E:2);")
+    layout = plot_phylo.unrooted_layout(ct, width=8, height=8,
+                                        branch_lengths=False)
+    # Five tips each get a fifth of the circle, the clade of A and B
+    # points to the middle of its two fifths
+    assert np.allclose(layout.angle[layout.tips],
+                       (np.arange(5) + 0.5) * 2 * np.pi / 5)
+    assert np.isclose(layout.angle[1], 2 * np.pi / 5)
+    # Every branch has the same length and the tree fits the area
+    segments = plot_phylo.unrooted_segments(layout)
+    lengths = np.hypot(*(segments[:, 1] - segments[:, 0]).T)
+    assert np.allclose(lengths[1:], layout.scale)
+    assert np.isclose(lengths[0], 0)
+    assert layout.x.min() >= 0 and layout.x.max() <= 8
+    assert np.isclose(max(np.ptp(layout.x), np.ptp(layout.y)), 8)
+    # Labels on the left are flipped to read left to right
+    assert list(layout.ha) == ['left', 'right', 'right', 'right', 'left']
+    assert np.all(np.abs(layout.rotation) <= 90)
+
+
+@pytest.mark.parametrize("tree", ["examples/primates.nw",
+                                  "examples/basic_tree.nw",
+                                  "examples/big_tree.nw"])
+def test_parse_newick(tree):
+    T = read_tree(tree)
+    with open(tree) as inf:
+        ct = plot_phylo.parse_newick(inf.read())
+    assert same_nodes(ct, T.traverse("preorder"))
+    assert ct.attrs == {}
+
+
+def test_parse_newick_attrs():
+    ct = plot_phylo.parse_newick(
+        "((A:1[&&NHX:host=bat:rate=0.5],B:2[&&NHX:host=pig])90:1,"
+        "(C:1[&host=\"cow\",rate=2,pos={1,2}],D:1)CD:0.5);")
+    assert list(ct.names) == ['', '', 'A', 'B', 'CD', 'C', 'D']
+    assert ct.support[1] == 90
+    assert list(ct.attrs['host']) == [None, None, 'bat', 'pig', None,
+                                      'cow', None]
+    # Numeric attributes are floats with NaN where missing
+    assert ct.attrs['rate'].dtype == float
+    assert np.allclose(ct.attrs['rate'][[2, 5]], [0.5, 2])
+    assert np.isnan(ct.attrs['rate'][[0, 3, 6]]).all()
+    assert ct.attrs['pos'][5] == '{1,2}'
+    # Attributes follow their nodes when the tree is reordered
+    ordered = plot_phylo.order_tree(ct, {'D': 0, 'C': 1, 'B': 2, 'A': 3})
+    assert list(ordered.names[ordered.leaves]) == ['D', 'C', 'B', 'A']
+    assert list(ordered.attrs['host'][ordered.leaves]) == [None, 'cow',
+                                                           'pig', 'bat']
+    clade = plot_phylo.extract_clade(ct, 'CD')
+    assert list(clade.attrs['host']) == [None, 'cow', None]
+    rerooted = plot_phylo.reroot(ct, 'A')
+    hosts = dict(zip(rerooted.names, rerooted.attrs['host']))
+    assert hosts['A'] == 'bat' and hosts['C'] == 'cow'
+
+
+def test_parse_newick_branch_annotations():
+    # BEAST2 writes branch annotations between the colon and the length
+    ct = plot_phylo.parse_newick(
+        "(A:[&rate=0.5]1.0,B:[&rate=2]0.2)[&rate=1];")
+    assert list(ct.names) == ['', 'A', 'B']
+    assert np.allclose(ct.dist[1:], [1.0, 0.2])
+    assert np.allclose(ct.attrs['rate'], [1, 0.5, 2])
+
+
+def test_parse_newick_errors():
+    for bad in ["((A,B);", "(A,B));", "(A:x,B);"]:
+        with pytest.raises(RuntimeError):
+            plot_phylo.parse_newick(bad)
+
+
+def test_from_linkage():
+    # ((0,3),(1,2)) with (1,2) joined first, as from scipy's linkage
+    Z = np.array([[1, 2, 0.5, 2],
+                  [0, 3, 1.0, 2],
+                  [5, 4, 2.0, 4]])
+    ct = plot_phylo.CompactTree.from_linkage(Z, ['A', 'B', 'C', 'D'])
+    T = plot_phylo.read_tree("((A:1,D:1):1,(B:0.5,C:0.5):1.5);")
+    assert list(ct.names) == list(T.names)
+    assert np.array_equal(ct.parent, T.parent)
+    assert np.allclose(ct.dist, T.dist)
+    assert list(plot_phylo.read_tree(Z).names[[2, 3]]) == ['0', '3']
+    with pytest.raises(RuntimeError, match="names"):
+        plot_phylo.CompactTree.from_linkage(Z, ['A', 'B'])
+    Z[2, 0] = 4
+    with pytest.raises(RuntimeError, match="Invalid linkage"):
+        plot_phylo.CompactTree.from_linkage(Z)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+import plot_phylo
+import pytest
+import ete3
+import numpy as np
+
+
+@pytest.mark.parametrize("unrooted", [False, True])
+@pytest.mark.parametrize("trees", [
+    ("(((A,B),C),((D,E),F));", "(((A,C),B),((D,E),F));"),
+    ("((A,B),(C,(D,E)));", "(A,(B,(C,(D,E))));"),
+    ("(((A,B),C),(D,X));", "((A,(B,C)),(D,Y));"),
+    ("examples/primates.nw", "examples/primates.nw")])
+def test_compare_trees(trees, unrooted):
+    comparison = plot_phylo.compare_trees(*trees, unrooted=unrooted)
+    T1, T2 = [ete3.Tree(t) for t in trees]
+    rf, max_rf = T1.robinson_foulds(T2, unrooted_trees=unrooted)[:2]
+    assert (comparison.rf, comparison.max_rf) == (rf, max_rf)
+
+
+def test_missing_splits():
+    comparison = plot_phylo.compare_trees("(((A,B),C),(D,E));",
+                                          "(((A,C),B),(D,E));")
+    ct1 = comparison.tree1
+    assert list(ct1.names[comparison.missing1]) == ['']
+    assert list(np.flatnonzero(comparison.missing1)) == [2]
+    assert list(np.flatnonzero(comparison.missing2)) == [2]
+    # Tips and the root are never informative
+    assert not comparison.informative1[ct1.leaves].any()
+    assert not comparison.informative1[0]
+    # The split below the root is the same on either side when unrooted
+    hashes, counts = plot_phylo.split_hashes(
+        ct1, np.array([1, 2, 4, 8, 16], dtype=np.uint64), unrooted=True)
+    assert hashes[1] == hashes[6] == 24
+    assert list(counts) == [5, 3, 2, 1, 1, 1, 2, 1, 1]
+    with pytest.raises(RuntimeError, match="duplicated"):
+        plot_phylo.compare_trees("((A,A),B);", "((A,B),C);")
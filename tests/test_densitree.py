@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import matplotlib.pyplot as plt
+import matplotlib
+import plot_phylo
+import pytest
+import numpy as np
+matplotlib.use('Agg')
+
+trees = ["((A:1,B:1):1,(C:1,D:1):1);",
+         "((A:1,C:1):1,(B:1,D:1):1);",
+         "((A:1,B:1):1,(C:1,D:1):2);"]
+
+
+def test_consensus_order():
+    cts = [plot_phylo.read_tree(t) for t in trees]
+    assert plot_phylo.consensus_order(cts) == ['A', 'B', 'C', 'D']
+    with pytest.raises(RuntimeError, match="same tips"):
+        plot_phylo.consensus_order(cts + [plot_phylo.read_tree("(A,B);")])
+    with pytest.raises(RuntimeError, match="same tips"):
+        plot_phylo.consensus_order(
+            cts + [plot_phylo.read_tree("((A,B),(C,C));")])
+
+
+def test_densitree_segments():
+    cts = [plot_phylo.read_tree(t) for t in trees]
+    segments = plot_phylo.densitree_segments(cts, ['A', 'B', 'C', 'D'],
+                                             height=3, width=3)
+    # Seven branches and three vertical lines per tree
+    assert segments.shape == (30, 2, 2)
+    # Tips are at fixed heights, even when the topology moves them
+    assert np.allclose(segments[[12, 13, 15, 16], 0, 1], [3, 1, 2, 0])
+    # The deepest tree sets the scale and the tips are lined up
+    assert np.allclose(segments[:, :, 0].max(), 3)
+    assert np.allclose(segments[[0, 10, 20, 29], 0, 0], [1, 1, 0, 2])
+    segments = plot_phylo.densitree_segments(cts, ['A', 'B', 'C', 'D'],
+                                             width=3, align_tips=False)
+    assert np.allclose(segments[::10, 0, 0], 0)
+
+
+def test_density_raster():
+    segments = np.array([[[0, 0], [4, 0]], [[0, 0], [2, 0]],
+                         [[1, 0], [1, 2]]], dtype=float)
+    counts = plot_phylo.density_raster(segments, (-0.5, 4.5, -0.5, 2.5),
+                                       (3, 5))
+    assert counts.tolist() == [[2, 3, 2, 1, 1],
+                               [0, 1, 0, 0, 0],
+                               [0, 1, 0, 0, 0]]
+
+
+@pytest.mark.parametrize("raster", [False, True])
+def test_plot_densitree(raster):
+    f = plt.figure()
+    a = f.add_subplot(111)
+    branches, texts = plot_phylo.plot_densitree(trees, a, raster=raster,
+                                                raster_size=(50, 50),
+                                                col_dict={'A': 'red'})
+    assert [t.get_text() for t in texts] == ["  A  ", "  B  ", "  C  ",
+                                             "  D  "]
+    assert texts[0].get_color() == 'red'
+    if raster:
+        assert branches.get_array().shape == (50, 50, 4)
+    else:
+        assert len(branches.get_segments()) == 30
+    assert a.get_xlim()[1] >= 10 and a.get_ylim()[1] >= 10
+    plt.close(f)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import matplotlib.pyplot as plt
+import matplotlib
+import plot_phylo
+import pytest
+import json
+import numpy as np
+matplotlib.use('Agg')
+
+tree = "((A:1[&&NHX:host=bat],B:1)0.9:1,C:2[&&NHX:rate=2]);"
+
+
+@pytest.mark.parametrize("fmt", ["json", "columns"])
+def test_export_layout(tmp_path, fmt):
+    f = plt.figure()
+    a = f.add_subplot(111)
+    result = plot_phylo.plot_phylo(tree, a, label_dict={'C': 'sea'})
+    path = str(tmp_path / ("layout.%s" % fmt))
+    plot_phylo.export_layout(result, path, chunk_size=2)
+    tables = plot_phylo.read_layout(path)
+    nodes = tables['nodes']
+    assert list(nodes['parent']) == [-1, 0, 1, 1, 0]
+    assert np.allclose(nodes['x'], result.layout.x)
+    assert np.allclose(nodes['support'][1], 0.9)
+    assert list(nodes['tip'].astype(bool)) == [False, False, True, True,
+                                               True]
+    assert list(nodes['name']) == ['', '', 'A', 'B', 'C']
+    assert list(nodes['attrs.host']) == [None, None, 'bat', None, None]
+    assert list(tables['tips']['label']) == ['A', 'B', 'sea']
+    assert list(tables['tips']['node']) == list(result.nodes)
+    segments = tables['segments']
+    assert list(segments['node']) == [0, 1, 2, 3, 4, 0, 1]
+    assert np.allclose(np.stack([segments['x0'], segments['y0']], 1),
+                       result.segments[:, 0])
+    # The estimated boxes are close to the measured ones
+    boxes = np.column_stack([tables['tips'][col] for col in
+                             ('xmin', 'ymin', 'xmax', 'ymax')])
+    assert np.allclose(boxes, result.boxes, atol=0.5)
+    plt.close(f)
+
+
+def test_export_json_format(tmp_path):
+    ct = plot_phylo.read_tree("((A:1,B:1):1,C:2);")
+    layout = plot_phylo.unrooted_layout(ct)
+    path = str(tmp_path / "layout.json")
+    plot_phylo.export_layout(layout, path, decimals=2)
+    with open(path) as inf:
+        data = json.load(inf)
+    assert (data['n_nodes'], data['n_tips'], data['n_segments']) == (5, 3,
+                                                                     5)
+    assert data['tips']['label'] == ['A', 'B', 'C']
+    assert all(round(x, 2) == x for x in data['nodes']['x'])
+    with pytest.raises(RuntimeError):
+        plot_phylo.export_layout(layout, path, format='csv')
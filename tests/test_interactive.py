@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import matplotlib.pyplot as plt
+import matplotlib
+import plot_phylo
+import numpy as np
+from matplotlib.backend_bases import MouseEvent
+matplotlib.use('Agg')
+
+
+def test_sorted_index():
+    index = plot_phylo.SortedIndex([0, 1, 2, 3], [3, 0, 2, 1])
+    points, x, y = index.band(1.5, 0.6)
+    assert list(points) == [3, 2]
+    assert index.nearest(1.2, 0.1, 1, 1, 0.5) == 1
+    assert index.nearest(1.2, 0.1, 10, 10, 0.5) is None
+
+
+def test_tree_inspector():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    result = plot_phylo.plot_phylo("((A:1,B:1)0.9:1,C:2);", a)
+    clicked = []
+    inspector = plot_phylo.TreeInspector(result, on_click=clicked.append)
+    f.canvas.draw()
+    layout = result.layout
+    assert inspector.nearest(layout.x[1], layout.y[1]) == 1
+    assert inspector.nearest(layout.x[1] + 0.01, layout.y[1] - 0.01) == 1
+    # Positions inside a tip label find the tip
+    tip = layout.tips[0]
+    assert inspector.nearest(layout.text_x[0] + 0.3, layout.y[tip]) == tip
+    assert inspector.nearest(2.5, 1.5) is None
+
+    x, y = a.transData.transform((layout.x[1], layout.y[1]))
+    MouseEvent('motion_notify_event', f.canvas, x, y)._process()
+    assert inspector.node == 1
+    assert inspector.tooltip.get_visible()
+    assert inspector.tooltip.get_text() == "node 1\nsupport: 0.9\nlength: 1"
+    MouseEvent('button_press_event', f.canvas, x, y, button=1)._process()
+    assert clicked[0]['node'] == 1 and not clicked[0]['tip']
+    assert np.isclose(clicked[0]['support'], 0.9)
+    MouseEvent('motion_notify_event', f.canvas, 0, 0)._process()
+    assert inspector.node is None
+    assert not inspector.tooltip.get_visible()
+    inspector.disconnect()
+    assert inspector.tooltip not in a.texts
+    plt.close(f)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import matplotlib.pyplot as plt
+import matplotlib
+import plot_phylo
+import pytest
+import numpy as np
+matplotlib.use('Agg')
+
+
+@pytest.mark.parametrize("data", [
+    {'B': [1, 2], 'A': [3, 4]},
+    (['B', 'A'], np.array([[1, 2], [3, 4]])),
+])
+def test_heatmap_matrix(data):
+    matrix, _ = plot_phylo.heatmap_matrix(data, ['A', 'C', 'B'])
+    assert np.array_equal(matrix[[0, 2]], [[3, 4], [1, 2]])
+    assert np.all(np.isnan(matrix[1]))
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_draw_heatmap(reverse):
+    ct = plot_phylo.read_tree("examples/primates.nw")
+    layout = plot_phylo.layout_tree(ct, ypos=0, height=10,
+                                    depth=plot_phylo.tree_depth(ct),
+                                    reverse=reverse)
+    names = ct.get_leaf_names()
+    values = np.arange(len(names) * 3).reshape(-1, 3)
+    f = plt.figure()
+    a = f.add_subplot(111)
+    image = plot_phylo.draw_heatmap(a, layout, (names[::-1], values[::-1]),
+                                    xpos=12, width=3)
+    plt.close()
+    # Rows are in tip order, from the top of the tree
+    assert np.array_equal(image.get_array(), values)
+    left, right, bottom, top = image.get_extent()
+    assert np.isclose(right - left, 3)
+    assert np.isclose(right if reverse else left, 12)
+    half = 10 / (len(names) - 1) / 2
+    assert np.isclose(bottom, -half) and np.isclose(top, 10 + half)
+
+
+def write_fasta(path, names, seqs):
+    with open(path, "w") as outfile:
+        for nam, seq in zip(names, seqs):
+            # Split sequences over two lines
+            outfile.write(">%s\n%s\n%s\n" % (nam, seq[:5], seq[5:]))
+
+
+def test_read_alignment(tmp_path):
+    fasta = str(tmp_path / "ali.fasta")
+    write_fasta(fasta, ['A', 'B'], ['ACGTacgt--', 'TTTTTTTTTT'])
+    names, matrix = plot_phylo.read_alignment(fasta)
+    assert names == ['A', 'B']
+    assert isinstance(matrix, np.memmap)
+    assert matrix.shape == (2, 10)
+    assert matrix[0].tobytes() == b'ACGTACGT--'
+    # The encoded matrix is reused
+    mtime = (tmp_path / "ali.fasta.npy").stat().st_mtime
+    plot_phylo.read_alignment(fasta)
+    assert (tmp_path / "ali.fasta.npy").stat().st_mtime == mtime
+
+
+def test_read_alignment_unequal(tmp_path):
+    fasta = str(tmp_path / "ali.fasta")
+    write_fasta(fasta, ['A', 'B'], ['ACGTACGT--', 'TTTTTT'])
+    with pytest.raises(RuntimeError, match="not the same length"):
+        plot_phylo.read_alignment(fasta)
+
+
+@pytest.mark.parametrize("max_pixels, shape", [[(100, 100), (16, 40)],
+                                               [(10, 4), (4, 10)]])
+def test_draw_alignment(max_pixels, shape):
+    ct = plot_phylo.read_tree("examples/primates.nw")
+    layout = plot_phylo.layout_tree(ct, depth=plot_phylo.tree_depth(ct),
+                                    align_tips=True)
+    names = ct.get_leaf_names()
+    matrix = np.full((len(names), 50), ord('A'), dtype=np.uint8)
+    matrix[names.index('Homo sapiens')] = ord('C')
+    f = plt.figure()
+    a = f.add_subplot(111)
+    image = plot_phylo.draw_alignment(a, layout, (names[::-1], matrix[::-1]),
+                                      xpos=12, width=5, columns=(10, 50),
+                                      max_pixels=max_pixels)
+    plt.close()
+    rgba = image.get_array()
+    assert rgba.shape[:2] == shape
+    lut = plot_phylo.alignment_lut()
+    if shape[0] == len(names):
+        assert np.array_equal(rgba[names.index('Homo sapiens'), 0],
+                              lut[ord('C')])
+        assert np.array_equal(rgba[0, 0], lut[ord('A')])
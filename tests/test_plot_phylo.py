@@ -55,13 +55,31 @@ def test_plot_phylo_params(xpos,
                            scale_bar,
                            scale_bar_width,
                            reverse,
+                           unrooted,
                            outgroup,
+                           order,
+                           clade,
+                           clade_context,
                            col_dict,
                            label_dict,
                            font_size,
                            line_col,
                            line_width,
                            bold,
+                           highlight,
+                           highlight_cols,
+                           highlight_alpha,
+                           node_sizes,
+                           node_cols,
+                           node_pies,
+                           pie_cols,
+                           pie_sizes,
+                           heatmap,
+                           heatmap_width,
+                           heatmap_cmap,
+                           alignment,
+                           alignment_width,
+                           alignment_columns,
                            expected_figure,
                            ID, tree, ylim):
 
@@ -71,6 +89,13 @@ def test_plot_phylo_params(xpos,
     a = f.add_subplot(111)
     a.set_xlim(-10, 20)
     a.set_ylim(-1, ylim)
+    if (outgroup or clade or highlight) and tree_stem != 'primates':
+        # The outgroup and clades are only present in the primates tree
+        with pytest.raises(RuntimeError, match="not found"):
+            plot_phylo.plot_phylo(tree=tree, ax=a, outgroup=outgroup,
+                                  clade=clade, highlight=highlight)
+        plt.close('all')
+        return
     plot_phylo.plot_phylo(tree=tree, ax=a,
                           xpos=xpos,
                           ypos=ypos,
@@ -84,13 +109,31 @@ def test_plot_phylo_params(xpos,
                           scale_bar=scale_bar,
                           scale_bar_width=scale_bar_width,
                           reverse=reverse,
+                          unrooted=unrooted,
                           outgroup=outgroup,
+                          order=order,
+                          clade=clade,
+                          clade_context=clade_context,
                           col_dict=col_dict,
                           label_dict=label_dict,
                           font_size=font_size,
                           line_col=line_col,
                           line_width=line_width,
-                          bold=bold)
+                          bold=bold,
+                          highlight=highlight,
+                          highlight_cols=highlight_cols,
+                          highlight_alpha=highlight_alpha,
+                          node_sizes=node_sizes,
+                          node_cols=node_cols,
+                          node_pies=node_pies,
+                          pie_cols=pie_cols,
+                          pie_sizes=pie_sizes,
+                          heatmap=heatmap,
+                          heatmap_width=heatmap_width,
+                          heatmap_cmap=heatmap_cmap,
+                          alignment=alignment,
+                          alignment_width=alignment_width,
+                          alignment_columns=alignment_columns)
     try:
         os.mkdir("test_temp")
     except FileExistsError:
@@ -295,13 +338,31 @@ def test_bad_tree(xpos,
                   scale_bar,
                   scale_bar_width,
                   reverse,
+                  unrooted,
                   outgroup,
+                  order,
+                  clade,
+                  clade_context,
                   col_dict,
                   label_dict,
                   font_size,
                   line_col,
                   line_width,
                   bold,
+                  highlight,
+                  highlight_cols,
+                  highlight_alpha,
+                  node_sizes,
+                  node_cols,
+                  node_pies,
+                  pie_cols,
+                  pie_sizes,
+                  heatmap,
+                  heatmap_width,
+                  heatmap_cmap,
+                  alignment,
+                  alignment_width,
+                  alignment_columns,
                   expected_figure,
                   ID, tree, ylim):
     f = plt.figure(figsize=(10, 20))
@@ -323,10 +384,222 @@ def test_bad_tree(xpos,
                               scale_bar=scale_bar,
                               scale_bar_width=scale_bar_width,
                               reverse=reverse,
+                              unrooted=unrooted,
                               outgroup=outgroup,
+                              order=order,
+                              clade=clade,
+                              clade_context=clade_context,
                               col_dict=col_dict,
                               label_dict=label_dict,
                               font_size=font_size,
                               line_col=line_col,
                               line_width=line_width,
-                              bold=bold)
+                              bold=bold,
+                              highlight=highlight,
+                              highlight_cols=highlight_cols,
+                              highlight_alpha=highlight_alpha,
+                              node_sizes=node_sizes,
+                              node_cols=node_cols,
+                              node_pies=node_pies,
+                              pie_cols=pie_cols,
+                              pie_sizes=pie_sizes,
+                              heatmap=heatmap,
+                              heatmap_width=heatmap_width,
+                              heatmap_cmap=heatmap_cmap,
+                              alignment=alignment,
+                              alignment_width=alignment_width,
+                              alignment_columns=alignment_columns)
+
+
+def test_style_dicts_unchanged():
+    # The caller's dictionaries and the defaults are never filled in
+    col_dict = {'Homo sapiens': 'blue'}
+    label_dict = {'Homo sapiens': 'human'}
+    bold = ['Homo sapiens']
+    for tree in ["examples/primates.nw", "examples/basic_tree.nw"]:
+        f = plt.figure()
+        a = f.add_subplot(111)
+        plot_phylo.plot_phylo(tree, a, col_dict=col_dict,
+                              label_dict=label_dict, bold=bold)
+        plot_phylo.plot_phylo(tree, a)
+        plt.close(f)
+    assert col_dict == {'Homo sapiens': 'blue'}
+    assert label_dict == {'Homo sapiens': 'human'}
+    assert bold == ['Homo sapiens']
+    defaults = plot_phylo.plot_phylo.__defaults__
+    assert not any(isinstance(d, (dict, list)) and d for d in defaults)
+
+
+def test_restyle_result():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    a.set_xlim(-2, 20)
+    a.set_ylim(-2, 11)
+    result = plot_phylo.plot_phylo("examples/primates.nw", a,
+                                   bold=['Homo sapiens'])
+    # The result can still be used as the dictionary from get_boxes
+    boxes = plot_phylo.get_boxes(a, result.texts)
+    assert dict(result) == boxes
+    assert len(result) == 16
+    i = result.index['Homo sapiens']
+    result.set_colors({'Homo sapiens': 'red', 'Not a tip': 'blue'},
+                      default='black')
+    assert matplotlib.colors.same_color(result.texts[i].get_color(), 'red')
+    assert matplotlib.colors.same_color(result.texts[0].get_color(),
+                                        'black')
+    result.set_bold(['Pan troglodytes'])
+    assert result.texts[i].get_fontweight() == 'normal'
+    j = result.index['Pan troglodytes']
+    assert result.texts[j].get_fontweight() == 'bold'
+    result.set_labels({'Homo sapiens': 'human'})
+    assert 'human' in result and 'Homo sapiens' not in result
+    result.set_line_style(color='grey', width=3, style='--')
+    assert np.allclose(result.branches.get_linewidths(), 3)
+    # One segment per node plus one per internal node
+    assert len(result.branches.get_segments()) == 31 + 15
+    plt.close(f)
+
+
+def test_unrooted_options():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    result = plot_phylo.plot_phylo("examples/primates.nw", a, unrooted=True)
+    assert len(result.branches.get_segments()) == result.layout.tree.n_nodes
+    with pytest.raises(RuntimeError, match="align_tips cannot be used"):
+        plot_phylo.plot_phylo("examples/primates.nw", a, unrooted=True,
+                              align_tips=True)
+    plt.close(f)
+
+
+def test_draw_tree_fresh_defaults():
+    # Each call starts its own list of tip labels
+    f = plt.figure()
+    a = f.add_subplot(111)
+    for i in range(2):
+        T = ete3.Tree("((A:1,B:1):1,C:2);")
+        _, _, ps = plot_phylo.draw_tree(T, a, depth=(1, 2, 3))
+        assert [p[0] for p in ps] == ['A', 'B', 'C']
+    plt.close(f)
+
+
+def test_result_tip_arrays():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    result = plot_phylo.plot_phylo("((Ab:1,B:1):1,(Ab:1,Ac:2):1);", a,
+                                   label_dict={'B': 'bee'})
+    assert list(result.names) == ['Ab', 'B', 'Ab', 'Ac']
+    assert list(result.labels) == ['Ab', 'bee', 'Ab', 'Ac']
+    assert result.index['Ab'] == 0
+    # Duplicated names are all found and restyled
+    assert list(result.find('Ab')) == [0, 2]
+    assert list(result.find('C')) == []
+    assert list(result.search('A')) == [0, 2, 3]
+    assert list(result.search('Ac')) == [3]
+    result.set_colors({'Ab': 'red'})
+    assert matplotlib.colors.same_color(result.texts[2].get_color(), 'red')
+    result.set_labels({'Ac': 'sea'})
+    assert result.labels[3] == 'sea'
+    assert np.allclose(result.tip_y, [10, 10 * 2 / 3, 10 / 3, 0])
+    assert result.segments.shape == (7 + 3, 2, 2)
+    # The boxes cover every tip, the dictionary has one per label
+    boxes = result.boxes
+    assert boxes.shape == (4, 4)
+    assert len(set(result)) == 3
+    assert np.allclose(boxes[1], [result['bee'][k] for k in
+                                  ('xmin', 'ymin', 'xmax', 'ymax')],
+                       atol=1e-3)
+    assert [p[0] for p in result.ps] == list(result.names)
+    plt.close(f)
+
+
+def test_result_duplicate_tips():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    result = plot_phylo.plot_phylo("((A:1,A:1):1,B:1);", a)
+    # The mapping has one entry per label, however many tips share it
+    assert len(result.texts) == 3
+    assert len(result) == len(list(result)) == len(dict(result)) == 2
+    assert sorted(result) == ['A', 'B']
+    plt.close(f)
+
+
+def test_attribute_colours():
+    rgba, key = plot_phylo.attribute_colours(
+        np.array(['bat', None, 'pig', 'bat'], dtype=object),
+        colours={'bat': 'red'}, missing='white')
+    assert matplotlib.colors.same_color(rgba, ['red', 'white', 'white',
+                                               'red'])
+    assert list(key) == ['bat', 'pig']
+    rgba, key = plot_phylo.attribute_colours(np.array([0, np.nan, 1]),
+                                             cmap='Greys')
+    assert matplotlib.colors.same_color(rgba, ['white', 'lightgrey',
+                                               'black'])
+    assert key.norm.vmin == 0 and key.norm.vmax == 1
+
+
+def test_result_colors_by():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    result = plot_phylo.plot_phylo(
+        "((A:1[&&NHX:host=bat],B:1[&&NHX:host=pig]):1[&&NHX:host=bat],"
+        "C:2[&&NHX:rate=3]);", a)
+    assert list(result.tip_values('host')) == ['bat', 'pig', None]
+    key = result.set_colors_by('host', colours={'bat': 'red',
+                                                'pig': 'blue'})
+    assert list(key) == ['bat', 'pig']
+    assert matplotlib.colors.same_color(
+        [txt.get_color() for txt in result.texts],
+        ['red', 'blue', 'lightgrey'])
+    result.set_line_colors_by('host', colours={'bat': 'red'},
+                              missing='black')
+    cols = result.branches.get_color()
+    assert len(cols) == len(result.segments)
+    # Horizontal lines of the root, clade, A, B and C, then the vertical
+    # lines of the root and the clade
+    assert matplotlib.colors.same_color(
+        cols, ['black', 'red', 'red', 'black', 'black', 'black', 'red'])
+    result.set_bold(result.names[result.tip_values('host') == 'bat'])
+    assert result.texts[0].get_fontweight() == 'bold'
+    with pytest.raises(RuntimeError):
+        result.tip_values('colour')
+    plt.close(f)
+
+
+def test_linkage_names():
+    Z = np.array([[1, 2, 0.5, 2],
+                  [0, 3, 1.0, 2],
+                  [5, 4, 2.0, 4]])
+    f = plt.figure()
+    a = f.add_subplot(111)
+    result = plot_phylo.plot_phylo((Z, ['A', 'B', 'C', 'D']), a)
+    assert [txt.get_text().strip() for txt in result.texts] == [
+        'A', 'D', 'B', 'C']
+    assert list(result.labels) == ['A', 'D', 'B', 'C']
+    with pytest.raises(RuntimeError, match="names"):
+        plot_phylo.plot_phylo((Z, ['A', 'B']), a)
+    plt.close(f)
+
+
+def test_node_annotations():
+    newick = "((A:1,B:2)AB:1,((C:1,D:1)CD:2,E:1)F:1)R;"
+    ct = plot_phylo.read_tree(newick)
+    f = plt.figure()
+    a = f.add_subplot(111)
+    sizes = np.arange(ct.n_nodes) * 10.0
+    pies = np.full((ct.n_nodes, 2), np.nan)
+    pies[ct.names == 'CD'] = [1, 3]
+    # The arrays are given for the tree as read and follow their nodes
+    # when the tree is rerooted
+    result = plot_phylo.plot_phylo(newick, a, outgroup='E',
+                                   node_sizes=sizes, node_pies=pies)
+    tree = result.layout.tree
+    layout = result.layout
+    expected = [sizes[ct.names == nam][0] for nam in ('F', 'CD', 'AB')]
+    assert np.allclose(result.markers.get_sizes(), expected)
+    cd = np.flatnonzero(tree.names == 'CD')[0]
+    assert np.allclose(result.pies.get_offsets(),
+                       [(layout.x[cd], layout.y[cd])] * 2)
+    result = plot_phylo.plot_phylo(newick, a, node_cols={'AB': 'red'})
+    assert result.pies is None
+    assert np.allclose(result.markers.get_sizes(), 30)
+    plt.close(f)
@@ -37,14 +37,22 @@ tests_plot_phylo = [{},
                     {'scale_bar': False},
                     {'scale_bar_width': 6},
                     {'reverse': True},
+                    {'unrooted': True},
                     {'outgroup': 'Homo sapiens'},
+                    {'order': 'up'},
+                    {'clade': ['Homo sapiens', 'Gorilla gorilla'],
+                     'clade_context': 1},
                     {'rev_align_tips': True, 'reverse': True},
                     {'col_dict': {'Homo sapiens': 'blue'}},
                     {'label_dict': {'Homo sapiens': 'human'}},
                     {'font_size': 20},
                     {'line_col': 'orange'},
                     {'line_width': 5},
-                    {'bold': ['Homo sapiens']}]
+                    {'bold': ['Homo sapiens']},
+                    {'highlight': {'Apes': ['Homo sapiens', 'Pongo abelii']}},
+                    {'heatmap': {'Homo sapiens': [1, 2, 3],
+                                 'Pan troglodytes': [3, 2, 1]}},
+                    {'node_sizes': 40, 'node_cols': 'red'}]
 
 tests_draw_tree = [{},
                    {'xpos': 1, 'ypos': 1},
@@ -90,9 +98,12 @@ for test in tests_draw_tree:
     curr_dict['y'] = curr_dict['ypos']
     curr_dict['ps'] = []
     curr_dict['appearance'] = dict()
-    for var in ['col_dict', 'label_dict', 'font_size',
-                'line_col', 'line_width', 'show_support', 'bold']:
+    for var in ['font_size', 'line_col', 'line_width', 'show_support']:
         curr_dict['appearance'][var] = curr_dict[var]
+    # draw_tree needs complete dictionaries, the tests fill these in
+    curr_dict['appearance']['col_dict'] = dict()
+    curr_dict['appearance']['label_dict'] = dict()
+    curr_dict['appearance']['bold'] = []
     curr_dict['depth'] = [5, 5, 5]
     curr_dict.update(test)
     pass_vals = [curr_dict[v] for v in varis_draw_tree]
@@ -113,9 +124,11 @@ for test in tests_draw_tree:
         curr_dict['x0'] = curr_dict['xpos']
         curr_dict['y'] = curr_dict['ypos']
         curr_dict['appearance'] = dict()
-        for var in ['col_dict', 'label_dict', 'font_size',
-                    'line_col', 'line_width', 'show_support', 'bold']:
+        for var in ['font_size', 'line_col', 'line_width', 'show_support']:
             curr_dict['appearance'][var] = curr_dict[var]
+        curr_dict['appearance']['col_dict'] = dict()
+        curr_dict['appearance']['label_dict'] = dict()
+        curr_dict['appearance']['bold'] = []
         curr_dict.update(test)
         curr_dict['depth'] = [5, 5, 5]
         curr_dict.pop('rev_align_tips')
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import matplotlib.pyplot as plt
+import matplotlib
+import plot_phylo
+import numpy as np
+matplotlib.use('Agg')
+
+tree = "((A:1,B:2)AB:1,((C:1,D:1)CD:2,E:1)F:1)R;"
+
+
+def test_skeleton_level():
+    ct = plot_phylo.read_tree(tree)
+    # Levels hold 1, 2, 4 and 2 nodes
+    assert plot_phylo.skeleton_level(ct, 1) == 0
+    assert plot_phylo.skeleton_level(ct, 6) == 1
+    assert plot_phylo.skeleton_level(ct, 7) == 2
+    assert plot_phylo.skeleton_level(ct, 100) == 3
+    assert plot_phylo.skeleton_level(ct, 0) == 0
+
+
+def test_collapsed_triangles():
+    ct = plot_phylo.read_tree(tree)
+    layout = plot_phylo.layout_tree(ct, ypos=0, height=4, width=4,
+                                    depth=plot_phylo.tree_depth(ct))
+    # The clades below F and AB
+    vertices = plot_phylo.collapsed_triangles(layout, [4, 1])
+    assert np.allclose(vertices[0], [(layout.x[4], layout.y[4]),
+                                     (layout.x[6], layout.y[6]),
+                                     (layout.x[6], layout.y[8])])
+    assert np.allclose(vertices[1], [(layout.x[1], layout.y[1]),
+                                     (layout.x[3], layout.y[2]),
+                                     (layout.x[3], layout.y[3])])
+
+
+def test_progressive_tree():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    render = plot_phylo.plot_progressive(tree, a, start=False,
+                                         skeleton_nodes=3, chunk_size=1,
+                                         label_chunk=2)
+    # The root and its children, with both clades collapsed
+    assert render.n_drawn == 3
+    assert len(render.branches.get_segments()) == 4
+    assert len(render.collapsed.get_paths()) == 2
+    f.canvas.draw()
+    counts = [(render.n_drawn, len(render.texts)) for _ in render.steps()]
+    # The branches are added in level order, doubling each time, then
+    # the labels in the last step
+    assert counts == [(6, 0), (9, 0)]
+    assert len(render.texts) == 5
+    assert render.done
+    assert len(render.collapsed.get_paths()) == 0
+    result = render.result
+    expected = plot_phylo.plot_phylo(tree, f.add_subplot(212), height=10)
+    assert np.allclose(result.segments, expected.segments)
+    assert np.allclose(render.branches.get_segments(), result.segments)
+    assert list(result.labels) == ['A', 'B', 'C', 'D', 'E']
+    plt.close(f)
+
+
+def test_progressive_cancel():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    render = plot_phylo.ProgressiveTree(tree, a, skeleton_nodes=1,
+                                        chunk_size=1)
+    render.start(interval=1000)
+    assert render.step()
+    render.cancel()
+    assert render.cancelled and render.timer is None
+    assert not render.step()
+    assert render.finish() is None
+    assert render.n_drawn == 2
+    plt.close(f)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+import matplotlib.image
+import numpy as np
+from plot_phylo.render import render_figure, render_jobs
+
+trees = ["((A:1,B:2):1,(C:1,D:1):2);",
+         "((A:2,C:2):1,(B:1,D:1):1);",
+         "(A:1,(B:1,D:3):1);"]
+
+
+def test_render_jobs(tmp_path):
+    jobs = []
+    for i, tree in enumerate(trees * 2):
+        kwargs = {'col_dict': {'A': 'red'}} if i % 2 else None
+        jobs.append((tree, kwargs, str(tmp_path / ("%i.png" % i))))
+    report = render_jobs(jobs, max_workers=3, figsize=(3, 3), dpi=50)
+    assert report['jobs'] == 6 and report['threads'] == 3
+    assert len(report['job_seconds']) == 6
+    assert report['speedup'] > 0
+    # Each image matches the same tree rendered on its own
+    for tree, kwargs, path in jobs:
+        single = str(tmp_path / "single.png")
+        render_figure(tree, kwargs, single, figsize=(3, 3), dpi=50)
+        assert np.array_equal(matplotlib.image.imread(path),
+                              matplotlib.image.imread(single))
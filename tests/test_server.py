@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import pytest
+from plot_phylo import server
+
+newick = "((A:1,B:2)AB:1,(C:1,D:1)CD:2);"
+
+
+def test_cache_key_normalised():
+    defaults = server.plot_phylo_defaults()
+    k1 = server.cache_key(newick, 'png',
+                          server.normalise_kwargs({}, defaults), [5, 5])
+    k2 = server.cache_key(newick + "\n", 'png',
+                          server.normalise_kwargs({'xpos': 0}, defaults),
+                          [5, 5])
+    k3 = server.cache_key(newick, 'svg',
+                          server.normalise_kwargs({}, defaults), [5, 5])
+    assert k1 == k2
+    assert k1 != k3
+    with pytest.raises(RuntimeError, match="Unknown plot_phylo arguments"):
+        server.normalise_kwargs({'colour': 'red'}, defaults)
+    # Arguments which read files on the server are refused
+    with pytest.raises(RuntimeError, match="use files"):
+        server.normalise_kwargs({'alignment': 'secret.fasta'}, defaults)
+
+
+def test_image_cache_evicts(tmp_path):
+    cache = server.ImageCache(str(tmp_path), max_bytes=25)
+    cache.put('a', 'png', b'x' * 10)
+    cache.put('b', 'png', b'x' * 10)
+    # Reading a makes b the least recently used image
+    assert cache.get('a', 'png') == b'x' * 10
+    cache.put('c', 'png', b'x' * 10)
+    assert cache.get('b', 'png') is None
+    assert sorted(os.listdir(str(tmp_path))) == ['a.png', 'c.png']
+    # Images are found again after a restart
+    assert server.ImageCache(str(tmp_path), 25).get('c', 'png') is not None
+
+
+def test_local_only(tmp_path):
+    with pytest.raises(RuntimeError, match="only listens on localhost"):
+        server.RenderServer(str(tmp_path), host='0.0.0.0')
+
+
+def test_render_tree_never_reads_files(tmp_path, monkeypatch):
+    # A file named like the request must not be read in place of it
+    monkeypatch.chdir(tmp_path)
+    request = "(x,y);"
+    (tmp_path / request).write_text("((SECRET_A:1,SECRET_B:1):1,C:1);")
+    image = server.render_tree(request, 'svg', {}, [4, 4])
+    assert b'SECRET' not in image
+
+
+async def post(port, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    if body is None:
+        req = "GET %s HTTP/1.1\r\n\r\n" % path
+        writer.write(req.encode())
+    else:
+        data = json.dumps(body).encode()
+        req = "POST %s HTTP/1.1\r\nContent-Length: %i\r\n\r\n" % (
+            path, len(data))
+        writer.write(req.encode() + data)
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), data
+
+
+def test_render_server(tmp_path):
+    async def run():
+        srv = server.RenderServer(str(tmp_path), workers=1, port=0)
+        await srv.start()
+        try:
+            request = {'tree': newick, 'format': 'svg', 'figsize': [4, 4]}
+            # Identical requests in a burst share one render
+            results = await asyncio.gather(
+                *[post(srv.port, '/render', request) for i in range(4)])
+            assert all(status == 200 for status, _ in results)
+            assert len(set(data for _, data in results)) == 1
+            assert results[0][1].lstrip().startswith(b'<?xml')
+            # Then come from the cache
+            status, data = await post(srv.port, '/render', request)
+            assert data == results[0][1]
+            status, data = await post(srv.port, '/render',
+                                      {'tree': 'examples/primates.nw'})
+            assert status == 400
+            status, data = await post(srv.port, '/render',
+                                      {'tree': newick, 'kwargs': {
+                                          'alignment': 'aln.fasta'}})
+            assert status == 400
+            # Valid JSON which is not an object is a bad request
+            status, data = await post(srv.port, '/render', [])
+            assert status == 400
+            status, data = await post(srv.port, '/metrics')
+            return json.loads(data)
+        finally:
+            await srv.stop()
+    metrics = asyncio.run(run())
+    assert metrics['renders'] == 1
+    assert metrics['coalesced'] == 3
+    assert metrics['cache_hits'] == 1
+    assert metrics['errors'] == 3
+    assert metrics['cache_entries'] == 1
+    assert 'p95' in metrics['latency_ms']
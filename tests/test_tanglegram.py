@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import matplotlib.pyplot as plt
+import matplotlib
+import plot_phylo
+import pytest
+import itertools
+import numpy as np
+matplotlib.use('Agg')
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_count_crossings(seed):
+    rng = np.random.default_rng(seed)
+    pos1 = rng.integers(0, 20, 50)
+    pos2 = rng.integers(0, 20, 50)
+    expected = sum(1 for i, j in itertools.combinations(range(50), 2)
+                   if (pos1[i] - pos1[j]) * (pos2[i] - pos2[j]) < 0)
+    assert plot_phylo.count_crossings(pos1, pos2) == expected
+
+
+def test_match_tips():
+    ct1 = plot_phylo.read_tree("examples/primates.nw")
+    ct2 = plot_phylo.read_tree("examples/primates_mixed.nw")
+    idx1, idx2 = plot_phylo.match_tips(ct1, ct2)
+    assert len(idx1) == ct1.n_leaves
+    assert list(ct1.names[idx1]) == list(ct2.names[idx2])
+    idx1, idx2 = plot_phylo.match_tips(
+        ct1, ct2, {'Homo sapiens': ['Pan troglodytes', 'Gorilla gorilla']})
+    assert list(ct2.names[idx2]) == ['Pan troglodytes', 'Gorilla gorilla']
+    with pytest.raises(RuntimeError, match="not found in trees"):
+        plot_phylo.match_tips(ct1, ct2, [('Homo sapiens', 'Homo')])
+
+
+def test_untangle_identical_trees():
+    ct1 = plot_phylo.read_tree("examples/big_tree.nw")
+    ct2 = plot_phylo.order_tree(ct1, 'up')
+    idx1, idx2 = plot_phylo.match_tips(ct1, ct2)
+    rank1, rank2 = plot_phylo.untangle_trees(ct1, ct2, idx1, idx2)
+    pos1 = plot_phylo.preorder_positions(ct1.parent, rank1)
+    pos2 = plot_phylo.preorder_positions(ct2.parent, rank2)
+    assert plot_phylo.count_crossings(pos1[idx1], pos2[idx2]) == 0
+
+
+def test_plot_tanglegram():
+    f = plt.figure(figsize=(15, 10))
+    a = f.add_subplot(111)
+    # Leave enough space between the trees for the tip labels
+    layout1, layout2, lines = plot_phylo.plot_tanglegram(
+        "examples/primates.nw", "examples/primates_mixed.nw", a,
+        align_tips=True, gap=20)
+    segments = np.array(lines.get_segments())
+    plt.close()
+    assert len(segments) == 16
+    # Lines run from the left tree to the right tree at the tip heights
+    assert np.all(segments[:, 0, 0] < segments[:, 1, 0])
+    assert np.allclose(np.sort(segments[:, 0, 1]),
+                       np.sort(layout1.y[layout1.tips]))
+    assert not layout1.reverse and layout2.reverse
+
+
+def test_tanglegram_compare():
+    f = plt.figure()
+    a = f.add_subplot(111)
+    layout1, layout2, links = plot_phylo.plot_tanglegram(
+        "(((A,B),C),(D,E));", "(((A,C),B),(D,E));", a, compare='rooted',
+        diff_col='red', diff_width=3)
+    for branches in a.collections[:2]:
+        # Only the clade of two tips which differs is highlighted, its
+        # horizontal line and the line joining its children
+        widths = np.array(branches.get_linewidth())
+        assert widths.tolist().count(3) == 2
+        assert matplotlib.colors.same_color(
+            branches.get_color()[widths == 3], ['red', 'red'])
+    with pytest.raises(RuntimeError):
+        plot_phylo.plot_tanglegram("(A,B);", "(A,B);", a, compare='yes')
+    plt.close(f)
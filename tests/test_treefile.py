@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import bz2
+import gzip
+import io
+import lzma
+import plot_phylo
+import pytest
+import numpy as np
+
+nexus = """#NEXUS
+[ a comment; with a semicolon ]
+begin taxa;
+    dimensions ntax=3;
+    taxlabels A B 'C d';
+end;
+begin trees;
+    translate
+        1 A,
+        2 B,
+        3 'C d'
+    ;
+    tree STATE_0 [&lnP=-12.5] = [&R] ((1:1[&rate=0.5],2:[&rate=2]1.5):1,3:2);
+    tree STATE_1 = ((1:1,3:1):1,2:2);
+end;
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1000])
+def test_tree_file_newick(tmp_path, chunk_size):
+    path = tmp_path / "trees.nw"
+    path.write_text("(A,B);\n('x;y':1,[a;b]C);\n\n((D:1,E:2):1,F:1);\n")
+    trees = plot_phylo.TreeFile(str(path), chunk_size=chunk_size)
+    assert len(trees) == 3
+    assert [trees.newick(i) for i in range(3)] == [
+        "(A,B);", "('x;y':1,[a;b]C);", "((D:1,E:2):1,F:1);"]
+    assert list(trees[-1].names) == ['', '', 'D', 'E', 'F']
+    assert trees.translate == {}
+    with pytest.raises(IndexError):
+        trees[3]
+    # The saved index is used while the file is unchanged
+    assert (tmp_path / "trees.nw.idx").exists()
+    again = plot_phylo.TreeFile(str(path))
+    assert np.array_equal(again.starts, trees.starts)
+    path.write_text("(A,B);\n")
+    assert len(plot_phylo.TreeFile(str(path))) == 1
+    path.write_text("(A,B);\n(C,D)\n")
+    with pytest.raises(RuntimeError, match="does not end with a semicolon"):
+        plot_phylo.TreeFile(str(path), index_path=False)
+
+
+def test_tree_file_nexus(tmp_path):
+    path = tmp_path / "trees.nex"
+    path.write_text(nexus)
+    trees = plot_phylo.TreeFile(str(path), index_path=False)
+    assert trees.nexus
+    assert len(trees) == 2
+    assert trees.translate == {'1': 'A', '2': 'B', '3': 'C d'}
+    assert trees.newick(1) == "((1:1,3:1):1,2:2);"
+    first, second = trees
+    assert list(first.names) == ['', '', 'A', 'B', 'C d']
+    assert np.allclose(first.attrs['rate'][[2, 3]], [0.5, 2])
+    # The annotation before the branch length of B is skipped
+    assert np.allclose(first.dist[3], 1.5)
+    assert list(second.names[second.leaves]) == ['A', 'C d', 'B']
+    assert not (tmp_path / "trees.nex.idx").exists()
+
+
+@pytest.mark.parametrize("compress", [gzip.compress, lzma.compress,
+                                      bz2.compress])
+def test_read_compressed(tmp_path, compress):
+    newick = b"((A:1,'B b':2)[&&NHX:host=bat]:1,C:1);"
+    path = tmp_path / "tree.nw.z"
+    path.write_bytes(compress(newick))
+    assert plot_phylo.is_compressed(str(path))
+    for tree in [str(path), io.BytesIO(compress(newick))]:
+        ct = plot_phylo.read_tree(tree)
+        assert list(ct.names) == ['', '', 'A', "'B b'", 'C']
+        assert list(ct.attrs['host']) == [None, 'bat', None, None, None]
+    # Trees split across chunks and files with several compressed
+    # streams are read in full
+    path.write_bytes(compress(b"(A,B);\n(C,") + compress(b"D);\n"))
+    assert list(plot_phylo.iter_newick(str(path), 3)) == ["(A,B);",
+                                                          "(C,D);"]
+    with pytest.raises(RuntimeError, match="compressed"):
+        plot_phylo.TreeFile(str(path))
+
+
+def test_iter_newick_quote_in_comment():
+    # An apostrophe inside a comment does not start a quoted name
+    text = "(A[it's a note],B);(C,D);"
+    for chunk_size in [4, 100]:
+        assert list(plot_phylo.iter_newick(io.StringIO(text),
+                                           chunk_size)) == [
+            "(A[it's a note],B);", "(C,D);"]
+
+
+def test_read_chunks():
+    text = "(\u00e9:1,B:2);"
+    chunks = list(plot_phylo.read_chunks(io.BytesIO(text.encode()), 1))
+    assert "".join(chunks) == text
+    ct = plot_phylo.parse_newick(iter(["((A:1,B", "B:2):0.", "5,C);"]))
+    assert list(ct.names) == ['', '', 'A', 'BB', 'C']
+    assert ct.dist[1] == 0.5
+    assert list(plot_phylo.read_tree(io.StringIO("(A,B);")).names) == [
+        '', 'A', 'B']
+    with pytest.raises(RuntimeError, match="unfinished"):
+        plot_phylo.parse_newick(["(A,'B", ");"])